@@ -12,7 +12,7 @@ class Trade(Base):
     counterparty = Column(String, nullable=False)
     isin = Column(String, nullable=False)
     
-    # Status: RECEIVED, PENDING_ANALYSIS, FAILED, SETTLED
+    # Status: RECEIVED, PENDING_ANALYSIS, SCORED, FAILED, SETTLED
     status = Column(String, default="RECEIVED")
     
     risk_score = Column(Float, nullable=True)
@@ -1,13 +1,44 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import joblib
-import pandas as pd
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+import asyncio
+import functools
+import gc
 import numpy as np
 import os
-from .schemas.predict import TradeRequest, PredictionResponse
-from .db.session import engine
+import json
+import hashlib
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from typing import Literal, Optional
+from pydantic import ValidationError
+from .schemas.predict import (
+    TradeRequest, PredictionResponse,
+    BatchPredictionRequest, BatchPredictionResponse,
+    ExplanationResponse, SimulationRequest, SimulationResponse,
+)
+from .db.session import engine, SessionLocal
 from .db.models import Base
+from .ml_runtime import (
+    FastPathPredictor, ExplanationEngine, CascadePredictor, CASCADE_FILE, TIER_FULL, TIER_NAMES, risk_levels,
+    BUNDLE_DIR, current_bundle_version, load_bundle,
+    Metrics, TimingMiddleware, SIZE_BUCKETS, DriftMonitor, DRIFT_FILE, derive_one, derive_trade_features,
+)
+from .services.micro_batcher import MicroBatcher
+from .services.worker_pool import InferenceWorkerPool
+from .services.prediction_cache import PredictionCache
+from .services.explanation_store import DeferredExplainer, InMemoryExplanationStore, DatabaseExplanationStore
+from .services.model_watcher import ModelWatcher
+from .services import columnar_codec
+from .services.stream_ingest import StreamHub, StreamSession, parse_stream_message
+from .services.trade_writer import TradeWriter, trade_row
+from .services.trade_book import TradeBook, DIMENSIONS as BOOK_DIMENSIONS
+from .services.simulation import default_perturbations, rank_variants
 
 # Create Tables (Existing logic)
 Base.metadata.create_all(bind=engine)
@@ -15,27 +46,523 @@ Base.metadata.create_all(bind=engine)
 # --- 1. Global State for Model (Singleton Pattern) ---
 ml_models = {}
 
+# Upper bound on rows accepted by /predict/batch (protects memory on the gateway)
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "50000"))
+
+# Compiled preprocessor + booster.inplace_predict instead of pandas/ColumnTransformer (set FAST_PATH=0 to disable)
+FAST_PATH_ENABLED = os.getenv("FAST_PATH", "1") != "0"
+
+# Hot-path instrumentation, exposed on /metrics. Counters are exact; stage timers run on a
+# METRICS_SAMPLE_RATE fraction of requests (0 turns them off, 1 times everything)
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "1.0"))
+# Server-Timing stage breakdown: "request" (only when the client sends X-Debug-Timing: 1), "always" or "off"
+METRICS_TIMING_HEADER = os.getenv("METRICS_TIMING_HEADER", "request")
+metrics = Metrics("settlement", METRICS_SAMPLE_RATE)
+metrics.histogram("batch_size", "Trades per scoring call", SIZE_BUCKETS)
+metrics.counter("trades_scored_total", "Trades scored, by endpoint")
+metrics.counter("errors_total", "Errors, by stage")
+
+def classify_risk(prob):
+    return "CRITICAL" if prob > 0.8 else "HIGH" if prob > 0.5 else "LOW"
+
+# Category order of the risk_levels() codes (0, 1, 2) in columnar responses
+RISK_LEVELS = ["LOW", "HIGH", "CRITICAL"]
+
+# TradeRequest as columns, for /predict/columnar (Trade_ID is an identifier, passed through as-is)
+COLUMNAR_NUMERIC_FIELDS = [name for name, f in TradeRequest.model_fields.items() if f.annotation is float]
+COLUMNAR_CATEGORICAL_FIELDS = [name for name, f in TradeRequest.model_fields.items() if f.annotation is str]
+COLUMNAR_DEFAULTS = {name: f.default for name, f in TradeRequest.model_fields.items()
+                     if not f.is_required() and f.default is not None}
+
+def record_scored(rows):
+    # Scored trades feed the in-memory book (updated in place) and the write-behind buffer
+    # (flushed to the trades table in bulk by the TradeWriter thread); no database round trip here.
+    # Only trades that came with a Trade_ID: anonymous what-if/scoring calls would grow both without bound
+    if not rows:
+        return
+    book = ml_models.get("trade_book")
+    if book is not None:
+        book.upsert_many(rows)
+    writer = ml_models.get("trade_writer")
+    if writer is not None:
+        writer.submit(rows)
+
+def scored_row(trade_id, record, prob, risk_level, tier, model_version):
+    details = {"risk_level": risk_level, "scoring_tier": tier, "model_version": model_version, "inputs": record}
+    return trade_row(trade_id, record, prob, details)
+
+def derive_trade_time(record):
+    # A raw Trade_Date overrides Trade_Day / Trade_Hour and fills a missing Settlement_Date (business days on
+    # the currency's calendar), exactly as the generator and trainer derive them. ValueError if unusable
+    if record.get("Trade_Date"):
+        derived = derive_one(record["Trade_Date"], record["Currency"])
+        record["Trade_Day"], record["Trade_Hour"] = derived["Trade_Day"], float(derived["Trade_Hour"])
+        record["Settlement_Date"] = record.get("Settlement_Date") or derived["Settlement_Date"]
+    return record
+
+def derive_trade_time_batch(records):
+    """
+    derive_trade_time for a whole batch: the Trade_Date timestamps are parsed
+    in one vectorized call. Returns the positions whose timestamp is unusable.
+    """
+    positions = [i for i, record in enumerate(records) if record.get("Trade_Date")]
+    if not positions:
+        return []
+    derived = derive_trade_features([records[i]["Trade_Date"] for i in positions],
+                                    [records[i]["Currency"] for i in positions])
+    bad = []
+    for i, day, hour, settlement, invalid in zip(positions, derived["Trade_Day"].tolist(), derived["Trade_Hour"].tolist(),
+                                                 derived["Settlement_Date"].tolist(), derived["invalid"].tolist()):
+        if invalid:
+            bad.append(i)
+            continue
+        record = records[i]
+        record["Trade_Day"], record["Trade_Hour"] = day, float(hour)
+        record["Settlement_Date"] = record.get("Settlement_Date") or settlement
+    return bad
+
+def format_validation_error(e):
+    return "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+
+def active_model():
+    # Everything scoring needs for one model version (version, fast_path, cascade, explainer, ...).
+    # A hot swap replaces the whole dict in one assignment, so a request never mixes two versions.
+    return ml_models.get("model")
+
+def pipeline_predict(pipeline, records):
+    # Legacy path, one stage per step (SMOTE only runs at fit time, so it is skipped here as in predict_proba)
+    import pandas as pd
+    with metrics.stage("dataframe"):
+        df = pd.DataFrame.from_records(records)
+    with metrics.stage("transform"):
+        X = pipeline.named_steps["preprocessor"].transform(df)
+    with metrics.stage("predict"):
+        return pipeline.named_steps["classifier"].predict_proba(X)[:, 1]
+
+def score_records_local(records, model=None):
+    """
+    (n, 2) array of [failure probability, scoring tier] for a list of validated
+    trade dicts, in input order (this process). The tier is TIER_FULL unless
+    the cascade answered from its tree prefix. A float32 matrix is taken as
+    already encoded by the fast path (columnar batches).
+    """
+    model = model or active_model()
+    metrics.observe("batch_size", len(records))
+    fast_path = model.get("fast_path")
+    if fast_path is None:
+        probs = pipeline_predict(model["pipeline"], records)
+        return np.column_stack([probs, np.full(len(probs), TIER_FULL)])
+    if isinstance(records, np.ndarray):
+        X = records
+    else:
+        with metrics.stage("encode"):
+            X = fast_path.encode_records(records)
+    with metrics.stage("predict"):
+        cascade = model.get("cascade")
+        if cascade is not None:
+            return np.column_stack(cascade.predict_proba(X))
+        probs = fast_path.predict_proba(X)
+    return np.column_stack([probs, np.full(len(probs), TIER_FULL)])
+
+def score_records(records, model=None):
+    # `model` is the request's snapshot: a hot swap mid-request must not change who scores it
+    model = model or active_model()
+    # INFERENCE_MODE=pool: hand the work to the worker processes, pinned to the same version
+    pool = ml_models.get("worker_pool")
+    if pool is not None:
+        return pool.score_parallel(records, _pool_key(model))
+    return score_records_local(records, model)
+
+def score_one_local(record, model=None):
+    """(failure probability, scoring tier) for one trade, in this process."""
+    model = model or active_model()
+    fast_path = model.get("fast_path")
+    if fast_path is None:
+        return float(pipeline_predict(model["pipeline"], [record])[0]), TIER_FULL
+    with metrics.stage("encode"):
+        X = fast_path.encode_one(record)
+    with metrics.stage("predict"):
+        cascade = model.get("cascade")
+        if cascade is not None:
+            probs, tiers = cascade.predict_proba(X)
+            return float(probs[0]), int(tiers[0])
+        return float(fast_path.predict_proba(X)[0]), TIER_FULL
+
+def score_one(record, model=None):
+    model = model or active_model()
+    pool = ml_models.get("worker_pool")
+    if pool is not None:
+        return pool.score([record], _pool_key(model))[0]
+    return score_one_local(record, model)
+
+def explain_records(records):
+    # Deferred explanations follow hot swaps: always the active model's engine
+    explainer = active_model().get("explainer")
+    if explainer is None:
+        raise RuntimeError("The active model has no explanation engine")
+    return explainer.explain_records(records)
+
+def model_file_version(path):
+    # Content hash of the artifact: any retrain changes it, which invalidates the prediction cache
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+# Model versions a pool worker keeps loaded (the one it started with, plus one across a hot swap)
+WORKER_MODEL_VERSIONS = 2
+
+def _pool_key(model):
+    return model["version"], model["source"]
+
+def _load_worker_model(settings, version, source, warm=True):
+    # Scoring only (no explainer or drift monitor), one thread: the pool size provides the parallelism
+    model = load_model({**settings, "explanations": False, "drift": False}, version if source == "bundle" else None)
+    if model is None or model["version"] != version:
+        raise RuntimeError(f"expected model version {version}, found {model['version'] if model else None}")
+    if model.get("fast_path") is not None:
+        model["fast_path"].booster.set_param({"nthread": 1})
+    if warm:
+        warm_up(model)
+        metrics.drain()  # warm-up calls are not traffic
+    return model
+
+# Set by the gateway while it starts the pool: the forkserver it launches preloads this module and
+# loads the served version once (below), so every worker forked from it shares the model's pages
+# copy-on-write instead of holding its own copy
+WORKER_PRELOAD_ENV = "SETTLEMENT_WORKER_PRELOAD"
+
+def _preload_worker_model():
+    spec = os.environ.get(WORKER_PRELOAD_ENV)
+    if not spec:
+        return
+    settings, version, source = json.loads(spec)
+    try:
+        # No warm-up here: scoring would start XGBoost's OpenMP threads in the process workers fork from
+        ml_models["preloaded_model"] = _load_worker_model(settings, version, source, warm=False)
+    except Exception as e:
+        print(f"Worker model preload failed, workers load their own copy: {e}")
+    # Keep the collector off everything loaded so far: its bookkeeping writes would un-share those pages
+    gc.freeze()
+
+def _init_worker(settings, version, source):
+    # Runs in each new pool worker (a clean process, nothing inherited from the gateway's threads).
+    # The version preloaded in the forkserver is shared; any other (after a hot swap) is loaded here
+    preloaded = ml_models.get("preloaded_model")
+    if preloaded is not None and preloaded["version"] == version:
+        model = preloaded
+        warm_up(model)
+        metrics.drain()
+    else:
+        model = _load_worker_model(settings, version, source)
+    ml_models["worker_settings"] = settings
+    ml_models["worker_models"] = OrderedDict({version: model})
+
+def worker_init_for(settings, model):
+    return functools.partial(_init_worker, settings, *_pool_key(model))
+
+def _score_in_worker(records, key):
+    # Pool worker side of score_records: the version travels with the task. Around a hot swap a
+    # worker can get a request admitted under the other version, and loads that bundle alongside.
+    version, source = key
+    models = ml_models["worker_models"]
+    if version not in models:
+        models[version] = _load_worker_model(ml_models["worker_settings"], version, source)
+        while len(models) > WORKER_MODEL_VERSIONS:
+            models.popitem(last=False)
+    models.move_to_end(version)
+    return score_records_local(records, models[version])
+
+def _worker_telemetry():
+    # Stage timings and batch sizes recorded in a pool worker since its last answer, merged into /metrics
+    return metrics.drain() or None
+
+def load_model(settings, version=None):
+    """
+    Scoring state for one model version: from the lean serving bundle when
+    one is published (numpy + xgboost only), otherwise from the pickled
+    pipeline (legacy; unpickling imports sklearn/imblearn). None if neither exists.
+    """
+    version = version or current_bundle_version(settings["bundle_dir"])
+    if version is not None:
+        bundle = load_bundle(settings["bundle_dir"], version)
+        model = {"version": bundle["version"], "source": "bundle", "fast_path": bundle["fast_path"]}
+        feature_names, cascade_config = bundle["feature_names"], bundle["cascade"]
+        drift_reference = bundle["drift_reference"]
+    elif os.path.exists(settings["model_path"]):
+        import joblib  # legacy path only
+        model = {
+            "version": model_file_version(settings["model_path"]),
+            "source": "pipeline",
+            "pipeline": joblib.load(settings["model_path"]),
+        }
+        if FAST_PATH_ENABLED:
+            try:
+                model["fast_path"] = FastPathPredictor.from_pipeline(model["pipeline"])
+            except Exception as e:
+                # Unsupported pipeline layout -> keep serving through the pipeline
+                print(f"Fast path disabled: {e}")
+        feature_names_path = settings["feature_names_path"]
+        feature_names = joblib.load(feature_names_path) if os.path.exists(feature_names_path) else None
+        cascade_config = None
+        if os.path.exists(settings["cascade_path"]):
+            with open(settings["cascade_path"]) as f:
+                cascade_config = json.load(f)
+        drift_reference = None
+    else:
+        return None
+
+    if settings["drift"] and drift_reference is None and os.path.exists(settings["drift_reference_path"]):
+        with open(settings["drift_reference_path"]) as f:
+            drift_reference = json.load(f)
+
+    fast_path = model.get("fast_path")
+    if settings["cascade"] and fast_path is not None and cascade_config:
+        try:
+            model["cascade"] = CascadePredictor.from_config(fast_path, cascade_config)
+        except Exception as e:
+            # Calibration does not match this model -> every trade gets the full ensemble
+            print(f"Cascade disabled: {e}")
+
+    if settings["explanations"]:
+        try:
+            compiled = fast_path or FastPathPredictor.from_pipeline(model["pipeline"])
+            model["explainer"] = ExplanationEngine(compiled, feature_names)
+        except Exception as e:
+            print(f"Explanations disabled: {e}")
+
+    if settings["drift"] and drift_reference:
+        # One monitor per model version: a hot swap starts over against the new model's reference
+        try:
+            model["drift"] = DriftMonitor(drift_reference, settings["drift_window"], settings["drift_min_samples"])
+        except Exception as e:
+            print(f"Drift monitor disabled: {e}")
+    return model
+
+def warm_up(model):
+    # Score and explain a synthetic trade before the model takes traffic (first-call allocations, thread pools)
+    fast_path = model.get("fast_path")
+    if fast_path is None:
+        return
+    record = {f["name"]: f["center"] for f in fast_path.spec["numeric"]}
+    record.update({f["name"]: f["categories"][0] for f in fast_path.spec["categorical"]})
+    score_records_local([record] * 8, model)
+    score_one_local(record, model)
+    if "explainer" in model:
+        model["explainer"].explain_records([record])
+
+def swap_model(settings, version):
+    """Loads and warms up a new bundle off the request path, then makes it the active model."""
+    model = load_model(settings, version)
+    warm_up(model)
+    previous = active_model()
+    ml_models["model"] = model
+    pool = ml_models.get("worker_pool")
+    if pool is not None:
+        # Workers hold their own copy; replace them one at a time with workers loading the new version
+        pool.restart(worker_init_for(settings, model))
+    print(f"Model swapped: {previous['version'] if previous else None} -> {model['version']}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Load the heavy model ONLY when the server starts
     print("Loading ML Pipeline...")
     # Use Environment Variable provided by Docker Compose, default to local relative path
     model_path = os.getenv("MODEL_PATH", "../ml_service/model/model.joblib")
-    explainer_path = os.getenv("EXPLAINER_PATH", "../ml_service/model/shap_explainer.joblib")
+    settings = {
+        "model_path": model_path,
+        # Lean serving bundle written by train_model.py (<dir>/CURRENT -> <dir>/<version>/); preferred over model.joblib
+        "bundle_dir": os.getenv("MODEL_BUNDLE_DIR", os.path.join(os.path.dirname(model_path), BUNDLE_DIR)),
+        # Explanations come from the booster itself (pred_contribs); feature_names.joblib labels them
+        "feature_names_path": os.getenv("FEATURE_NAMES_PATH", os.path.join(os.path.dirname(model_path), "feature_names.joblib")),
+        "explanations": os.getenv("EXPLANATIONS", "1") != "0",
+        # Cascade (early-exit) scoring: tree prefix first, full ensemble only inside the calibrated uncertainty bands
+        "cascade": os.getenv("CASCADE", "0") != "0",
+        "cascade_path": os.getenv("CASCADE_PATH", os.path.join(os.path.dirname(model_path), CASCADE_FILE)),
+        # Drift monitor on the scored flow vs the training reference profile (inside the bundle, or drift_reference.json)
+        "drift": os.getenv("DRIFT_MONITOR", "1") != "0",
+        "drift_reference_path": os.getenv("DRIFT_REFERENCE_PATH", os.path.join(os.path.dirname(model_path), DRIFT_FILE)),
+        # Reports cover the last DRIFT_WINDOW..2*DRIFT_WINDOW trades (0 = everything since startup / last reset)
+        "drift_window": int(os.getenv("DRIFT_WINDOW", "50000")),
+        "drift_min_samples": int(os.getenv("DRIFT_MIN_SAMPLES", "500")),
+    }
+    # Poll the bundle pointer every N seconds and hot-swap to new versions (0 disables)
+    model_watch_interval = float(os.getenv("MODEL_WATCH_INTERVAL", "5"))
+    # Deferred explanations (?explain=deferred): background workers, bounded queue, result store
+    explain_workers = int(os.getenv("EXPLAIN_WORKERS", "2"))
+    explain_queue_depth = int(os.getenv("EXPLAIN_QUEUE_DEPTH", "1000"))
+    # "db" stores results in Trade.prediction_details, "memory" in a bounded LRU; "auto" = db when DATABASE_URL is set
+    explanation_store = os.getenv("EXPLANATION_STORE", "auto")
+    if explanation_store == "auto":
+        explanation_store = "db" if os.getenv("DATABASE_URL") else "memory"
+    # Micro-batching of concurrent /predict calls (MICRO_BATCH=0 scores each request on its own)
+    micro_batch_enabled = os.getenv("MICRO_BATCH", "1") != "0"
+    micro_batch_max_size = int(os.getenv("MICRO_BATCH_MAX_SIZE", "64"))
+    micro_batch_max_wait_ms = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "2"))
+    # Execution mode: "inprocess" (default, development) or "pool" (scoring worker processes, one model copy each)
+    inference_mode = os.getenv("INFERENCE_MODE", "inprocess")
+    inference_workers = int(os.getenv("INFERENCE_WORKERS", "0")) or os.cpu_count()
+    inference_task_timeout = float(os.getenv("INFERENCE_TASK_TIMEOUT", "30"))
+    inference_max_tasks = int(os.getenv("INFERENCE_MAX_TASKS_PER_WORKER", "0"))
+    # Load the served model once in the forkserver so the workers share it (0 = each worker loads its own)
+    inference_preload = os.getenv("INFERENCE_PRELOAD", "1") != "0"
+    # Prediction cache for repeated trade profiles (PREDICTION_CACHE=0 to disable)
+    cache_enabled = os.getenv("PREDICTION_CACHE", "1") != "0"
+    cache_max_entries = int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", "100000"))
+    cache_ttl_seconds = float(os.getenv("PREDICTION_CACHE_TTL_SECONDS", "300"))
+    # Optional bucketing of the continuous inputs in the cache key, e.g. 1000 (USD) and 0.1 (VIX points)
+    cache_notional_step = float(os.getenv("PREDICTION_CACHE_NOTIONAL_ROUNDING", "0")) or None
+    cache_volatility_step = float(os.getenv("PREDICTION_CACHE_VOLATILITY_ROUNDING", "0")) or None
+    # Streaming ingestion (/stream/trades): rolling micro-batches per connection, bounded unanswered trades
+    stream_config = {
+        "max_batch_size": int(os.getenv("STREAM_MAX_BATCH_SIZE", "256")),
+        "max_wait_ms": float(os.getenv("STREAM_MAX_WAIT_MS", "20")),
+        "max_in_flight": int(os.getenv("STREAM_MAX_IN_FLIGHT", "1024")),
+    }
+    # Messages buffered per dashboard subscriber (/stream/subscribe) before the oldest are dropped
+    stream_subscriber_queue = int(os.getenv("STREAM_SUBSCRIBER_QUEUE", "1000"))
+    # Write-behind persistence of scored trades into `trades` (PERSIST_TRADES=0 to disable)
+    persist_enabled = os.getenv("PERSIST_TRADES", "1") != "0"
+    persist_batch_size = int(os.getenv("PERSIST_BATCH_SIZE", "500"))
+    persist_flush_interval_ms = float(os.getenv("PERSIST_FLUSH_INTERVAL_MS", "1000"))
+    persist_max_buffer = int(os.getenv("PERSIST_MAX_BUFFER", "50000"))
+    # Full buffer: "spill" appends to PERSIST_SPILL_PATH (replayed on the next flush), "drop" discards
+    persist_overflow = os.getenv("PERSIST_OVERFLOW", "spill")
+    persist_spill_path = os.getenv("PERSIST_SPILL_PATH", os.path.join(tempfile.gettempdir(), "settlement-trades-spill.ndjson"))
+    # COPY into a staging table on PostgreSQL (PERSIST_COPY=0 = multi-row upserts everywhere)
+    persist_copy = os.getenv("PERSIST_COPY", "1") != "0"
+    # In-memory scored trade book (/book/top, /book/exposure), rebuilt from the trades table at startup
+    book_enabled = os.getenv("TRADE_BOOK", "1") != "0"
     
     try:
-        if os.path.exists(model_path):
-            ml_models["pipeline"] = joblib.load(model_path)
-            # ml_models["explainer"] = joblib.load(explainer_path) 
-            print(f"Model loaded from {model_path}. API Ready.")
+        model = load_model(settings)
+        if model is not None:
+            warm_up(model)
+            ml_models["model"] = model
+            print(f"Model loaded from {model['source']} (version {model['version']}). API Ready.")
+            if "fast_path" in model:
+                print(f"Fast path compiled ({model['fast_path'].n_features} features).")
+            if "cascade" in model:
+                print(f"Cascade enabled ({model['cascade'].prefix_trees}-tree prefix, bands {model['cascade'].bands}).")
+            if "explainer" in model:
+                print(f"Explanation engine ready ({len(model['explainer'].original_features)} features).")
+            if "drift" in model:
+                print(f"Drift monitor ready (reference of {model['drift'].reference['rows']} trades, "
+                      f"window {settings['drift_window'] or 'unbounded'}).")
+            elif settings["drift"]:
+                print(f"Drift monitor disabled: no usable reference profile in the bundle or at "
+                      f"{settings['drift_reference_path']}; /drift returns 503 until a retrained bundle ships one.")
+            else:
+                print("Drift monitor disabled (DRIFT_MONITOR=0).")
+
+            if cache_enabled:
+                ml_models["cache"] = PredictionCache(
+                    cache_max_entries, cache_ttl_seconds,
+                    notional_step=cache_notional_step,
+                    volatility_step=cache_volatility_step,
+                    model_version=model["version"],
+                )
+
+            if "explainer" in model:
+                max_entries = int(os.getenv("EXPLANATION_STORE_MAX_ENTRIES", "100000"))
+                store = (DatabaseExplanationStore(SessionLocal, max_entries) if explanation_store == "db"
+                         else InMemoryExplanationStore(max_entries))
+                deferred = DeferredExplainer(explain_records, store,
+                                             workers=explain_workers, max_queue=explain_queue_depth)
+                deferred.start()
+                ml_models["deferred_explainer"] = deferred
+                print(f"Deferred explainer started ({explain_workers} workers, store={explanation_store}).")
+
+            if inference_mode == "pool":
+                # Workers start from a forkserver with this module preloaded and load the model themselves:
+                # forking the gateway (threads, OpenMP pool) could hand a child a lock that is never released
+                pool = InferenceWorkerPool(
+                    _score_in_worker,
+                    n_workers=inference_workers,
+                    task_timeout=inference_task_timeout,
+                    max_tasks_per_worker=inference_max_tasks,
+                    worker_init=worker_init_for(settings, model),
+                    telemetry_fn=_worker_telemetry,
+                    on_telemetry=metrics.merge,
+                    preload=["app.main"],
+                )
+                # Read by the forkserver when the first worker starts it (not inherited by anything later)
+                if inference_preload:
+                    os.environ[WORKER_PRELOAD_ENV] = json.dumps([settings, *_pool_key(model)])
+                try:
+                    pool.start()
+                finally:
+                    os.environ.pop(WORKER_PRELOAD_ENV, None)
+                ml_models["worker_pool"] = pool
+                print(f"Inference worker pool started ({pool.n_workers} workers).")
+
+            if micro_batch_enabled:
+                concurrency = ml_models["worker_pool"].n_workers if "worker_pool" in ml_models else 1
+                # Keyed on the request's model snapshot: one batch never mixes versions
+                batcher = MicroBatcher(score_records, micro_batch_max_size, micro_batch_max_wait_ms, concurrency)
+                await batcher.start()
+                ml_models["batcher"] = batcher
+                print(f"Micro-batcher started (max_size={micro_batch_max_size}, max_wait={micro_batch_max_wait_ms}ms).")
+
+            if book_enabled:
+                book = TradeBook()
+                start = time.perf_counter()
+                try:
+                    book.rebuild(SessionLocal)
+                except Exception as e:
+                    print(f"Trade book rebuild failed, starting empty: {e}")
+                ml_models["trade_book"] = book
+                print(f"Trade book loaded ({book.stats()['trades']} open trades in {time.perf_counter() - start:.2f}s).")
+
+            if persist_enabled:
+                writer = TradeWriter(
+                    engine,
+                    batch_size=persist_batch_size,
+                    flush_interval_ms=persist_flush_interval_ms,
+                    max_buffer=persist_max_buffer,
+                    overflow=persist_overflow,
+                    spill_path=persist_spill_path if persist_overflow == "spill" else None,
+                    use_copy=persist_copy,
+                )
+                writer.start()
+                ml_models["trade_writer"] = writer
+                print(f"Trade writer started ({writer.stats()['mode']}, batch={persist_batch_size}, "
+                      f"every {persist_flush_interval_ms}ms, overflow={persist_overflow}).")
+
+            ml_models["stream_config"] = stream_config
+            ml_models["stream_hub"] = StreamHub(stream_subscriber_queue)
+            print(f"Streaming ingestion ready (batch={stream_config['max_batch_size']}, "
+                  f"wait={stream_config['max_wait_ms']}ms, in-flight={stream_config['max_in_flight']}).")
+
+            if model_watch_interval > 0:
+                watcher = ModelWatcher(
+                    lambda: current_bundle_version(settings["bundle_dir"]),
+                    lambda version: swap_model(settings, version),
+                    interval=model_watch_interval,
+                    active_version=model["version"] if model["source"] == "bundle" else None,
+                )
+                watcher.start()
+                ml_models["model_watcher"] = watcher
+                print(f"Watching {settings['bundle_dir']} for new model versions (every {model_watch_interval}s).")
         else:
-             print(f"Error: Model not found at {model_path}")
+             print(f"Error: Model not found at {settings['bundle_dir']} or {model_path}")
 
     except Exception as e:
         print(f"Failed to load model: {e}")
         
     yield
     # Clean up resources if needed
+    if "model_watcher" in ml_models:
+        ml_models["model_watcher"].stop()
+    if "batcher" in ml_models:
+        await ml_models["batcher"].stop()
+    if "worker_pool" in ml_models:
+        ml_models["worker_pool"].stop()
+    if "deferred_explainer" in ml_models:
+        ml_models["deferred_explainer"].stop()
+    if "trade_writer" in ml_models:
+        ml_models["trade_writer"].stop()  # final flush of everything still buffered
     ml_models.clear()
 
 app = FastAPI(lifespan=lifespan, title="SettlementGuard API")
@@ -53,61 +580,719 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# Outermost: request counts/latency by route and the per-request stage timing context
+app.add_middleware(TimingMiddleware, metrics=metrics, timing_header=METRICS_TIMING_HEADER)
 
 @app.get("/health")
 def health_check():
-    status = "healthy" if "pipeline" in ml_models else "no_model"
-    return {"status": status, "service": "api-gateway"}
+    model = active_model()
+    status = "healthy" if model is not None else "no_model"
+    response = {
+        "status": status,
+        "service": "api-gateway",
+        "model_version": model["version"] if model else None,
+        "model_source": model["source"] if model else None,
+    }
+
+    pool = ml_models.get("worker_pool")
+    if pool is not None:
+        workers = pool.health()
+        response["inference_mode"] = "pool"
+        response["workers"] = workers
+        if not all(w["alive"] for w in workers):
+            response["status"] = "degraded"
+    else:
+        response["inference_mode"] = "inprocess"
+
+    cascade = model.get("cascade") if model else None
+    response["cascade"] = {"prefix_trees": cascade.prefix_trees, "bands": cascade.bands} if cascade else None
+
+    watcher = ml_models.get("model_watcher")
+    response["model_watcher"] = watcher.stats() if watcher else None
+    return response
+
+@app.post("/workers/restart")
+def restart_inference_workers():
+    # Rolling restart: one worker at a time, after its in-flight batch
+    pool = ml_models.get("worker_pool")
+    if pool is None:
+        raise HTTPException(status_code=409, detail="Inference worker pool is not enabled (INFERENCE_MODE=pool)")
+    pool.restart()
+    return {"status": "restarted", "workers": pool.health()}
+
+@app.get("/metrics")
+def prometheus_metrics():
+    # Prometheus text exposition: request/stage latency histograms, batch sizes, trade and error counters
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/cache/stats")
+def prediction_cache_stats():
+    cache = ml_models.get("cache")
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+@app.get("/persistence/stats")
+def trade_writer_stats():
+    writer = ml_models.get("trade_writer")
+    if writer is None:
+        return {"enabled": False}
+    return {"enabled": True, **writer.stats()}
+
+@app.post("/persistence/flush")
+def flush_trade_writer():
+    # Force a flush now (ops / tests); normally the size or time trigger does this
+    writer = ml_models.get("trade_writer")
+    if writer is None:
+        raise HTTPException(status_code=409, detail="Trade persistence is not enabled (PERSIST_TRADES=0)")
+    if not writer.flush():
+        raise HTTPException(status_code=503, detail=f"Flush failed: {writer.last_error}")
+    return writer.stats()
+
+@app.get("/book/top")
+def book_top(n: int = Query(50, ge=1, le=10_000), min_probability: float = 0.0):
+    # Riskiest open trades by failure probability (sorted index, no database query)
+    book = ml_models.get("trade_book")
+    if book is None:
+        raise HTTPException(status_code=503, detail="Trade book is not enabled (TRADE_BOOK=0)")
+    return {"trades": book.top(n, min_probability), "book": book.stats()}
+
+@app.get("/book/exposure")
+def book_exposure(
+    by: Literal[BOOK_DIMENSIONS] = "counterparty",
+    key: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+):
+    # Running notional-at-risk aggregates; one group by key, or the groups with the most notional at risk
+    book = ml_models.get("trade_book")
+    if book is None:
+        raise HTTPException(status_code=503, detail="Trade book is not enabled (TRADE_BOOK=0)")
+    return {"by": by, "groups": book.exposure(by, key, limit)}
+
+@app.get("/drift")
+def drift_report():
+    # PSI / KS of the recently scored trades against the training reference, per feature and for the scores
+    model = active_model()
+    monitor = model.get("drift") if model else None
+    if monitor is None:
+        raise HTTPException(status_code=503, detail="Drift monitoring needs a model with a reference profile (DRIFT_MONITOR=1)")
+    return {"model_version": model["version"], **monitor.report()}
+
+@app.post("/drift/reset")
+def drift_reset():
+    # Start the live sketches over (e.g. after an upstream fix), keeping the reference
+    model = active_model()
+    monitor = model.get("drift") if model else None
+    if monitor is None:
+        raise HTTPException(status_code=503, detail="Drift monitoring needs a model with a reference profile (DRIFT_MONITOR=1)")
+    monitor.reset()
+    return {"status": "reset", "model_version": model["version"]}
+
+@app.get("/predict/batcher")
+def micro_batcher_stats():
+    # Achieved batch sizes, for tuning MICRO_BATCH_MAX_SIZE / MICRO_BATCH_MAX_WAIT_MS
+    batcher = ml_models.get("batcher")
+    if batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **batcher.stats()}
 
 # --- 3. The Endpoint ---
 @app.post("/predict", response_model=PredictionResponse)
-async def predict_settlement_failure(trade: TradeRequest):
-    pipeline = ml_models.get("pipeline")
-    if not pipeline:
+async def predict_settlement_failure(
+    trade: TradeRequest,
+    response: Response,
+    explain: Literal["inline", "deferred", "none"] = "inline",
+):
+    # One snapshot per request: a concurrent hot swap does not change the model under our feet
+    model = active_model()
+    if model is None:
         raise HTTPException(status_code=500, detail="Model not loaded")
+    metrics.checkpoint("validate")  # body read, JSON parsing and TradeRequest validation
 
-    # Convert incoming JSON -> Pandas DataFrame
-    input_data = pd.DataFrame([trade.dict()])
-
-    # A. Get Probability
-    # [:, 1] gets the probability of Class 1 (Failure)
+    record = trade.model_dump()
     try:
-        prob = pipeline.predict_proba(input_data)[0, 1] 
-    except Exception as e:
-        print(f"Prediction Error: {e}")
-        # Fallback for demo if feature mismatch
-        raise HTTPException(status_code=400, detail=f"Prediction Error: {str(e)}")
+        derive_trade_time(record)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Trade_Date: {e}")
+    # Anonymous trades get an id for the response (and a deferred explanation) but are not booked or persisted
+    trade_id = trade.Trade_ID or uuid.uuid4().hex
+    batcher = ml_models.get("batcher")
+    cache = ml_models.get("cache")
+    model_version = model["version"]
+
+    # A. Get Probability (repeated trade profiles are answered from the cache)
+    cached = None
+    if cache is not None:
+        with metrics.stage("cache"):
+            cache_key = cache.key(record)
+            cached = cache.get(cache_key, model_version)
+
+    if cached is not None:
+        prob, cached_explanation = cached
+        tier = "cache"
+    else:
+        cached_explanation = None
+        # [:, 1] gets the probability of Class 1 (Failure)
+        # Scoring never runs on the event loop: either the micro-batcher's worker thread or the threadpool
+        # (with the batcher, "score" includes the wait for the batch; its encode/predict are timed on its thread)
+        try:
+            with metrics.stage("score"):
+                if batcher is not None:
+                    prob, tier = await batcher.submit(record, model)
+                else:
+                    prob, tier = await run_in_threadpool(score_one, record, model)
+            tier = TIER_NAMES[int(tier)]
+        except Exception as e:
+            metrics.inc("errors_total", stage="predict")
+            print(f"Prediction Error: {e}")
+            # Fallback for demo if feature mismatch
+            raise HTTPException(status_code=400, detail=f"Prediction Error: {str(e)}")
+        if cache is not None:
+            cache.put(cache_key, model_version, prob)
 
     # B. Define Risk Level
-    risk_level = "CRITICAL" if prob > 0.8 else "HIGH" if prob > 0.5 else "LOW"
+    risk_level = classify_risk(prob)
+    with metrics.stage("record"):
+        if trade.Trade_ID:
+            record_scored([scored_row(trade_id, record, prob, risk_level, tier, model_version)])
+        if "drift" in model:
+            model["drift"].observe_one(record, float(prob))
+    metrics.inc("trades_scored_total", endpoint="predict")
 
     # C. Explainability (SHAP)
-    # We need to transform the data first because SHAP works on the transformed features
+    # Native TreeSHAP from the booster, folded back onto the business features
     explanation = {
         "base_value": 0.0,
         "feature_contributions": []
     }
+    explanation_id, explanation_status = None, None
     
-    # Simplified SHAP for stability directly in API (full SHAP can be heavy/brittle)
-    # If we loaded the explainer successfully:
-    if "explainer" in ml_models:
+    explainer = model.get("explainer")
+    deferred = ml_models.get("deferred_explainer")
+    if explain == "deferred" and deferred is not None:
+        # Return now; drivers are computed in the background and fetched via GET /explanations/{id}
+        explanation_id = trade_id
+        if deferred.submit(explanation_id, record, float(prob)):
+            explanation_status = "pending"
+        else:
+            # Explainer is behind: score anyway, tell the caller to ask again later
+            explanation_id, explanation_status = None, "rejected"
+            response.headers["Retry-After"] = "1"
+    elif explain == "inline" and cached_explanation is not None:
+        explanation = cached_explanation
+    elif explain == "inline" and explainer is not None:
         try:
-            preprocessor = pipeline.named_steps['preprocessor']
-            transformed_data = preprocessor.transform(input_data)
-            explainer = ml_models["explainer"]
-            shap_values = explainer.shap_values(transformed_data)
-            
-            # Format SHAP
-            explanation = {
-                "base_value": float(explainer.expected_value),
-                "feature_contributions": [float(val) for val in shap_values[0]]
-            }
+            with metrics.stage("explain"):
+                explanation = await run_in_threadpool(explainer.explain_one, record)
+            if cache is not None:
+                cache.put(cache_key, model_version, prob, explanation)
         except Exception as e:
+            metrics.inc("errors_total", stage="explain")
             print(f"SHAP Error: {e}")
 
     return {
         "failure_probability": round(float(prob), 4),
         "risk_level": risk_level,
-        "shap_explanation": explanation
+        "shap_explanation": explanation,
+        "explanation_id": explanation_id,
+        "explanation_status": explanation_status,
+        "scoring_tier": tier,
+        "model_version": model_version,
+        "trade_id": trade_id,
+    }
+
+@app.get("/explanations/stats")
+def deferred_explainer_stats():
+    deferred = ml_models.get("deferred_explainer")
+    if deferred is None:
+        return {"enabled": False}
+    return {"enabled": True, **deferred.stats()}
+
+@app.get("/explanations/{explanation_id}", response_model=ExplanationResponse)
+def get_explanation(explanation_id: str):
+    deferred = ml_models.get("deferred_explainer")
+    if deferred is None:
+        raise HTTPException(status_code=503, detail="Deferred explanations are not enabled")
+    entry = deferred.get(explanation_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Unknown explanation '{explanation_id}'")
+    return {
+        "id": explanation_id,
+        "status": entry["status"],
+        "failure_probability": entry.get("failure_probability"),
+        "shap_explanation": entry.get("shap_explanation"),
+        "error": entry.get("error"),
     }
+
+# --- 4. Batch Endpoint (T-2 sweep) ---
+@app.post("/predict/batch", response_model=BatchPredictionResponse)
+def predict_settlement_failure_batch(batch: BatchPredictionRequest):
+    # Sync handler on purpose: FastAPI runs it in the threadpool, so a large
+    # sweep does not block the event loop for single-trade /predict calls.
+    model = active_model()
+    if model is None:
+        raise HTTPException(status_code=500, detail="Model not loaded")
+
+    if len(batch.trades) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch of {len(batch.trades)} trades exceeds MAX_BATCH_SIZE={MAX_BATCH_SIZE}",
+        )
+
+    metrics.checkpoint("parse")
+
+    # A. Validate row by row; bad rows are reported, not fatal
+    results = [{"index": i} for i in range(len(batch.trades))]
+    valid_rows, valid_idx = [], []
+    with metrics.stage("validate"):
+        for i, raw in enumerate(batch.trades):
+            try:
+                valid_rows.append(TradeRequest(**raw).model_dump())
+                valid_idx.append(i)
+            except ValidationError as e:
+                results[i]["error"] = format_validation_error(e)
+    with metrics.stage("features"):
+        bad = set(derive_trade_time_batch(valid_rows))
+    if bad:
+        for j in bad:
+            results[valid_idx[j]]["error"] = "Trade_Date: unparseable or outside the settlement calendar"
+        valid_rows = [r for j, r in enumerate(valid_rows) if j not in bad]
+        valid_idx = [i for j, i in enumerate(valid_idx) if j not in bad]
+    if len(valid_idx) < len(results):
+        metrics.inc("errors_total", len(results) - len(valid_idx), stage="validate")
+
+    # B. Score all valid rows as one matrix (cache hits are skipped)
+    if valid_rows:
+        cache = ml_models.get("cache")
+        model_version = model["version"]
+        probs = np.empty(len(valid_rows))
+        tiers = ["cache"] * len(valid_rows)
+        explanations = [None] * len(valid_rows)
+        keys = [cache.key(r) for r in valid_rows] if cache is not None else None
+        misses = []
+        for j in range(len(valid_rows)):
+            cached = cache.get(keys[j], model_version) if cache is not None else None
+            if cached is None:
+                misses.append(j)
+            else:
+                probs[j], explanations[j] = cached
+
+        if misses:
+            try:
+                with metrics.stage("score"):
+                    scored = score_records([valid_rows[j] for j in misses], model)
+            except Exception as e:
+                metrics.inc("errors_total", stage="predict")
+                print(f"Batch Prediction Error: {e}")
+                raise HTTPException(status_code=400, detail=f"Prediction Error: {str(e)}")
+            probs[misses] = scored[:, 0]
+            for j, tier in zip(misses, scored[:, 1]):
+                tiers[j] = TIER_NAMES[int(tier)]
+            if cache is not None:
+                for j in misses:
+                    cache.put(keys[j], model_version, probs[j])
+
+        rows = []
+        for i, record, prob, tier in zip(valid_idx, valid_rows, probs, tiers):
+            results[i]["trade_id"] = record["Trade_ID"] or uuid.uuid4().hex
+            results[i]["failure_probability"] = round(float(prob), 4)
+            results[i]["risk_level"] = classify_risk(prob)
+            results[i]["scoring_tier"] = tier
+            if record["Trade_ID"]:
+                rows.append(scored_row(record["Trade_ID"], record, prob, results[i]["risk_level"], tier, model_version))
+        with metrics.stage("record"):
+            record_scored(rows)
+            if "drift" in model:
+                model["drift"].observe_records(valid_rows, probs)
+        metrics.inc("trades_scored_total", len(valid_rows), endpoint="batch")
+
+        # C. Explanations for the whole batch in one pred_contribs call
+        explainer = model.get("explainer")
+        if batch.explain and explainer is not None:
+            try:
+                todo = [j for j in range(len(valid_rows)) if explanations[j] is None]
+                if todo:
+                    with metrics.stage("explain"):
+                        computed = explainer.explain_records([valid_rows[j] for j in todo])
+                    for j, explanation in zip(todo, computed):
+                        explanations[j] = explanation
+                        if cache is not None:
+                            cache.put(keys[j], model_version, probs[j], explanation)
+                for i, explanation in zip(valid_idx, explanations):
+                    results[i]["shap_explanation"] = explanation
+            except Exception as e:
+                metrics.inc("errors_total", stage="explain")
+                print(f"SHAP Error: {e}")
+
+    return {
+        "total": len(results),
+        "scored": len(valid_idx),
+        "failed": len(results) - len(valid_idx),
+        "model_version": model["version"],
+        "results": results,
+    }
+
+# --- 5. Columnar Bulk Endpoint (booking-system batches) ---
+def derive_columnar_trade_time(batch):
+    """
+    Replaces the Trade_Day / Trade_Hour columns of a decoded batch with ones
+    derived from its Trade_Date column (raw timestamps), parsing each distinct
+    timestamp once. Returns an error message, or None.
+    """
+    column = batch["columns"].get("Trade_Date")
+    if column is None:
+        return None
+    if column["kind"] == "string":
+        stamps, codes = np.unique(column["values"], return_inverse=True)
+        codes = codes.reshape(-1)
+    elif column["kind"] == "category":
+        stamps, codes = np.asarray(column["categories"], dtype=object), column["codes"]
+        if ((codes < 0) | (codes >= len(stamps))).any():
+            return "Trade_Date: null or out-of-range codes"
+    else:
+        return f"Trade_Date: expected a string or dictionary column, got {column['kind']}"
+    derived = derive_trade_features(stamps)
+    invalid = derived["invalid"][codes]
+    if invalid.any():
+        return (f"Trade_Date: {int(invalid.sum())} unparseable or out-of-range timestamps "
+                f"(first at row {int(np.argmax(invalid))})")
+    days, day_codes = np.unique(derived["Trade_Day"].astype(str), return_inverse=True)
+    batch["columns"]["Trade_Day"] = {"kind": "category", "codes": day_codes.reshape(-1)[codes], "categories": days.tolist()}
+    batch["columns"]["Trade_Hour"] = {"kind": "numeric", "values": derived["Trade_Hour"][codes].astype(np.float64)}
+    return None
+
+def score_columnar(body, content_type, model, reject_unknown=False):
+    """
+    Decodes a columnar batch, validates it column by column, scores it as one
+    matrix and returns (payload, media type) in the same wire format.
+    """
+    arrow = content_type == columnar_codec.ARROW_MEDIA_TYPE
+    try:
+        with metrics.stage("decode"):
+            batch = columnar_codec.decode_arrow(body) if arrow else columnar_codec.decode_batch(body)
+    except columnar_codec.ColumnarFormatError as e:
+        metrics.inc("errors_total", stage="decode")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    n_rows = batch["num_rows"]
+    if n_rows > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch of {n_rows} trades exceeds MAX_BATCH_SIZE={MAX_BATCH_SIZE}")
+
+    # A. Column-wise validation: one check per column, never per row
+    with metrics.stage("features"):
+        error = derive_columnar_trade_time(batch)
+    if error:
+        metrics.inc("errors_total", stage="validate")
+        raise HTTPException(status_code=422, detail=[error])
+    with metrics.stage("validate"):
+        numeric, coded, errors = columnar_codec.prepare_trade_columns(
+            batch, COLUMNAR_NUMERIC_FIELDS, COLUMNAR_CATEGORICAL_FIELDS, COLUMNAR_DEFAULTS)
+    if errors:
+        metrics.inc("errors_total", stage="validate")
+        raise HTTPException(status_code=422, detail=errors)
+    fast_path = model["fast_path"]
+    known = {f["name"]: set(f["categories"]) for f in fast_path.spec["categorical"]}
+    unknown = columnar_codec.unknown_categories(coded, known)
+    if unknown and reject_unknown:
+        raise HTTPException(status_code=422, detail=[f"{name}: unknown categories {values}" for name, values in unknown.items()])
+
+    # B. Encode straight from the buffers (categories resolved once per dictionary entry) and score
+    with metrics.stage("encode"):
+        X = fast_path.encode_columns(numeric, n_rows, coded=coded)
+    try:
+        scored = score_records(X, model)
+    except Exception as e:
+        metrics.inc("errors_total", stage="predict")
+        print(f"Columnar Prediction Error: {e}")
+        raise HTTPException(status_code=400, detail=f"Prediction Error: {str(e)}")
+    probs = scored[:, 0].astype(np.float32)
+    if "drift" in model:
+        with metrics.stage("record"):
+            model["drift"].observe_columns(numeric, coded, probs)
+    metrics.inc("trades_scored_total", n_rows, endpoint="columnar")
+
+    # C. Columnar response, row-aligned with the request
+    columns = {}
+    trade_ids = batch["columns"].get("Trade_ID")
+    if trade_ids is not None:
+        columns["Trade_ID"] = trade_ids
+    columns["failure_probability"] = {"kind": "numeric", "values": probs}
+    columns["risk_level"] = {"kind": "category", "codes": risk_levels(probs), "categories": RISK_LEVELS}
+    columns["scoring_tier"] = {"kind": "category", "codes": scored[:, 1].astype(np.int8),
+                               "categories": [TIER_NAMES[t] for t in sorted(TIER_NAMES)]}
+    metadata = {"model_version": model["version"], "unknown_categories": unknown}
+    with metrics.stage("serialize"):
+        if arrow:
+            return columnar_codec.encode_arrow(columns, n_rows, metadata), columnar_codec.ARROW_MEDIA_TYPE
+        return columnar_codec.encode_batch(columns, n_rows, metadata), columnar_codec.MEDIA_TYPE
+
+@app.post("/predict/columnar")
+async def predict_settlement_failure_columnar(
+    request: Request,
+    unknown_categories: Literal["ignore", "reject"] = "ignore",
+):
+    # Body is an SGCB batch (application/x-settlement-columnar) or an Arrow IPC stream;
+    # the response comes back in the same format with failure_probability, risk_level, scoring_tier
+    model = active_model()
+    if model is None:
+        raise HTTPException(status_code=500, detail="Model not loaded")
+    if model.get("fast_path") is None:
+        raise HTTPException(status_code=503, detail="Columnar scoring needs the compiled fast path (FAST_PATH=1)")
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in (columnar_codec.MEDIA_TYPE, columnar_codec.ARROW_MEDIA_TYPE):
+        raise HTTPException(status_code=415, detail=f"Send {columnar_codec.MEDIA_TYPE} or {columnar_codec.ARROW_MEDIA_TYPE}")
+    if content_type == columnar_codec.ARROW_MEDIA_TYPE and not columnar_codec.arrow_available():
+        raise HTTPException(status_code=415, detail=f"Arrow IPC needs pyarrow on the server; send {columnar_codec.MEDIA_TYPE}")
+
+    body = await request.body()
+    payload, media_type = await run_in_threadpool(
+        score_columnar, body, content_type, model, unknown_categories == "reject")
+    return Response(content=payload, media_type=media_type)
+
+# --- 6. Streaming Ingestion (WebSocket / NDJSON) ---
+def validate_stream_trade(raw):
+    if isinstance(raw, str):  # unparseable message/line
+        return None, raw
+    if not isinstance(raw, dict):
+        return None, "Expected a JSON object per trade"
+    try:
+        return derive_trade_time(TradeRequest(**raw).model_dump()), None
+    except ValidationError as e:
+        return None, format_validation_error(e)
+    except ValueError as e:
+        return None, f"Trade_Date: {e}"
+
+async def score_stream_batch(records):
+    # One micro-batch of a stream, scored off the event loop (worker processes in pool mode)
+    model = active_model()
+    scored = await run_in_threadpool(score_records, records, model)
+    results, rows = [], []
+    for record, (prob, tier) in zip(records, scored):
+        result = {
+            "trade_id": record["Trade_ID"] or uuid.uuid4().hex,
+            "failure_probability": round(float(prob), 4),
+            "risk_level": classify_risk(prob),
+            "scoring_tier": TIER_NAMES[int(tier)],
+            "model_version": model["version"],
+        }
+        results.append(result)
+        if record["Trade_ID"]:
+            rows.append(scored_row(result["trade_id"], record, prob, result["risk_level"], result["scoring_tier"],
+                                   result["model_version"]))
+    record_scored(rows)
+    if "drift" in model:
+        model["drift"].observe_records(records, scored[:, 0])
+    metrics.inc("trades_scored_total", len(results), endpoint="stream")
+    return results
+
+def new_stream_session():
+    return StreamSession(validate_stream_trade, score_stream_batch, ml_models["stream_hub"], **ml_models["stream_config"])
+
+@app.websocket("/stream/trades")
+async def stream_trades_websocket(websocket: WebSocket):
+    # Each message is a trade object or an array of trades; results come back as
+    # {"type": "results", "results": [...]} messages, one per scored micro-batch
+    await websocket.accept()
+    if active_model() is None:
+        await websocket.close(code=1011, reason="Model not loaded")
+        return
+
+    async def receive():
+        try:
+            return parse_stream_message(await websocket.receive_text())
+        except WebSocketDisconnect:
+            return None
+
+    async def send(results):
+        await websocket.send_json({"type": "results", "results": results})
+
+    try:
+        await new_stream_session().run(receive, send)
+    except WebSocketDisconnect:
+        pass  # client left before its last results went out
+
+class DuplexStreamingResponse(StreamingResponse):
+    # StreamingResponse watches for disconnects by reading the request's receive channel,
+    # which would steal the body chunks the stream is still consuming. The body iterator
+    # reads them itself here (and sees the disconnect as ClientDisconnect).
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+async def _ndjson_lines(chunks):
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+@app.post("/stream/trades")
+async def stream_trades_ndjson(request: Request):
+    # Chunked NDJSON in (one trade per line), NDJSON out as each micro-batch is scored
+    if active_model() is None:
+        raise HTTPException(status_code=500, detail="Model not loaded")
+    lines = _ndjson_lines(request.stream())
+    # A few batches of output buffer: a client that stops reading stops being read from
+    output = asyncio.Queue(maxsize=4)
+
+    async def receive():
+        try:
+            return parse_stream_message(await lines.__anext__())
+        except (StopAsyncIteration, ClientDisconnect):
+            return None
+
+    async def send(results):
+        await output.put(results)
+
+    async def run_session():
+        try:
+            await new_stream_session().run(receive, send)
+        finally:
+            await output.put(None)
+
+    async def body():
+        session = asyncio.create_task(run_session())
+        try:
+            while (results := await output.get()) is not None:
+                yield "".join(json.dumps(r) + "\n" for r in results)
+            await session
+        finally:
+            session.cancel()
+
+    return DuplexStreamingResponse(body(), media_type="application/x-ndjson")
+
+@app.websocket("/stream/subscribe")
+async def stream_subscribe(websocket: WebSocket):
+    # Dashboards: every scored stream batch, fanned out as it is published (never re-scored)
+    await websocket.accept()
+    hub = ml_models.get("stream_hub")
+    if hub is None:
+        await websocket.close(code=1011, reason="Model not loaded")
+        return
+    queue = hub.subscribe()
+
+    async def forward():
+        while True:
+            await websocket.send_json({"type": "results", "results": await queue.get()})
+
+    pump = asyncio.create_task(forward())
+    try:
+        while True:
+            await websocket.receive_text()  # nothing expected; returns on disconnect
+    except WebSocketDisconnect:
+        pass
+    finally:
+        pump.cancel()
+        hub.unsubscribe(queue)
+
+@app.get("/stream/stats")
+def stream_stats():
+    hub = ml_models.get("stream_hub")
+    if hub is None:
+        return {"enabled": False}
+    return {"enabled": True, **ml_models["stream_config"], **hub.stats()}
+
+# --- 7. What-if Simulation (remediation ranking) ---
+def simulate_trade(request, model):
+    """
+    Scores the base trade and every perturbation in one booster call and
+    ranks the perturbations by how much they lower the failure probability.
+    Variants are deltas on the base's encoded row, never re-encoded from scratch.
+    """
+    fast_path = model["fast_path"]
+    try:
+        base = derive_trade_time(request.trade.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Trade_Date: {e}")
+    if request.perturbations is None:
+        categories = {f["name"]: f["categories"] for f in fast_path.spec["categorical"]}
+        perturbations = default_perturbations(base, categories)
+    else:
+        perturbations = [p.model_dump() for p in request.perturbations]
+    if len(perturbations) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"{len(perturbations)} perturbations exceed MAX_BATCH_SIZE={MAX_BATCH_SIZE}",
+        )
+
+    # A. Validate each perturbed trade against the schema; only the changed fields are kept
+    variants, errors = [], []
+    for p in perturbations:
+        unknown = [field for field in p["changes"] if field not in TradeRequest.model_fields]
+        if unknown:
+            errors.append(f"{p['name']}: unknown fields {unknown}")
+            continue
+        try:
+            perturbed = TradeRequest(**{**base, **p["changes"]}).model_dump()
+        except ValidationError as e:
+            errors.append(f"{p['name']}: {format_validation_error(e)}")
+            continue
+        changed = list(p["changes"])
+        if "Trade_Date" in p["changes"]:
+            # Moving the booking time moves the derived day/hour with it
+            try:
+                derive_trade_time(perturbed)
+            except ValueError as e:
+                errors.append(f"{p['name']}: Trade_Date: {e}")
+                continue
+            changed += ["Trade_Day", "Trade_Hour"]
+        variants.append({"name": p["name"], "changes": {field: perturbed[field] for field in changed}})
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+
+    # B. Base encoded once, one delta row per variant, one booster call for all rows.
+    # Always the full model: a cascade early exit on some rows would add noise to the differences.
+    with metrics.stage("encode"):
+        X = fast_path.encode_variants(base, [v["changes"] for v in variants])
+    try:
+        with metrics.stage("predict"):
+            probs = fast_path.predict_proba(X)
+    except Exception as e:
+        metrics.inc("errors_total", stage="predict")
+        print(f"Simulation Error: {e}")
+        raise HTTPException(status_code=400, detail=f"Prediction Error: {str(e)}")
+
+    explanations = [None] * len(X)
+    explainer = model.get("explainer")
+    if request.explain and explainer is not None:
+        try:
+            with metrics.stage("explain"):
+                explanations = explainer.explain_matrix(X)
+        except Exception as e:
+            metrics.inc("errors_total", stage="explain")
+            print(f"SHAP Error: {e}")
+
+    # C. Rank by risk reduction. What-if rows are not trades: nothing is persisted or booked.
+    base_prob = float(probs[0])
+    for variant, prob, explanation in zip(variants, probs[1:], explanations[1:]):
+        variant["failure_probability"] = round(float(prob), 4)
+        variant["risk_level"] = classify_risk(prob)
+        variant["shap_explanation"] = explanation
+    ranked = rank_variants(round(base_prob, 4), variants)
+    for variant in ranked:
+        variant["risk_reduction"] = round(variant["risk_reduction"], 4)
+    return {
+        "failure_probability": round(base_prob, 4),
+        "risk_level": classify_risk(base_prob),
+        "model_version": model["version"],
+        "shap_explanation": explanations[0],
+        "variants": ranked,
+    }
+
+@app.post("/simulate", response_model=SimulationResponse)
+def simulate_remediation(request: SimulationRequest):
+    # Sync handler: runs in the threadpool like /predict/batch
+    model = active_model()
+    if model is None:
+        raise HTTPException(status_code=500, detail="Model not loaded")
+    if model.get("fast_path") is None:
+        raise HTTPException(status_code=503, detail="Simulation needs the compiled fast path (FAST_PATH=1)")
+    metrics.checkpoint("validate")
+    return simulate_trade(request, model)
+
+_preload_worker_model()
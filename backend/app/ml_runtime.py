@@ -0,0 +1,18 @@
+import os
+import sys
+
+# The serving-side ML code (fast path encoder, explanations, ...) lives in ml_service/
+# next to the trainer so both sides stay in lockstep. The image copies it to ML_SERVICE_DIR (Compose mounts it there in development).
+ML_SERVICE_DIR = os.path.abspath(
+    os.getenv("ML_SERVICE_DIR", os.path.join(os.path.dirname(__file__), "..", "..", "ml_service"))
+)
+if ML_SERVICE_DIR not in sys.path:
+    sys.path.append(ML_SERVICE_DIR)
+
+from fast_path import FastPathPredictor  # noqa: E402
+from explain import ExplanationEngine  # noqa: E402
+from cascade import CascadePredictor, CASCADE_FILE, TIER_FULL, TIER_NAMES, risk_levels  # noqa: E402
+from bundle import BUNDLE_DIR, current_version as current_bundle_version, load_bundle  # noqa: E402
+from metrics import Metrics, TimingMiddleware, SIZE_BUCKETS  # noqa: E402
+from drift import DriftMonitor, DRIFT_FILE  # noqa: E402
+from features import derive_one, derive_trade_features  # noqa: E402
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 class TradeRequest(BaseModel):
     Notional_Amount_USD: float
@@ -17,6 +17,15 @@ class TradeRequest(BaseModel):
     # We should probably ask for all of them to be safe, defaulting others if needed.
     # For this specific user request, they listed specific fields, let's stick to those + defaults for others.
     
+    # Optional upstream identifier; deferred explanations are stored against it
+    Trade_ID: Optional[str] = None
+    # Optional booking details (not model inputs); they key the exposure aggregates of the trade book
+    Counterparty: Optional[str] = None
+    Settlement_Date: Optional[str] = None  # ISO date, e.g. "2024-03-15"
+    # Raw booking timestamp (ISO 8601, e.g. "2024-03-13T16:45:00"). When present, Trade_Day / Trade_Hour
+    # are derived from it and a missing Settlement_Date becomes T+2 business days on the currency's calendar
+    Trade_Date: Optional[str] = None
+
     # Defaults/Extras to satisfy pipeline structure
     Custodian_Location: str = "US"
     Operation_Type: str = "DVP"
@@ -45,3 +54,74 @@ class PredictionResponse(BaseModel):
     failure_probability: float
     risk_level: str
     shap_explanation: Dict[str, Any]
+    # Set when the explanation is deferred (?explain=deferred): poll GET /explanations/{explanation_id}
+    explanation_id: Optional[str] = None
+    explanation_status: Optional[str] = None
+    # Which tier produced the score: "prefix" (cascade early exit), "full" or "cache"
+    scoring_tier: Optional[str] = None
+    # Serving model version (bundle content hash) that produced the score
+    model_version: Optional[str] = None
+    # Trade_ID, or the id generated for an anonymous trade (its row in the trades table)
+    trade_id: Optional[str] = None
+
+class ExplanationResponse(BaseModel):
+    id: str
+    status: str  # pending | ready | failed
+    failure_probability: Optional[float] = None
+    shap_explanation: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+# --- Batch Scoring (End-of-day T-2 sweep) ---
+class BatchPredictionRequest(BaseModel):
+    # Rows are kept as raw dicts so a single malformed trade is reported
+    # per-row instead of rejecting the whole batch with a 422.
+    trades: List[Dict[str, Any]]
+    # SHAP drivers for every scored row (one booster call for the whole batch)
+    explain: bool = False
+
+class BatchPredictionItem(BaseModel):
+    index: int
+    trade_id: Optional[str] = None
+    failure_probability: Optional[float] = None
+    risk_level: Optional[str] = None
+    scoring_tier: Optional[str] = None
+    error: Optional[str] = None
+    shap_explanation: Optional[Dict[str, Any]] = None
+
+class BatchPredictionResponse(BaseModel):
+    total: int
+    scored: int
+    failed: int
+    model_version: Optional[str] = None
+    results: List[BatchPredictionItem]
+
+# --- What-if Simulation (remediation ranking) ---
+class Perturbation(BaseModel):
+    # e.g. {"name": "fix_ssi", "changes": {"SSI_Status": "Match"}}
+    name: str
+    changes: Dict[str, Any]
+
+class SimulationRequest(BaseModel):
+    trade: TradeRequest
+    # None: the standard menu (fix SSI, switch custodian, split notional, Monday morning)
+    perturbations: Optional[List[Perturbation]] = None
+    # SHAP drivers for the base and every variant (one extra booster call for all of them)
+    explain: bool = False
+
+class SimulationVariant(BaseModel):
+    name: str
+    changes: Dict[str, Any]
+    failure_probability: float
+    risk_level: str
+    # Base minus variant failure probability; positive means the fix lowers the risk
+    risk_reduction: float
+    rank: int
+    shap_explanation: Optional[Dict[str, Any]] = None
+
+class SimulationResponse(BaseModel):
+    failure_probability: float
+    risk_level: str
+    model_version: Optional[str] = None
+    shap_explanation: Optional[Dict[str, Any]] = None
+    # Ranked by risk_reduction, best fix first
+    variants: List[SimulationVariant]
@@ -0,0 +1,282 @@
+import json
+import struct
+
+import numpy as np
+
+# Columnar binary batch ("SGCB"), the numpy-only wire format of /predict/columnar:
+#
+#   b"SGCB" | uint32 LE header length | JSON header | zero padding to 8 bytes | column buffers
+#
+# The header lists every column with its kind, numpy dtype string, and the byte
+# offset/size of its buffer (relative to the first buffer, 8-byte aligned).
+# Kinds mirror the on-disk columnar dataset format (ml_service/columnar.py):
+#   numeric  - one little-endian int/float buffer
+#   category - dictionary codes (int8/16/32, -1 = null) plus "categories" in the header
+#   string   - fixed-width UTF-8 bytes ("|S<n>")
+# Decoding maps the buffers straight into read-only NumPy arrays over the request body.
+MAGIC = b"SGCB"
+FORMAT_NAME = "settlement-columnar-batch"
+FORMAT_VERSION = 1
+MEDIA_TYPE = "application/x-settlement-columnar"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+NUMERIC_DTYPES = {"f4", "f8", "i1", "i2", "i4", "i8", "u1", "u2", "u4"}
+CODE_DTYPES = {"i1", "i2", "i4"}
+_PREFIX = struct.Struct("<4sI")
+_ALIGN = 8
+
+
+class ColumnarFormatError(ValueError):
+    """The payload is not a well-formed columnar batch."""
+
+
+def _pad(n):
+    return (-n) % _ALIGN
+
+
+def _dtype_key(dtype):
+    return f"{dtype.kind}{dtype.itemsize}"
+
+
+def encode_batch(columns, num_rows, metadata=None):
+    """
+    Serializes {name: column} (see the kinds above) into one SGCB payload.
+    A column is {"kind": "numeric", "values": array}, {"kind": "category",
+    "codes": array, "categories": [...]}, or {"kind": "string", "values": array}.
+    """
+    specs, buffers, offset = [], [], 0
+    for name, column in columns.items():
+        if column["kind"] == "category":
+            values = np.asarray(column["codes"])
+            if values.dtype.kind != "i":
+                raise ColumnarFormatError(f"Column '{name}': category codes must be signed integers")
+            spec = {"categories": [str(c) for c in column["categories"]]}
+        elif column["kind"] == "string":
+            values = np.asarray(column["values"])
+            if values.dtype.kind != "S":
+                values = np.char.encode(values.astype(str), "utf-8")
+            spec = {}
+        else:
+            values = np.asarray(column["values"])
+            spec = {}
+        values = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder("<"))
+        if len(values) != num_rows:
+            raise ColumnarFormatError(f"Column '{name}' has {len(values)} rows, expected {num_rows}")
+        data = values.tobytes()
+        specs.append({"name": name, "kind": column["kind"], "dtype": values.dtype.str,
+                      "offset": offset, "nbytes": len(data), **spec})
+        buffers.append(data + b"\0" * _pad(len(data)))
+        offset += len(buffers[-1])
+
+    header = json.dumps({
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "num_rows": int(num_rows),
+        "metadata": metadata or {},
+        "columns": specs,
+    }).encode()
+    prefix = _PREFIX.pack(MAGIC, len(header)) + header
+    return b"".join([prefix, b"\0" * _pad(len(prefix))] + buffers)
+
+
+def decode_batch(body):
+    """
+    Parses an SGCB payload into {"num_rows", "metadata", "columns"}. Column
+    arrays are zero-copy views over `body`; nothing is materialized per row.
+    """
+    body = memoryview(body)
+    if len(body) < _PREFIX.size:
+        raise ColumnarFormatError("Payload is too short")
+    magic, header_len = _PREFIX.unpack_from(body)
+    if magic != MAGIC:
+        raise ColumnarFormatError(f"Not a {FORMAT_NAME} payload (bad magic)")
+    header_end = _PREFIX.size + header_len
+    if header_end > len(body):
+        raise ColumnarFormatError("Truncated header")
+    try:
+        header = json.loads(bytes(body[_PREFIX.size:header_end]))
+    except ValueError as e:
+        raise ColumnarFormatError(f"Unreadable header: {e}") from e
+    if not isinstance(header, dict) or header.get("format") != FORMAT_NAME \
+            or header.get("version") != FORMAT_VERSION:
+        fmt = header if not isinstance(header, dict) else f"{header.get('format')} v{header.get('version')}"
+        raise ColumnarFormatError(f"Unsupported format {fmt}")
+    # The header is client input: a missing key or a value of the wrong type is a bad payload, not a 500
+    try:
+        return _decode_columns(body, header, header_end + _pad(header_end))
+    except ColumnarFormatError:
+        raise
+    except KeyError as e:
+        raise ColumnarFormatError(f"Malformed header: missing {e}") from e
+    except (TypeError, ValueError) as e:
+        raise ColumnarFormatError(f"Malformed header: {e}") from e
+
+
+def _size(value, what):
+    # Row counts, offsets and sizes: plain non-negative integers (JSON floats, bools and strings rejected)
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ColumnarFormatError(f"{what} must be a non-negative integer, got {value!r}")
+    return value
+
+
+def _decode_columns(body, header, data_start):
+    num_rows = _size(header["num_rows"], "num_rows")
+    columns = {}
+    for spec in header["columns"]:
+        name, kind = spec["name"], spec["kind"]
+        try:
+            dtype = np.dtype(spec["dtype"])
+        except TypeError as e:
+            raise ColumnarFormatError(f"Column '{name}': bad dtype {spec['dtype']!r}") from e
+        if dtype.byteorder == ">":
+            raise ColumnarFormatError(f"Column '{name}': buffers must be little-endian")
+        if kind not in ("numeric", "category", "string"):
+            raise ColumnarFormatError(f"Column '{name}': unknown kind {kind!r}")
+        valid = dtype.kind == "S" if kind == "string" else \
+            _dtype_key(dtype) in (NUMERIC_DTYPES if kind == "numeric" else CODE_DTYPES)
+        if not valid:
+            raise ColumnarFormatError(f"Column '{name}': dtype {dtype.str} is not valid for a {kind} column")
+        start = data_start + _size(spec["offset"], f"Column '{name}': offset")
+        nbytes = _size(spec["nbytes"], f"Column '{name}': nbytes")
+        if nbytes != num_rows * dtype.itemsize or start + nbytes > len(body):
+            raise ColumnarFormatError(f"Column '{name}': buffer does not hold {num_rows} rows")
+        values = np.frombuffer(body, dtype=dtype, count=num_rows, offset=start)
+        if kind == "category":
+            columns[name] = {"kind": kind, "codes": values, "categories": list(spec["categories"])}
+        else:
+            columns[name] = {"kind": kind, "values": values}
+    return {"num_rows": num_rows, "metadata": header.get("metadata", {}), "columns": columns}
+
+
+# --- Arrow IPC (optional; needs pyarrow) ---
+def arrow_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError as e:
+        raise ColumnarFormatError(f"Arrow IPC needs pyarrow; send {MEDIA_TYPE} instead") from e
+    return pyarrow
+
+
+def decode_arrow(body):
+    """Arrow IPC stream -> the same structure as decode_batch (dictionary columns keep their codes)."""
+    pa = _import_pyarrow()
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(body)).read_all().combine_chunks()
+    except pa.ArrowInvalid as e:
+        raise ColumnarFormatError(f"Unreadable Arrow stream: {e}") from e
+
+    columns = {}
+    for name, chunked in zip(table.column_names, table.columns):
+        array = chunked.chunks[0] if chunked.num_chunks else pa.array([], type=chunked.type)
+        if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+            array = array.dictionary_encode()
+        if pa.types.is_dictionary(array.type):
+            # Nulls become code -1 (the fill keeps the buffer numeric)
+            codes = array.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+            columns[name] = {"kind": "category", "codes": codes, "categories": array.dictionary.to_pylist()}
+        elif pa.types.is_integer(array.type) or pa.types.is_floating(array.type):
+            if array.null_count:
+                raise ColumnarFormatError(f"Column '{name}' has {array.null_count} null values")
+            columns[name] = {"kind": "numeric", "values": array.to_numpy(zero_copy_only=True)}
+        else:
+            raise ColumnarFormatError(f"Column '{name}': unsupported Arrow type {array.type}")
+    return {"num_rows": table.num_rows, "metadata": {}, "columns": columns}
+
+
+def encode_arrow(columns, num_rows, metadata=None):
+    pa = _import_pyarrow()
+    arrays, names = [], []
+    for name, column in columns.items():
+        if column["kind"] == "category":
+            array = pa.DictionaryArray.from_arrays(pa.array(column["codes"]), pa.array(column["categories"]))
+        elif column["kind"] == "string":
+            array = pa.array(np.char.decode(column["values"], "utf-8"))
+        else:
+            array = pa.array(column["values"])
+        arrays.append(array)
+        names.append(name)
+    schema_metadata = {k: json.dumps(v) for k, v in (metadata or {}).items()}
+    batch = pa.RecordBatch.from_arrays(arrays, names=names).replace_schema_metadata(schema_metadata)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+# --- Column-wise validation ---
+def prepare_trade_columns(batch, numeric_fields, categorical_fields, defaults):
+    """
+    Validates a decoded batch against the trade schema one column at a time.
+
+    Returns (numeric, coded, errors): float arrays for the numeric fields,
+    (codes, categories) pairs for the categorical ones (string columns are
+    dictionary-encoded here with np.unique), and a list of error messages.
+    Absent optional fields are filled from `defaults` as a single category.
+    """
+    n = batch["num_rows"]
+    columns = batch["columns"]
+    numeric, coded, errors = {}, {}, []
+
+    for name in numeric_fields:
+        column = columns.get(name)
+        if column is None:
+            if name in defaults:
+                numeric[name] = np.full(n, float(defaults[name]))
+            else:
+                errors.append(f"{name}: required column is missing")
+            continue
+        if column["kind"] != "numeric":
+            errors.append(f"{name}: expected a numeric column, got {column['kind']}")
+            continue
+        values = column["values"]
+        bad = ~np.isfinite(values) if values.dtype.kind == "f" else None
+        if bad is not None and bad.any():
+            errors.append(f"{name}: {int(bad.sum())} non-finite values (first at row {int(np.argmax(bad))})")
+            continue
+        numeric[name] = values
+
+    for name in categorical_fields:
+        column = columns.get(name)
+        if column is None:
+            if name in defaults:
+                coded[name] = (np.zeros(n, dtype=np.int8), [str(defaults[name])])
+            else:
+                errors.append(f"{name}: required column is missing")
+            continue
+        if column["kind"] == "string":
+            categories, codes = np.unique(column["values"], return_inverse=True)
+            coded[name] = (codes.reshape(-1), [c.decode("utf-8") for c in categories])
+            continue
+        if column["kind"] != "category":
+            errors.append(f"{name}: expected a string or dictionary column, got {column['kind']}")
+            continue
+        codes, categories = column["codes"], column["categories"]
+        invalid = (codes < 0) | (codes >= len(categories))
+        if invalid.any():
+            errors.append(f"{name}: {int(invalid.sum())} null or out-of-range codes "
+                          f"(first at row {int(np.argmax(invalid))})")
+            continue
+        coded[name] = (codes, [str(c) for c in categories])
+    return numeric, coded, errors
+
+
+def unknown_categories(coded, known):
+    """Categories that appear in the batch but not in the model's encoder, per column."""
+    unknown = {}
+    for name, (codes, categories) in coded.items():
+        if name not in known:
+            continue
+        used = np.unique(codes)
+        missing = [categories[i] for i in used if categories[i] not in known[name]]
+        if missing:
+            unknown[name] = missing
+    return unknown
@@ -0,0 +1,273 @@
+import json
+import queue
+import threading
+from collections import Counter, OrderedDict
+
+from sqlalchemy import literal, select, update
+
+from ..db.models import Trade
+from .trade_writer import merge_details
+
+
+class InMemoryExplanationStore:
+    """Bounded LRU of finished explanations, used when no database is configured."""
+
+    def __init__(self, max_entries=100_000):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save_many(self, entries):
+        with self._lock:
+            for entry in entries:
+                self._items[entry["id"]] = entry
+                self._items.move_to_end(entry["id"])
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def get(self, explanation_id):
+        with self._lock:
+            return self._items.get(explanation_id)
+
+
+class DatabaseExplanationStore:
+    """
+    Persists explanations in Trade.prediction_details of the trade's existing
+    row; it never creates one (only trades with a Trade_ID are persisted, by
+    the trade writer). Explanations of anonymous trades live in a bounded
+    in-memory LRU. So do those whose row the write-behind writer has not
+    flushed yet: they are written by a later save, or by the next lookup of
+    the id once the row exists.
+    """
+
+    def __init__(self, session_factory, max_entries=100_000):
+        self.session_factory = session_factory
+        self.memory = InMemoryExplanationStore(max_entries)
+        self._waiting = OrderedDict()  # id -> entry of a booked trade whose row is not written yet
+        self.max_waiting = max_entries
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _details(entry):
+        details = {"explanation_status": entry["status"]}
+        if entry.get("shap_explanation") is not None:
+            details["shap_explanation"] = entry["shap_explanation"]
+        if entry.get("error"):
+            details["error"] = entry["error"]
+        return details
+
+    def _update_existing(self, entries):
+        # prediction_details is shared with the trade writer's scoring fields: merged, never overwritten
+        db = self.session_factory()
+        try:
+            connection = db.connection()
+            dialect = connection.dialect.name
+            ids = [entry["id"] for entry in entries]
+            existing = {row[0] for row in connection.execute(select(Trade.trade_id).where(Trade.trade_id.in_(ids)))}
+            for entry in entries:
+                if entry["id"] in existing:
+                    incoming = literal(json.dumps(self._details(entry)))
+                    connection.execute(
+                        update(Trade).where(Trade.trade_id == entry["id"]).values(
+                            prediction_details=merge_details(dialect, Trade.prediction_details, incoming)))
+            db.commit()
+            return existing
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def save_many(self, entries):
+        booked = [entry for entry in entries if (entry.get("record") or {}).get("Trade_ID")]
+        self.memory.save_many(entries)  # answers lookups until (or instead of) the database row
+        with self._lock:
+            ids = {entry["id"] for entry in booked}
+            retry = [entry for entry in self._waiting.values() if entry["id"] not in ids]
+        if not booked and not retry:
+            return
+        written = self._update_existing(retry + booked)
+        with self._lock:
+            for entry in retry + booked:
+                if entry["id"] in written:
+                    self._waiting.pop(entry["id"], None)
+                else:
+                    self._waiting[entry["id"]] = entry
+                    self._waiting.move_to_end(entry["id"])
+            while len(self._waiting) > self.max_waiting:
+                self._waiting.popitem(last=False)
+
+    def get(self, explanation_id):
+        db = self.session_factory()
+        try:
+            trade = db.query(Trade).filter(Trade.trade_id == explanation_id).first()
+        finally:
+            db.close()
+        details = (trade.prediction_details or {}) if trade is not None else {}
+        if "explanation_status" in details:
+            return {
+                "id": explanation_id,
+                "status": details["explanation_status"],
+                "failure_probability": trade.risk_score,
+                "shap_explanation": details.get("shap_explanation"),
+                "error": details.get("error"),
+            }
+        if trade is not None:
+            with self._lock:
+                waiting = self._waiting.pop(explanation_id, None)
+            if waiting is not None:
+                self.save_many([waiting])  # the writer has flushed the row since
+        return self.memory.get(explanation_id)
+
+
+class DeferredExplainer:
+    """
+    Computes SHAP explanations off the scoring path.
+
+    /predict?explain=deferred hands the trade to submit() and returns at once.
+    Background threads drain the bounded queue in batches (one pred_contribs
+    call per batch) and write the results to the store. When the queue is
+    full, submit() refuses the job instead of letting the backlog grow
+    without bound; the caller can retry the explanation later.
+
+    Results the store refuses are kept in memory (bounded like the queue)
+    and served from there until a later save, retried with every batch,
+    gets them in.
+    """
+
+    def __init__(self, explain_fn, store, workers=2, max_queue=1000, max_batch=256):
+        self.explain_fn = explain_fn  # list[dict] -> list of explanation dicts, same order
+        self.store = store
+        self.n_workers = max(1, int(workers))
+        self.max_batch = max(1, int(max_batch))
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        # Jobs queued or running per id: the same id may be submitted again while its first job runs
+        self._pending = Counter()
+        self._unsaved = OrderedDict()  # id -> finished entry the store has not accepted yet
+        self._lock = threading.Lock()
+        self._threads = []
+
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.store_errors = 0
+
+    def start(self):
+        for i in range(self.n_workers):
+            thread = threading.Thread(target=self._run, name=f"explainer-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        # Finish what is queued, then let every worker see a sentinel
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, explanation_id, record, failure_probability):
+        job = {"id": explanation_id, "record": record, "failure_probability": failure_probability}
+        with self._lock:
+            self._pending[explanation_id] += 1
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._unmark(explanation_id)  # only this job's mark, an earlier one may still be running
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def _unmark(self, explanation_id):
+        self._pending[explanation_id] -= 1
+        if self._pending[explanation_id] <= 0:
+            del self._pending[explanation_id]
+
+    def get(self, explanation_id):
+        with self._lock:
+            if explanation_id in self._pending:
+                return {"id": explanation_id, "status": "pending"}
+            entry = self._unsaved.get(explanation_id)
+        if entry is not None:
+            return {"id": explanation_id, "status": entry["status"], "failure_probability": entry["failure_probability"],
+                    "shap_explanation": entry.get("shap_explanation"), "error": entry.get("error")}
+        return self.store.get(explanation_id)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            jobs = [job]
+            stop = False
+            while len(jobs) < self.max_batch:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                jobs.append(nxt)
+            self._process(jobs)
+            if stop:
+                return
+
+    def _process(self, jobs):
+        try:
+            explanations = self.explain_fn([job["record"] for job in jobs])
+            entries = [{**job, "status": "ready", "shap_explanation": e} for job, e in zip(jobs, explanations)]
+        except Exception as e:
+            print(f"Deferred SHAP Error: {e}")
+            entries = [{**job, "status": "failed", "error": str(e)} for job in jobs]
+
+        ids = {entry["id"] for entry in entries}
+        with self._lock:
+            # Retry what the store refused earlier (results for the same ids in this batch supersede them)
+            retry = [entry for entry in self._unsaved.values() if entry["id"] not in ids]
+        try:
+            self.store.save_many(retry + entries)
+            saved = True
+        except Exception as e:
+            print(f"Explanation store error: {e}")
+            saved = False
+
+        with self._lock:
+            if saved:
+                for entry in retry:
+                    if self._unsaved.get(entry["id"]) is entry:
+                        del self._unsaved[entry["id"]]
+                for entry in entries:
+                    self._unsaved.pop(entry["id"], None)
+            else:
+                self.store_errors += 1
+                for entry in entries:
+                    self._unsaved[entry["id"]] = entry
+                    self._unsaved.move_to_end(entry["id"])
+                while len(self._unsaved) > self._queue.maxsize:
+                    self._unsaved.popitem(last=False)
+            for entry in entries:
+                self._unmark(entry["id"])
+                if entry["status"] == "ready":
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.n_workers,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._queue.maxsize,
+                "pending": len(self._pending),
+                "unsaved": len(self._unsaved),
+                "store_errors": self.store_errors,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
@@ -0,0 +1,174 @@
+import asyncio
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-trade requests into one scoring call.
+
+    Requests are queued on the event loop; a collector task takes whatever is
+    waiting (up to max_batch_size), waits at most max_wait_ms for stragglers,
+    then scores the batch as one matrix on a worker thread and resolves each
+    request's future with its own probability.
+
+    Up to `concurrency` batches are scored at once (one per inference worker
+    process in pool mode); while all slots are busy the queue keeps filling,
+    so batches grow with load.
+
+    A request may carry a key (e.g. the model snapshot it was admitted
+    under): a batch only holds requests with the same key (compared by
+    identity), which is handed to score_fn as score_fn(records, key).
+    """
+
+    def __init__(self, score_fn, max_batch_size=64, max_wait_ms=2.0, concurrency=1):
+        self.score_fn = score_fn  # list[dict] -> sequence of per-record results (e.g. probabilities), same order
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.concurrency = max(1, int(concurrency))
+
+        self._queue = None
+        self._held = None  # first request of the next batch (its key differed from the batch being collected)
+        self._collector = None
+        self._executor = None
+        self._slots = None
+        self._inflight = set()
+
+        # Tuning telemetry
+        self.batch_sizes = Counter()
+        self.requests = 0
+        self.batches = 0
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="micro-batcher")
+        self._collector = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._collector is not None:
+            self._collector.cancel()
+            try:
+                await self._collector
+            except asyncio.CancelledError:
+                pass
+            self._collector = None
+        # Let batches already handed to the scorer finish
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        # Fail anything still queued so callers do not hang on shutdown
+        waiting = [self._held] if self._held is not None else []
+        self._held = None
+        while self._queue is not None and not self._queue.empty():
+            waiting.append(self._queue.get_nowait())
+        for _, future, _ in waiting:
+            if not future.done():
+                future.set_exception(RuntimeError("Micro-batcher stopped"))
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def submit(self, record, key=None):
+        """Queues one validated trade dict and waits for its failure probability."""
+        if self._collector is None:
+            raise RuntimeError("Micro-batcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((record, future, key))
+        return await future
+
+    async def _collect(self):
+        if self._held is not None:
+            batch, self._held = [self._held], None
+        else:
+            batch = [await self._queue.get()]
+        key = batch[0][2]
+        # Drain what is already waiting, then give stragglers up to max_wait
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        try:
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    item = self._queue.get_nowait()
+                else:
+                    remaining = deadline - asyncio.get_running_loop().time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item[2] is not key:
+                    self._held = item  # opens the next batch
+                    break
+                batch.append(item)
+        except asyncio.CancelledError:
+            # Stopped mid-collection: do not leave the requests already taken hanging
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Micro-batcher stopped"))
+            raise
+        return batch
+
+    def _call(self, records, key):
+        return self.score_fn(records) if key is None else self.score_fn(records, key)
+
+    def _score(self, records, key):
+        try:
+            return list(self._call(records, key)), None
+        except Exception:
+            if len(records) == 1:
+                raise
+        # One bad row must not fail its neighbours: rescore individually
+        results, errors = [], {}
+        for i, record in enumerate(records):
+            try:
+                results.append(self._call([record], key)[0])
+            except Exception as e:
+                results.append(None)
+                errors[i] = e
+        return results, errors
+
+    async def _run(self):
+        while True:
+            await self._slots.acquire()
+            batch = await self._collect()
+
+            self.batches += 1
+            self.requests += len(batch)
+            self.batch_sizes[len(batch)] += 1
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch):
+        records = [record for record, _, _ in batch]
+        try:
+            results, errors = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._score, records, batch[0][2])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        for i, (_, future, _) in enumerate(batch):
+            if future.done():  # caller went away
+                continue
+            if errors and i in errors:
+                future.set_exception(errors[i])
+            else:
+                future.set_result(results[i])
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "concurrency": self.concurrency,
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": round(self.requests / self.batches, 3) if self.batches else 0.0,
+            "max_observed_batch_size": max(self.batch_sizes) if self.batch_sizes else 0,
+            "batch_size_histogram": {str(k): v for k, v in sorted(self.batch_sizes.items())},
+        }
@@ -0,0 +1,66 @@
+import threading
+
+
+class ModelWatcher:
+    """
+    Polls the serving-bundle pointer (CURRENT) and calls `on_change(version)`
+    whenever it names a new version.
+
+    The callback runs on the watcher thread, so loading and warming up the
+    new model never blocks request handling. If it raises, the version is
+    retried on the next poll.
+    """
+
+    def __init__(self, read_version, on_change, interval=5.0, active_version=None):
+        self.read_version = read_version  # () -> version string or None
+        self.on_change = on_change
+        self.interval = max(0.1, float(interval))
+        self.active_version = active_version
+        self.swaps = 0
+        self.failures = 0
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="model-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def check(self):
+        """One poll; returns True when a new version was swapped in."""
+        version = self.read_version()
+        if version is None or version == self.active_version:
+            return False
+        try:
+            self.on_change(version)
+        except Exception as e:
+            self.failures += 1
+            self.last_error = f"{version}: {e}"
+            print(f"Model swap to {version} failed: {e}")
+            return False
+        self.active_version = version
+        self.swaps += 1
+        self.last_error = None
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:  # unreadable pointer file etc.; keep watching
+                print(f"Model watcher error: {e}")
+
+    def stats(self):
+        return {
+            "active_version": self.active_version,
+            "interval_seconds": self.interval,
+            "swaps": self.swaps,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
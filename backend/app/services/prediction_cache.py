@@ -0,0 +1,114 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# Every model input, in a fixed order; identifiers such as Trade_ID are not part of the key
+KEY_FIELDS = [
+    "Notional_Amount_USD", "Market_Volatility_Index", "Trade_Hour",
+    "Asset_Class", "Counterparty_Rating", "SSI_Status", "Liquidity_Score",
+    "Custodian_Location", "Operation_Type", "Currency", "Trade_Day",
+]
+
+
+class PredictionCache:
+    """
+    LRU + TTL cache of scores (and explanations) keyed on the trade profile.
+
+    Most inputs are low-cardinality categoricals, so the same profile repeats
+    all day. The key is a canonical tuple of the model inputs; the two
+    continuous fields can optionally be bucketed (notional_step,
+    volatility_step) to trade exactness for hit rate. Entries are tagged with
+    the model version they were scored by, and the whole cache is dropped as
+    soon as a different version is seen.
+    """
+
+    def __init__(self, max_entries=100_000, ttl_seconds=300.0, notional_step=None, volatility_step=None,
+                 model_version=None):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self.notional_step = notional_step or None
+        self.volatility_step = volatility_step or None
+        self.model_version = model_version
+
+        self._entries = OrderedDict()  # key -> [expires_at, probability, explanation]
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _bucket(value, step):
+        value = float(value)
+        if step is None:
+            return value
+        return math.floor(value / step + 0.5) * step
+
+    def key(self, record):
+        return (
+            self._bucket(record["Notional_Amount_USD"], self.notional_step),
+            self._bucket(record["Market_Volatility_Index"], self.volatility_step),
+            float(record["Trade_Hour"]),
+        ) + tuple(str(record[field]) for field in KEY_FIELDS[3:])
+
+    def _sync_version(self, model_version):
+        # Called under the lock
+        if model_version != self.model_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.model_version = model_version
+
+    def get(self, key, model_version):
+        """(probability, explanation or None) on a hit, None on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            self._sync_version(model_version)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key, model_version, probability, explanation=None):
+        with self._lock:
+            self._sync_version(model_version)
+            entry = self._entries.get(key)
+            if entry is not None and explanation is None:
+                explanation = entry[2]  # keep an explanation we already paid for
+            self._entries[key] = [time.monotonic() + self.ttl, float(probability), explanation]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "model_version": self.model_version,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "notional_step": self.notional_step,
+                "volatility_step": self.volatility_step,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,32 @@
+# Morning-hours slot used by the "move to Monday morning" fix
+MONDAY_MORNING = {"Trade_Day": "Monday", "Trade_Hour": 9.0}
+
+
+def default_perturbations(record, categories):
+    """
+    The standard remediation menu for one trade, used when /simulate gets no
+    explicit perturbations: fix the SSI, switch to each other custodian the
+    model knows, split the notional in two, move to Monday morning. Fixes that
+    would not change the trade are left out.
+    `categories` maps categorical field names to the model's known values.
+    """
+    presets = [("fix_ssi", {"SSI_Status": "Match"})]
+    for location in categories.get("Custodian_Location", []):
+        presets.append((f"switch_custodian_{location}", {"Custodian_Location": location}))
+    presets.append(("split_notional", {"Notional_Amount_USD": float(record["Notional_Amount_USD"]) / 2}))
+    presets.append(("monday_morning", dict(MONDAY_MORNING)))
+    return [{"name": name, "changes": changes} for name, changes in presets
+            if any(record.get(field) != value for field, value in changes.items())]
+
+
+def rank_variants(base_probability, variants):
+    """
+    Adds risk_reduction (base minus variant failure probability) and a 1-based
+    rank to each variant dict, best fix first. Ties keep the request order.
+    """
+    for variant in variants:
+        variant["risk_reduction"] = base_probability - variant["failure_probability"]
+    ranked = sorted(variants, key=lambda v: -v["risk_reduction"])
+    for rank, variant in enumerate(ranked, start=1):
+        variant["rank"] = rank
+    return ranked
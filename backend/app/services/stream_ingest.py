@@ -0,0 +1,187 @@
+import asyncio
+import json
+from collections import Counter
+
+_END = object()  # end-of-stream marker on the session queue
+
+
+def parse_stream_message(text):
+    """One WebSocket message or NDJSON line -> list of raw trades (an object or an array of objects)."""
+    try:
+        payload = json.loads(text)
+    except ValueError as e:
+        return [f"Invalid JSON: {e}"]
+    return payload if isinstance(payload, list) else [payload]
+
+
+class StreamHub:
+    """
+    Fan-out of scored stream results to dashboard subscribers.
+
+    Every subscriber gets its own bounded queue. Publishing never waits: when
+    a subscriber falls behind, its oldest messages are dropped (and counted)
+    so one slow dashboard cannot stall ingestion or the other subscribers.
+    Results are published once, already scored; subscribers never trigger scoring.
+    """
+
+    def __init__(self, max_queue=1000):
+        self.max_queue = max(1, int(max_queue))
+        self._subscribers = set()
+
+        self.published = 0
+        self.dropped = 0
+        self.sessions = 0
+        self.active_sessions = 0
+        self.trades = 0
+        self.errors = 0
+        self.batch_sizes = Counter()
+
+    def subscribe(self):
+        queue = asyncio.Queue(self.max_queue)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, message):
+        self.published += 1
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(message)
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "active_sessions": self.active_sessions,
+            "sessions": self.sessions,
+            "trades": self.trades,
+            "errors": self.errors,
+            "batches": sum(self.batch_sizes.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+            "batch_size_histogram": {str(k): v for k, v in sorted(self.batch_sizes.items())},
+        }
+
+
+class StreamSession:
+    """
+    One ingesting connection (WebSocket or NDJSON request).
+
+    A reader task pulls trades off the connection into a queue; the session
+    scores them in rolling micro-batches (up to max_batch_size, or whatever
+    arrived within max_wait_ms) and sends each batch's results back on the
+    same connection, in arrival order.
+
+    Flow control: at most max_in_flight trades may be read but not yet
+    answered. When that credit is used up the reader stops reading, so the
+    transport's own buffers fill and the client is pushed back (TCP
+    backpressure). Credit is returned only after the results were handed to
+    the connection, so a client that does not read its results stops being
+    read from as well.
+    """
+
+    def __init__(self, validate, score_batch, hub=None, max_batch_size=256, max_wait_ms=20.0, max_in_flight=1024):
+        self.validate = validate  # raw trade -> (record, None) or (None, error message)
+        self.score_batch = score_batch  # async: list[record] -> list of result fields (probability, risk level, ...)
+        self.hub = hub
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_in_flight = max(self.max_batch_size, int(max_in_flight))
+
+        self.received = 0
+        self.sent = 0
+
+    async def run(self, receive, send):
+        """
+        receive(): awaits the next list of raw trades, or None at end of stream.
+        send(results): awaits delivery of one batch of result dicts.
+        """
+        queue = asyncio.Queue()
+        credits = asyncio.Semaphore(self.max_in_flight)
+        reader = asyncio.create_task(self._read(receive, queue, credits))
+        if self.hub is not None:
+            self.hub.sessions += 1
+            self.hub.active_sessions += 1
+        try:
+            done = False
+            while not done:
+                batch, done = await self._collect(queue)
+                if batch:
+                    await self._process(batch, send)
+                    for _ in batch:
+                        credits.release()
+            await reader  # surfaces a receive error, if any
+        finally:
+            reader.cancel()
+            if self.hub is not None:
+                self.hub.active_sessions -= 1
+
+    async def _read(self, receive, queue, credits):
+        try:
+            while True:
+                items = await receive()
+                if items is None:
+                    break
+                for item in items:
+                    await credits.acquire()  # backpressure: stop reading until results go out
+                    queue.put_nowait((self.received, item))
+                    self.received += 1
+        finally:
+            queue.put_nowait(_END)
+
+    async def _collect(self, queue):
+        first = await queue.get()
+        if first is _END:
+            return [], True
+        batch = [first]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if queue.empty():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                item = queue.get_nowait()
+            if item is _END:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _process(self, batch, send):
+        results, records, positions = [], [], []
+        for seq, raw in batch:
+            result = {"seq": seq, "trade_id": raw.get("Trade_ID") if isinstance(raw, dict) else None}
+            record, error = self.validate(raw)
+            if error is not None:
+                result["error"] = error
+            else:
+                records.append(record)
+                positions.append(len(results))
+            results.append(result)
+
+        if records:
+            # One scoring call for the whole micro-batch
+            try:
+                for i, fields in zip(positions, await self.score_batch(records)):
+                    results[i].update(fields)
+            except Exception as e:
+                for i in positions:
+                    results[i]["error"] = f"Prediction Error: {e}"
+
+        await send(results)
+        self.sent += len(results)
+        if self.hub is not None:
+            errors = sum(1 for r in results if "error" in r)
+            self.hub.trades += len(results)
+            self.hub.errors += errors
+            self.hub.batch_sizes[len(results)] += 1
+            if errors < len(results):
+                self.hub.publish([r for r in results if "error" not in r])
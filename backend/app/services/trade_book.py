@@ -0,0 +1,182 @@
+import threading
+from itertools import islice
+
+from sortedcontainers import SortedList
+
+from ..db.models import Trade
+
+# Exposure dimensions kept as running aggregates
+DIMENSIONS = ("counterparty", "currency", "settlement_date")
+UNSPECIFIED = "UNSPECIFIED"
+# Trades that are no longer open do not belong in the book
+CLOSED_STATUSES = ("SETTLED", "FAILED")
+
+
+def book_entry(row):
+    """Book entry from a `trades` row dict (as written by the trade writer, or read back from the DB)."""
+    details = row.get("prediction_details") or {}
+    inputs = details.get("inputs") or {}
+    probability = float(row["risk_score"])
+    notional = float(row["amount"])
+    return {
+        "trade_id": row["trade_id"],
+        "failure_probability": probability,
+        "risk_level": details.get("risk_level"),
+        "notional": notional,
+        # Expected loss view: notional weighted by failure probability
+        "notional_at_risk": notional * probability,
+        "counterparty": row.get("counterparty") or UNSPECIFIED,
+        "currency": row.get("currency") or UNSPECIFIED,
+        "settlement_date": inputs.get("Settlement_Date") or UNSPECIFIED,
+        "model_version": details.get("model_version"),
+    }
+
+
+def _empty_group():
+    return {"trades": 0, "notional": 0.0, "notional_at_risk": 0.0, "high_risk_trades": 0, "high_risk_notional": 0.0}
+
+
+class TradeBook:
+    """
+    In-memory book of the latest score of every open trade.
+
+    Kept up to date incrementally as trades are scored or re-scored: a
+    re-score first backs the old entry out of every index and aggregate.
+
+    - a sorted index on failure probability: top-N in O(log n + N)
+    - running aggregates (trades, notional, notional-at-risk, high-risk
+      count/notional) per counterparty, currency and settlement date: one
+      group in O(1)
+    - per dimension, a sorted index of the groups by notional-at-risk:
+      the K most exposed groups in O(log g + K)
+    """
+
+    def __init__(self, high_risk_threshold=0.5):
+        self.high_risk_threshold = high_risk_threshold
+        self._entries = {}  # trade_id -> entry
+        self._by_probability = SortedList()  # (-probability, trade_id)
+        self._groups = {dim: {} for dim in DIMENSIONS}  # dim -> key -> aggregates
+        self._group_rank = {dim: SortedList() for dim in DIMENSIONS}  # dim -> (-notional_at_risk, key)
+        self._totals = _empty_group()
+        self._lock = threading.Lock()
+        self.updates = 0
+
+    # --- Maintenance ---
+    def _apply(self, aggregates, entry, sign):
+        aggregates["trades"] += sign
+        aggregates["notional"] += sign * entry["notional"]
+        aggregates["notional_at_risk"] += sign * entry["notional_at_risk"]
+        if entry["failure_probability"] > self.high_risk_threshold:
+            aggregates["high_risk_trades"] += sign
+            aggregates["high_risk_notional"] += sign * entry["notional"]
+
+    def _apply_group(self, dim, entry, sign):
+        key = entry[dim]
+        groups, rank = self._groups[dim], self._group_rank[dim]
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = _empty_group()
+        else:
+            rank.remove((-group["notional_at_risk"], key))
+        self._apply(group, entry, sign)
+        if group["trades"] == 0:
+            del groups[key]  # also resets any float drift in the running sums
+        else:
+            rank.add((-group["notional_at_risk"], key))
+
+    def _add(self, entry):
+        self._entries[entry["trade_id"]] = entry
+        self._by_probability.add((-entry["failure_probability"], entry["trade_id"]))
+        self._apply(self._totals, entry, +1)
+        for dim in DIMENSIONS:
+            self._apply_group(dim, entry, +1)
+
+    def _remove(self, entry):
+        del self._entries[entry["trade_id"]]
+        self._by_probability.remove((-entry["failure_probability"], entry["trade_id"]))
+        self._apply(self._totals, entry, -1)
+        for dim in DIMENSIONS:
+            self._apply_group(dim, entry, -1)
+
+    def upsert_many(self, rows):
+        """Adds or re-scores trades from `trades` row dicts."""
+        entries = [book_entry(row) for row in rows if row.get("risk_score") is not None]
+        with self._lock:
+            for entry in entries:
+                old = self._entries.get(entry["trade_id"])
+                if old is not None:
+                    self._remove(old)
+                self._add(entry)
+            self.updates += len(entries)
+
+    def remove(self, trade_id):
+        with self._lock:
+            entry = self._entries.get(trade_id)
+            if entry is not None:
+                self._remove(entry)
+            return entry is not None
+
+    def rebuild(self, session_factory, chunk_size=10_000):
+        """Reloads the book from the trades table (open trades with a score). Returns the number of trades."""
+        db = session_factory()
+        try:
+            query = (db.query(Trade.trade_id, Trade.amount, Trade.currency, Trade.counterparty,
+                              Trade.risk_score, Trade.prediction_details)
+                     .filter(Trade.risk_score.isnot(None), Trade.status.notin_(CLOSED_STATUSES))
+                     .execution_options(yield_per=chunk_size))
+            entries = {row.trade_id: book_entry(row._asdict()) for row in query}
+        finally:
+            db.close()
+
+        # Bulk build: aggregate first, then sort each index once instead of inserting one by one
+        totals = _empty_group()
+        groups = {dim: {} for dim in DIMENSIONS}
+        for entry in entries.values():
+            self._apply(totals, entry, +1)
+            for dim in DIMENSIONS:
+                group = groups[dim].get(entry[dim])
+                if group is None:
+                    group = groups[dim][entry[dim]] = _empty_group()
+                self._apply(group, entry, +1)
+        by_probability = SortedList((-e["failure_probability"], trade_id) for trade_id, e in entries.items())
+        group_rank = {dim: SortedList((-g["notional_at_risk"], key) for key, g in groups[dim].items())
+                      for dim in DIMENSIONS}
+
+        with self._lock:
+            self._entries, self._by_probability, self._totals = entries, by_probability, totals
+            self._groups, self._group_rank = groups, group_rank
+        return len(entries)
+
+    # --- Queries ---
+    def top(self, n=50, min_probability=0.0):
+        with self._lock:
+            result = []
+            for negative_probability, trade_id in islice(self._by_probability, max(0, int(n))):
+                if -negative_probability < min_probability:
+                    break
+                result.append(dict(self._entries[trade_id]))
+            return result
+
+    def exposure(self, by, key=None, limit=None):
+        """Aggregates for one group (`key`), or the `limit` groups with the most notional at risk."""
+        with self._lock:
+            groups = self._groups[by]
+            if key is not None:
+                group = groups.get(key)
+                return [{by: key, **group}] if group is not None else []
+            ranked = self._group_rank[by]
+            stop = len(ranked) if limit is None else max(0, int(limit))
+            return [{by: k, **groups[k]} for _, k in islice(ranked, stop)]
+
+    def get(self, trade_id):
+        with self._lock:
+            entry = self._entries.get(trade_id)
+            return dict(entry) if entry is not None else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._totals,
+                "groups": {dim: len(self._groups[dim]) for dim in DIMENSIONS},
+                "updates": self.updates,
+            }
@@ -0,0 +1,307 @@
+import csv
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import JSON, case, cast, func
+from sqlalchemy.dialects.postgresql import JSONB
+
+from ..db.models import Trade
+from .trade_book import CLOSED_STATUSES
+
+# Columns written per scored trade; everything but trade_id is updated on conflict
+# (status only while the trade is still open: re-scoring must not reopen a settled or failed trade)
+TRADE_COLUMNS = ["trade_id", "amount", "currency", "counterparty", "isin", "status", "risk_score", "prediction_details"]
+
+# SQLite caps bound parameters per statement (999 before 3.32)
+SQLITE_MAX_VARIABLES = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+
+
+def trade_row(trade_id, record, failure_probability=None, details=None, status="SCORED"):
+    """One `trades` row for a validated trade dict; `details` is merged into prediction_details."""
+    return {
+        "trade_id": trade_id,
+        "amount": float(record["Notional_Amount_USD"]),
+        "currency": record["Currency"],
+        "counterparty": record.get("Counterparty") or "UNKNOWN",
+        "isin": record.get("ISIN") or "UNKNOWN",
+        "status": status,
+        "risk_score": None if failure_probability is None else float(failure_probability),
+        "prediction_details": details or {},
+    }
+
+
+def merge_details(dialect, existing, incoming):
+    # prediction_details is shared (scores here, SHAP from the explanation store): merge, never overwrite
+    if dialect == "postgresql":
+        return cast(func.coalesce(cast(existing, JSONB), func.jsonb_build_object()).op("||")(cast(incoming, JSONB)), JSON)
+    return func.json_patch(func.coalesce(existing, func.json_object()), incoming)
+
+
+def _keep_closed_status(status, incoming):
+    return case((status.in_(CLOSED_STATUSES), status), else_=incoming)
+
+
+def upsert_trades(connection, rows):
+    """
+    Multi-row INSERT ... ON CONFLICT (trade_id) DO UPDATE on SQLite or
+    PostgreSQL, chunked to the dialect's parameter limit. Caller commits.
+    """
+    if not rows:
+        return
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        chunk = max(1, SQLITE_MAX_VARIABLES // len(TRADE_COLUMNS))
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        chunk = 65535 // len(TRADE_COLUMNS)
+    else:
+        raise ValueError(f"Bulk upsert is not implemented for {dialect}")
+
+    for start in range(0, len(rows), chunk):
+        stmt = insert(Trade).values(rows[start:start + chunk])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Trade.trade_id],
+            set_={
+                **{c: stmt.excluded[c] for c in TRADE_COLUMNS if c not in ("trade_id", "status", "prediction_details")},
+                "status": _keep_closed_status(Trade.status, stmt.excluded.status),
+                "prediction_details": merge_details(dialect, Trade.prediction_details, stmt.excluded.prediction_details),
+                "updated_at": func.now(),
+            },
+        )
+        connection.execute(stmt)
+
+
+def copy_upsert_trades(engine, rows):
+    """
+    PostgreSQL bulk path: COPY the rows into a session temp table, then one
+    INSERT ... SELECT ... ON CONFLICT into trades. COPY goes through
+    psycopg2's copy_expert; other drivers (psycopg 3, ...) get upsert_trades.
+    """
+    columns = ", ".join(TRADE_COLUMNS)
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in TRADE_COLUMNS if c not in ("trade_id", "status", "prediction_details"))
+    closed = ", ".join(f"'{s}'" for s in CLOSED_STATUSES)
+    data = io.StringIO()
+    writer = csv.writer(data)
+    for row in rows:
+        writer.writerow([json.dumps(row[c]) if c == "prediction_details" else row[c] for c in TRADE_COLUMNS])
+    data.seek(0)
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        if not hasattr(cursor, "copy_expert"):
+            raw.close()
+            raw = None
+            with engine.begin() as connection:
+                upsert_trades(connection, rows)
+            return
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS trades_stage "
+            "(LIKE trades INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+        )
+        cursor.copy_expert(f"COPY trades_stage ({columns}) FROM STDIN WITH (FORMAT csv)", data)
+        cursor.execute(
+            f"INSERT INTO trades ({columns}) SELECT {columns} FROM trades_stage "
+            f"ON CONFLICT (trade_id) DO UPDATE SET {updates}, "
+            f"status = CASE WHEN trades.status IN ({closed}) THEN trades.status ELSE EXCLUDED.status END, "
+            "prediction_details = (COALESCE(trades.prediction_details::jsonb, '{}'::jsonb) "
+            "|| EXCLUDED.prediction_details::jsonb)::json, updated_at = now()"
+        )
+        raw.commit()
+    except Exception:
+        if raw is not None:
+            raw.rollback()
+        raise
+    finally:
+        if raw is not None:
+            raw.close()
+
+
+class TradeWriter:
+    """
+    Write-behind persistence of scored trades.
+
+    submit() only touches an in-memory buffer keyed on trade_id (a trade
+    rescored before the flush is written once, with its latest score). A
+    background thread flushes the buffer in bulk when it reaches batch_size
+    or every flush_interval_ms: COPY on PostgreSQL, multi-row upserts on
+    SQLite. The buffer holds at most max_buffer trades; beyond that new rows
+    are appended to a spill file (replayed before the next flush) or
+    dropped, depending on `overflow`. Failed flushes keep their rows buffered
+    and are retried on the next trigger; stop() flushes whatever is left.
+    """
+
+    def __init__(self, engine, batch_size=500, flush_interval_ms=1000, max_buffer=50_000, overflow="spill",
+                 spill_path=None, use_copy=True):
+        if overflow not in ("spill", "drop"):
+            raise ValueError(f"Unknown overflow policy '{overflow}' (spill | drop)")
+        if overflow == "spill" and not spill_path:
+            raise ValueError("overflow='spill' needs a spill_path")
+        self.engine = engine
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(0.001, float(flush_interval_ms) / 1000.0)
+        self.max_buffer = max(self.batch_size, int(max_buffer))
+        self.overflow = overflow
+        self.spill_path = spill_path
+        self.use_copy = use_copy and engine.dialect.name == "postgresql"
+
+        self._buffer = OrderedDict()  # trade_id -> row
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # one writer at a time keeps per-trade writes in order
+        self._spill_lock = threading.Lock()
+        self._stopping = False
+        self._thread = None
+
+        self.submitted = 0
+        self.written = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.last_flush_ms = None
+        self.last_error = None
+
+    # --- Lifecycle ---
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="trade-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        # Final flush on the caller's thread; whatever cannot be written is spilled (or dropped)
+        if not self.flush():
+            with self._cond:
+                rows = list(self._buffer.values())
+                self._buffer.clear()
+            self._overflow(rows)
+
+    # --- Producer side ---
+    def submit(self, rows):
+        """Buffers scored trade rows; never touches the database. Returns how many were buffered."""
+        overflow = []
+        with self._cond:
+            for row in rows:
+                key = row["trade_id"]
+                if key in self._buffer:
+                    self._buffer[key] = row
+                    self._buffer.move_to_end(key)
+                elif len(self._buffer) < self.max_buffer:
+                    self._buffer[key] = row
+                else:
+                    overflow.append(row)
+            self.submitted += len(rows)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+        if overflow:
+            self._overflow(overflow)
+        return len(rows) - len(overflow)
+
+    def _overflow(self, rows):
+        if not rows:
+            return
+        if self.overflow == "spill":
+            try:
+                with self._spill_lock, open(self.spill_path, "a") as f:
+                    f.writelines(json.dumps(row) + "\n" for row in rows)
+                self.spilled += len(rows)
+                return
+            except OSError as e:
+                print(f"Trade spill failed: {e}")
+        self.dropped += len(rows)
+
+    # --- Flushing ---
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._stopping or len(self._buffer) >= self.batch_size,
+                                    timeout=self.flush_interval)
+                if self._stopping:
+                    return
+            self.flush()
+
+    def _write(self, rows):
+        for start in range(0, len(rows), self.batch_size):
+            chunk = rows[start:start + self.batch_size]
+            if self.use_copy:
+                copy_upsert_trades(self.engine, chunk)
+            else:
+                with self.engine.begin() as connection:
+                    upsert_trades(connection, chunk)
+
+    def _replay_spill(self):
+        # Spilled rows are older than anything buffered, so they go first
+        replay_path = f"{self.spill_path}.replay"
+        with self._spill_lock:
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spill_path):
+                    return
+                os.replace(self.spill_path, replay_path)
+        with open(replay_path) as f:
+            rows = list({row["trade_id"]: row for row in map(json.loads, f)}.values())
+        self._write(rows)
+        os.remove(replay_path)
+        self.replayed += len(rows)
+
+    def flush(self):
+        """Writes everything buffered (and any spill file) now. Returns False if the database write failed."""
+        with self._flush_lock:
+            with self._cond:
+                rows = list(self._buffer.values())
+                self._buffer.clear()
+            start = time.perf_counter()
+            try:
+                if self.spill_path:
+                    self._replay_spill()
+                if rows:
+                    self._write(rows)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                print(f"Trade persistence error: {e}")
+                # Put the rows back for the next trigger, behind any newer version of the same trade
+                with self._cond:
+                    restored = OrderedDict((row["trade_id"], row) for row in rows if row["trade_id"] not in self._buffer)
+                    restored.update(self._buffer)
+                    self._buffer = restored
+                    excess = [self._buffer.popitem(last=False)[1] for _ in range(len(self._buffer) - self.max_buffer)]
+                self._overflow(excess)
+                return False
+            if rows:
+                self.flushes += 1
+                self.written += len(rows)
+                self.last_flush_ms = round((time.perf_counter() - start) * 1000.0, 3)
+            self.last_error = None
+            return True
+
+    def stats(self):
+        with self._cond:
+            buffered = len(self._buffer)
+        return {
+            "mode": "copy" if self.use_copy else "upsert",
+            "buffered": buffered,
+            "max_buffer": self.max_buffer,
+            "batch_size": self.batch_size,
+            "flush_interval_ms": self.flush_interval * 1000.0,
+            "overflow": self.overflow,
+            "submitted": self.submitted,
+            "written": self.written,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "last_flush_ms": self.last_flush_ms,
+            "last_error": self.last_error,
+        }
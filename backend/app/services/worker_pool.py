@@ -0,0 +1,266 @@
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+def _worker_main(conn, score_fn, worker_init, telemetry_fn):
+    # Shutdown is driven by the gateway over the pipe, not by the terminal's signals
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        if worker_init is not None:
+            worker_init()
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}", None))
+        conn.close()
+        return
+    conn.send(("ready", None, None))
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break  # gateway went away
+        if message[0] == "stop":
+            break
+        records, key = message[1], message[2]
+        try:
+            status, payload = "ok", score_fn(records) if key is None else score_fn(records, key)
+        except Exception as e:
+            status, payload = "error", f"{type(e).__name__}: {e}"
+        # Whatever the worker recorded while scoring (e.g. stage timings) travels back with the answer
+        conn.send((status, payload, telemetry_fn() if telemetry_fn is not None else None))
+    conn.close()
+
+
+class _Worker:
+    def __init__(self, worker_id):
+        self.id = worker_id
+        self.process = None
+        self.conn = None
+        self.busy = False
+        self.draining = False
+        self.tasks = 0
+        self.errors = 0
+        self.restarts = 0
+        self.last_latency_ms = None
+        self.started_at = None
+
+
+class InferenceWorkerPool:
+    """
+    Pool of scoring processes behind the API gateway.
+
+    Workers are never forked from the gateway itself: by the time a worker
+    is (re)started the gateway runs background threads and OpenMP pools, and
+    a child could inherit a lock held by one of them. They come from a
+    forkserver (a clean single-threaded process, `preload` modules imported
+    once) or, where that is unavailable, are spawned. `worker_init` runs in
+    each new worker (typically: load the model) before it reports ready;
+    score_fn, worker_init and telemetry_fn are pickled, so they must be
+    module-level functions (or partials of them).
+
+    Each worker owns a duplex pipe; the gateway hands a batch of records to
+    an idle worker and blocks the calling thread (never the event loop)
+    until the probabilities come back, together with `telemetry_fn()` from
+    the worker, which is handed to `on_telemetry` in the gateway. A task
+    may carry a picklable key (e.g. the model version the request was
+    admitted under), run as score_fn(records, key) in the worker.
+
+    Workers that die are replaced on the spot; restart() replaces them one
+    at a time after their in-flight batch finishes, so serving never stops.
+    """
+
+    def __init__(self, score_fn, n_workers=None, task_timeout=30.0, max_tasks_per_worker=0, worker_init=None,
+                 min_chunk_size=2048, telemetry_fn=None, on_telemetry=None, preload=(), start_timeout=120.0):
+        self.score_fn = score_fn  # in-process scorer executed inside the workers
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.task_timeout = task_timeout
+        self.start_timeout = start_timeout  # worker_init included (model load)
+        self.max_tasks_per_worker = max_tasks_per_worker  # 0 = never recycle
+        self.worker_init = worker_init
+        self.telemetry_fn = telemetry_fn
+        self.on_telemetry = on_telemetry
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            self._ctx = multiprocessing.get_context("forkserver")
+            if preload:
+                self._ctx.set_forkserver_preload(list(preload))
+        else:
+            self._ctx = multiprocessing.get_context("spawn")
+        self._cond = threading.Condition()
+        self._workers = [_Worker(i) for i in range(self.n_workers)]
+        self._closed = False
+        # Large batches are split across workers; below this size one worker is cheaper
+        self.min_chunk_size = min_chunk_size
+        self._fanout = ThreadPoolExecutor(max_workers=self.n_workers, thread_name_prefix="pool-fanout")
+
+    # --- Lifecycle ---
+    def start(self):
+        for worker in self._workers:
+            self._spawn(worker)
+
+    def _spawn(self, worker):
+        parent_conn, child_conn = self._ctx.Pipe(duplex=True)
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.score_fn, self.worker_init, self.telemetry_fn),
+            name=f"inference-worker-{worker.id}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        worker.process, worker.conn = process, parent_conn
+        worker.started_at = time.time()
+
+        # Only hand out work once worker_init has finished
+        try:
+            if not parent_conn.poll(self.start_timeout):
+                raise TimeoutError(f"not ready within {self.start_timeout}s")
+            status, payload, _ = parent_conn.recv()
+            if status != "ready":
+                raise RuntimeError(payload)
+        except Exception as e:
+            self._retire(worker, graceful=False)
+            raise RuntimeError(f"Inference worker {worker.id} failed to start: {e}") from e
+
+    def _retire(self, worker, graceful=True):
+        try:
+            if graceful:
+                worker.conn.send(("stop",))
+                worker.process.join(timeout=5)
+        except (BrokenPipeError, OSError):
+            pass
+        if worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join()
+        worker.conn.close()
+
+    def _replace(self, worker, graceful=True):
+        self._retire(worker, graceful)
+        worker.restarts += 1
+        worker.tasks = 0
+        self._spawn(worker)
+
+    def restart(self, worker_init=None):
+        """
+        Rolling restart: each worker is replaced once it is idle, the others
+        keep serving. A new worker_init (e.g. the next model version) applies
+        to the replacements and to every later (re)start.
+        """
+        if worker_init is not None:
+            self.worker_init = worker_init
+        for worker in self._workers:
+            with self._cond:
+                worker.draining = True
+                self._cond.wait_for(lambda: not worker.busy)
+            try:
+                self._replace(worker)
+            finally:
+                with self._cond:
+                    worker.draining = False
+                    self._cond.notify_all()
+
+    def stop(self):
+        with self._cond:
+            self._closed = True
+            for worker in self._workers:
+                worker.draining = True
+            self._cond.wait_for(lambda: not any(w.busy for w in self._workers), timeout=self.task_timeout)
+        for worker in self._workers:
+            if worker.process is not None:
+                self._retire(worker)
+        self._fanout.shutdown(wait=False)
+
+    # --- Scoring ---
+    def _acquire(self):
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Inference worker pool is stopped")
+                for worker in self._workers:
+                    if not worker.busy and not worker.draining:
+                        worker.busy = True
+                        return worker
+                self._cond.wait()
+
+    def _release(self, worker):
+        with self._cond:
+            worker.busy = False
+            self._cond.notify_all()
+
+    def _roundtrip(self, worker, records, key):
+        worker.conn.send(("score", records, key))
+        if not worker.conn.poll(self.task_timeout):
+            raise TimeoutError(f"Worker {worker.id} did not answer within {self.task_timeout}s")
+        status, payload, telemetry = worker.conn.recv()
+        if telemetry is not None and self.on_telemetry is not None:
+            self.on_telemetry(telemetry)
+        return status, payload
+
+    def score(self, records, key=None):
+        """Scores a list of validated trade dicts on one worker (blocking)."""
+        worker = self._acquire()
+        try:
+            if not worker.process.is_alive():
+                self._replace(worker, graceful=False)
+
+            start = time.perf_counter()
+            try:
+                status, payload = self._roundtrip(worker, records, key)
+            except (EOFError, BrokenPipeError, ConnectionResetError):
+                # Worker died under us; scoring is idempotent, so retry once on its replacement
+                worker.errors += 1
+                self._replace(worker, graceful=False)
+                try:
+                    status, payload = self._roundtrip(worker, records, key)
+                except (EOFError, OSError, TimeoutError) as e:
+                    self._replace(worker, graceful=False)
+                    raise RuntimeError(f"Inference worker {worker.id} failed: {e}") from e
+            except TimeoutError as e:
+                worker.errors += 1
+                self._replace(worker, graceful=False)
+                raise RuntimeError(f"Inference worker {worker.id} failed: {e}") from e
+
+            worker.last_latency_ms = (time.perf_counter() - start) * 1000.0
+            worker.tasks += 1
+            if status != "ok":
+                worker.errors += 1
+                raise RuntimeError(payload)
+
+            if self.max_tasks_per_worker and worker.tasks >= self.max_tasks_per_worker:
+                self._replace(worker)  # recycle to bound memory growth
+            return payload
+        finally:
+            self._release(worker)
+
+    def score_parallel(self, records, key=None):
+        """Scores a large batch by splitting it into contiguous chunks, one per worker."""
+        n_chunks = min(self.n_workers, max(1, len(records) // self.min_chunk_size))
+        if n_chunks == 1:
+            return self.score(records, key)
+        bounds = np.linspace(0, len(records), n_chunks + 1, dtype=int)
+        chunks = [records[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+        return np.concatenate(list(self._fanout.map(lambda chunk: self.score(chunk, key), chunks)))
+
+    # --- Introspection ---
+    def health(self):
+        workers = []
+        for worker in self._workers:
+            alive = worker.process is not None and worker.process.is_alive()
+            workers.append({
+                "id": worker.id,
+                "pid": worker.process.pid if worker.process is not None else None,
+                "alive": alive,
+                "busy": worker.busy,
+                "draining": worker.draining,
+                "tasks": worker.tasks,
+                "errors": worker.errors,
+                "restarts": worker.restarts,
+                "last_latency_ms": round(worker.last_latency_ms, 3) if worker.last_latency_ms is not None else None,
+                "uptime_s": round(time.time() - worker.started_at, 1) if worker.started_at else None,
+            })
+        return workers
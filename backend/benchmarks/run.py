@@ -0,0 +1,352 @@
+"""
+Reproducible performance benchmarks: data generation, dataset loading,
+training, and serving (in-process, through the real ASGI app).
+
+Everything runs against a dataset from generate_market_data with a fixed
+seed, so two runs with the same configuration do the same work. Results are
+written as JSON; --compare checks them against a stored baseline and exits
+non-zero when any metric regressed by more than --threshold.
+
+Run from backend/:
+    python -m benchmarks.run                                  # -> benchmarks/results.json
+    python -m benchmarks.run --compare benchmarks/baseline.json
+    python -m benchmarks.run --save-baseline                  # re-record on this machine
+    python -m benchmarks.run --quick                          # small sizes, for a smoke run
+
+Baselines are machine-specific: record them on the machine that runs the comparison.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(HERE, "results.json")
+DEFAULT_MODEL_PATH = os.path.abspath(os.path.join(HERE, "..", "..", "ml_service", "model", "model.joblib"))
+RESULTS_FORMAT = 1
+
+# metric -> (unit, direction). Tail latencies are noisier: they get their own threshold (default twice the main one).
+METRICS = {
+    "generate.rows_per_sec": ("rows/s", "higher"),
+    "load.csv_seconds": ("s", "lower"),
+    "load.columnar_seconds": ("s", "lower"),
+    "train.wall_seconds": ("s", "lower"),
+    "train.peak_rss_mb": ("MB", "lower"),
+    "predict.p50_ms": ("ms", "lower"),
+    "predict.p95_ms": ("ms", "lower"),
+    "predict.p99_ms": ("ms", "lower"),
+    "explain.single_p50_ms": ("ms", "lower"),
+    "explain.batch_ms_per_trade": ("ms", "lower"),
+}
+BATCH_METRIC = "batch.rows_per_sec@{}"  # one per batch size, higher is better
+NOISY_METRICS = {"predict.p95_ms", "predict.p99_ms"}
+
+PRESETS = {
+    # requests: per latency round (`repeats` rounds); min_batch_rows: rows scored per batch size, at least
+    "full": {"rows": 100_000, "train_rows": 50_000, "requests": 400, "batch_sizes": [100, 1000, 10000],
+             "min_batch_rows": 30_000, "explain_rows": 1000, "repeats": 5},
+    "quick": {"rows": 5000, "train_rows": 5000, "requests": 50, "batch_sizes": [10, 100],
+              "min_batch_rows": 200, "explain_rows": 100, "repeats": 1},
+}
+
+
+def metric_spec(name):
+    if name.startswith("batch.rows_per_sec@"):
+        return "rows/s", "higher"
+    return METRICS[name]
+
+
+# --- Generation and loading ---
+def bench_generator(rows, seed, repeats):
+    from data_generator import generate_market_data
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        df = generate_market_data(rows, seed)
+        timings.append(time.perf_counter() - started)
+    return df, {"generate.rows_per_sec": rows / min(timings)}
+
+
+def bench_load(df, workdir, seed, repeats):
+    """Writes the dataset as CSV and columnar, then times the trainer's projected load of each."""
+    from data_generator import save_dataset
+    from columnar import load_dataset
+    from train_model import NUMERIC_FEATURES, CATEGORICAL_FEATURES, TARGET
+
+    columns = NUMERIC_FEATURES + CATEGORICAL_FEATURES + [TARGET]
+    paths = {"csv": os.path.join(workdir, "trades.csv"), "columnar": os.path.join(workdir, "trades")}
+    results = {}
+    for fmt, path in paths.items():
+        save_dataset(df, path, fmt, seed)
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            loaded = load_dataset(path, columns=columns)
+            # Touch every column: a memory-mapped load is otherwise only paid for later
+            for name in columns:
+                np.asarray(loaded[name])
+            timings.append(time.perf_counter() - started)
+        results[f"load.{fmt}_seconds"] = min(timings)
+    return paths, results
+
+
+# --- Training ---
+def _train_child(data_path, workdir):
+    """Runs in a freshly spawned process: its peak RSS is the trainer's alone, whatever the parent holds."""
+    import app.ml_runtime  # noqa: F401  (puts ml_service on sys.path)
+    from train_model import SettlementPredictor
+    os.chdir(workdir)  # train() writes model/metrics.json relative to the working directory
+    predictor = SettlementPredictor()
+    predictor.build()
+    started = time.perf_counter()
+    predictor.train(data_path)
+    wall = time.perf_counter() - started
+    return wall, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def bench_training(data_path, workdir):
+    # SettlementPredictor.train end to end (load, split, fit, evaluate); peak RSS includes the imports
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        wall, peak_mb = pool.submit(_train_child, data_path, workdir).result()
+    return {"train.wall_seconds": wall, "train.peak_rss_mb": peak_mb}
+
+
+# --- Serving ---
+def serving_environment(workdir):
+    # Defaults only: anything already set in the environment wins
+    os.environ.setdefault("MODEL_PATH", DEFAULT_MODEL_PATH)
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ.setdefault("PREDICTION_CACHE", "0")  # measure scoring, not cache hits
+    os.environ.setdefault("MODEL_WATCH_INTERVAL", "0")
+    # The write-behind flush runs off the request path; on a small machine its bursts only add noise
+    os.environ.setdefault("PERSIST_TRADES", "0")
+
+
+def trade_records(df, n):
+    from app.schemas.predict import TradeRequest
+    fields = [name for name in TradeRequest.model_fields if name in df.columns]
+    sample = df[fields].head(n)
+    return [{k: (v.item() if hasattr(v, "item") else v) for k, v in row.items()}
+            for row in sample.to_dict("records")]
+
+
+async def _bench_serving(df, config):
+    import httpx
+    from app import main
+
+    app = main.app
+    requests, repeats = config["requests"], config["repeats"]
+    results = {}
+    async with app.router.lifespan_context(app):
+        model = main.active_model()
+        if model is None:
+            raise RuntimeError(f"No model to serve (MODEL_PATH={os.environ['MODEL_PATH']})")
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # A. Single-trade latency, one request at a time, distinct trades. Percentiles are
+            # taken per round and the median round is reported, so one hiccup does not move the tail.
+            trades = trade_records(df, 20 + requests * repeats)
+            for trade in trades[:20]:  # warm-up
+                await client.post("/predict", params={"explain": "none"}, json=trade)
+            rounds = []
+            for r in range(repeats):
+                latencies = []
+                for trade in trades[20 + r * requests:20 + (r + 1) * requests]:
+                    started = time.perf_counter()
+                    response = await client.post("/predict", params={"explain": "none"}, json=trade)
+                    latencies.append((time.perf_counter() - started) * 1000.0)
+                    response.raise_for_status()
+                rounds.append(np.percentile(latencies, [50, 95, 99]))
+            for q, value in zip((50, 95, 99), np.median(rounds, axis=0)):
+                results[f"predict.p{q}_ms"] = float(value)
+
+            # B. Batch throughput per batch size (JSON in and out, as a client sees it), over
+            # enough calls to score min_batch_rows rows; the median call is reported
+            for size in config["batch_sizes"]:
+                batch = trade_records(df, size)
+                (await client.post("/predict/batch", json={"trades": batch})).raise_for_status()  # warm-up
+                timings = []
+                for _ in range(max(repeats, -(-config["min_batch_rows"] // size))):
+                    gc.collect()  # start every call from the same heap state
+                    started = time.perf_counter()
+                    response = await client.post("/predict/batch", json={"trades": batch})
+                    timings.append(time.perf_counter() - started)
+                    response.raise_for_status()
+                results[BATCH_METRIC.format(size)] = size / float(np.median(timings))
+
+        # C. Explanation cost (pred_contribs), single trade and per trade in a batch
+        explainer = model.get("explainer")
+        if explainer is not None:
+            records = trade_records(df, config["explain_rows"])
+            single = []
+            for record in records:
+                started = time.perf_counter()
+                explainer.explain_one(record)
+                single.append((time.perf_counter() - started) * 1000.0)
+            results["explain.single_p50_ms"] = float(np.percentile(single, 50))
+            timings = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                explainer.explain_records(records)
+                timings.append((time.perf_counter() - started) * 1000.0)
+            results["explain.batch_ms_per_trade"] = min(timings) / len(records)
+    return results
+
+
+def bench_serving(df, config):
+    return asyncio.run(_bench_serving(df, config))
+
+
+# --- Results and comparison ---
+def compare(baseline, current, threshold, tail_threshold=None):
+    """
+    One row per metric present in both runs: (name, baseline, current, change,
+    regressed). `change` is the relative change in the bad direction (positive =
+    worse); a metric regresses when it exceeds the threshold (tail_threshold for
+    p95/p99 latency).
+    """
+    tail_threshold = 2 * threshold if tail_threshold is None else tail_threshold
+    rows = []
+    for name, base in sorted(baseline["results"].items()):
+        if name not in current["results"]:
+            continue
+        value = current["results"][name]
+        _, direction = metric_spec(name)
+        if base == 0:
+            change = 0.0
+        elif direction == "higher":
+            change = (base - value) / base
+        else:
+            change = (value - base) / base
+        limit = tail_threshold if name in NOISY_METRICS else threshold
+        rows.append((name, base, value, change, change > limit))
+    return rows
+
+
+def comparable(baseline, current):
+    """Reasons the two runs cannot be compared (different workload), if any."""
+    reasons = []
+    if baseline.get("format") != RESULTS_FORMAT:
+        reasons.append(f"baseline format {baseline.get('format')} != {RESULTS_FORMAT}")
+    for key, value in current["config"].items():
+        if baseline.get("config", {}).get(key) != value:
+            reasons.append(f"config.{key}: baseline {baseline.get('config', {}).get(key)!r}, current {value!r}")
+    return reasons
+
+
+def run(config, seed, skip=()):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="settlement-bench-") as workdir:
+        serving_environment(workdir)
+        import app.ml_runtime  # noqa: F401  (puts ml_service on sys.path)
+
+        print(f"[bench] generator: {config['rows']} rows")
+        df, measured = bench_generator(config["rows"], seed, config["repeats"])
+        results.update(measured)
+
+        print("[bench] load: CSV vs columnar")
+        train_df = df.head(config["train_rows"])
+        paths, measured = bench_load(train_df, workdir, seed, config["repeats"])
+        results.update(measured)
+
+        if "train" not in skip:
+            print(f"[bench] training: {config['train_rows']} rows")
+            results.update(bench_training(paths["columnar"], workdir))
+
+        if "serve" not in skip:
+            print(f"[bench] serving: {config['requests']} requests, batches {config['batch_sizes']}")
+            results.update(bench_serving(df, config))
+
+    import xgboost
+    return {
+        "format": RESULTS_FORMAT,
+        "config": {**config, "seed": seed},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "xgboost": xgboost.__version__,
+        },
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": {k: round(float(v), 6) for k, v in results.items()},
+    }
+
+
+def print_results(report):
+    for name, value in report["results"].items():
+        unit, _ = metric_spec(name)
+        print(f"  {name:32s} {value:14.4f} {unit}")
+
+
+def print_comparison(rows, threshold, tail_threshold):
+    print(f"\nComparison against baseline (threshold {threshold:.0%}, tail latencies {tail_threshold:.0%}; "
+          f"positive change = worse):")
+    for name, base, value, change, regressed in rows:
+        flag = "REGRESSION" if regressed else "ok"
+        print(f"  {name:32s} {base:14.4f} -> {value:14.4f}  {change:+8.1%}  {flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Settlement model performance benchmarks")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="full")
+    parser.add_argument("--quick", action="store_const", const="quick", dest="preset", help="Same as --preset quick")
+    parser.add_argument("--seed", type=int, default=None, help="Dataset seed (default: the generator's)")
+    parser.add_argument("--skip", action="append", choices=["train", "serve"], default=[],
+                        help="Leave out a stage (repeatable)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to write the JSON results")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, default=None,
+                        help="Baseline JSON to compare against (default: benchmarks/baseline.json)")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("BENCH_REGRESSION_THRESHOLD", "0.2")),
+                        help="Allowed relative regression per metric, e.g. 0.2 = 20%% worse")
+    parser.add_argument("--tail-threshold", type=float, default=None,
+                        help="Allowed regression of p95/p99 latency (default: twice --threshold)")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, default=None,
+                        help="Also write the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    import app.ml_runtime  # noqa: F401
+    from data_generator import DEFAULT_SEED
+    seed = DEFAULT_SEED if args.seed is None else args.seed
+
+    report = run(dict(PRESETS[args.preset]), seed, skip=set(args.skip))
+    print_results(report)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        reasons = comparable(baseline, report)
+        if reasons:
+            print("Baseline is not comparable with this run:\n  " + "\n  ".join(reasons))
+            return 2
+        tail_threshold = 2 * args.threshold if args.tail_threshold is None else args.tail_threshold
+        rows = compare(baseline, report, args.threshold, tail_threshold)
+        print_comparison(rows, args.threshold, tail_threshold)
+        regressions = [row[0] for row in rows if row[4]]
+        if regressions:
+            print(f"\nFAILED: {len(regressions)} metric(s) regressed beyond the threshold: {', '.join(regressions)}")
+            return 1
+        print("\nNo regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
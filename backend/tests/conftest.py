@@ -0,0 +1,36 @@
+import os
+import tempfile
+import pytest
+
+# Point the lifespan loader at the committed artifacts regardless of where pytest is launched from
+MODEL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "ml_service", "model"))
+os.environ.setdefault("MODEL_PATH", os.path.join(MODEL_DIR, "model.joblib"))
+
+# Throwaway SQLite database instead of the docker-compose Postgres
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='settlement-guard-')}/test.db")
+
+SAMPLE_TRADE = {
+    "Notional_Amount_USD": 5000000.0,
+    "Market_Volatility_Index": 18.5,
+    "Asset_Class": "Corp Bond",
+    "Counterparty_Rating": "CCC",
+    "SSI_Status": "Mismatch",
+    "Liquidity_Score": "Low",
+}
+
+SAFE_TRADE = {
+    "Notional_Amount_USD": 250000.0,
+    "Market_Volatility_Index": 12.0,
+    "Asset_Class": "Equity",
+    "Counterparty_Rating": "AAA",
+    "SSI_Status": "Match",
+    "Liquidity_Score": "High",
+}
+
+@pytest.fixture(scope="module")
+def loaded_client():
+    # Context manager runs the lifespan, which loads the model
+    from fastapi.testclient import TestClient
+    from app.main import app
+    with TestClient(app) as c:
+        yield c
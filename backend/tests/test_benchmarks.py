@@ -0,0 +1,29 @@
+from benchmarks.run import compare, comparable
+
+def report(results, **config):
+    return {"format": 1, "config": {"rows": 1000, "seed": 42, **config}, "results": results}
+
+def test_compare_respects_metric_direction_and_threshold():
+    baseline = report({"predict.p50_ms": 10.0, "generate.rows_per_sec": 1000.0, "batch.rows_per_sec@100": 500.0,
+                       "predict.p99_ms": 20.0, "train.wall_seconds": 5.0})
+    current = report({"predict.p50_ms": 12.5, "generate.rows_per_sec": 1200.0, "batch.rows_per_sec@100": 350.0,
+                      "predict.p99_ms": 27.0})  # train skipped this run
+    rows = {name: (change, regressed) for name, _, _, change, regressed in compare(baseline, current, 0.2)}
+    assert set(rows) == {"predict.p50_ms", "generate.rows_per_sec", "batch.rows_per_sec@100", "predict.p99_ms"}
+    assert rows["predict.p50_ms"] == (0.25, True)  # slower
+    assert rows["generate.rows_per_sec"][1] is False and rows["generate.rows_per_sec"][0] < 0  # faster
+    assert rows["batch.rows_per_sec@100"][1] is True  # 30% less throughput
+    assert rows["predict.p99_ms"][1] is False  # +35%, within the doubled tail-latency threshold
+
+def test_baseline_with_a_different_workload_is_not_comparable():
+    assert comparable(report({}), report({})) == []
+    reasons = comparable(report({}, rows=1000), report({}, rows=5000))
+    assert reasons == ["config.rows: baseline 1000, current 5000"]
+
+def test_tail_latency_threshold_is_configurable():
+    baseline = report({"predict.p99_ms": 20.0, "predict.p50_ms": 10.0})
+    current = report({"predict.p99_ms": 30.0, "predict.p50_ms": 10.5})
+    regressed = {name: flag for name, *_, flag in compare(baseline, current, 0.2, tail_threshold=0.6)}
+    assert regressed == {"predict.p99_ms": False, "predict.p50_ms": False}
+    regressed = {name: flag for name, *_, flag in compare(baseline, current, 0.2, tail_threshold=0.3)}
+    assert regressed["predict.p99_ms"] is True
@@ -0,0 +1,90 @@
+import os
+import shutil
+import joblib
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app.ml_runtime  # noqa: F401  (puts ml_service/ on sys.path)
+import bundle  # noqa: E402
+from fast_path import FastPathPredictor  # noqa: E402
+from tests.conftest import MODEL_DIR, SAMPLE_TRADE, SAFE_TRADE
+
+@pytest.fixture(scope="module")
+def pipeline():
+    return joblib.load(os.path.join(MODEL_DIR, "model.joblib"))
+
+def test_bundle_round_trip_matches_pipeline(pipeline, tmp_path):
+    version = bundle.write_bundle(pipeline, str(tmp_path), feature_names=["a", "b"])
+    assert bundle.current_version(str(tmp_path)) == version
+    # Same content -> same version, no new directory
+    assert bundle.write_bundle(pipeline, str(tmp_path), feature_names=["a", "b"]) == version
+    assert sorted(os.listdir(tmp_path)) == [bundle.CURRENT_FILE, version]
+
+    loaded = bundle.load_bundle(str(tmp_path))
+    assert loaded["version"] == version and loaded["feature_names"] == ["a", "b"]
+    # Full feature rows (the API fills the optional fields before scoring)
+    extra = {"Custodian_Location": "US", "Operation_Type": "DVP", "Currency": "USD",
+             "Trade_Day": "Monday", "Trade_Hour": 12.0}
+    records = [{**SAMPLE_TRADE, **extra}, {**SAFE_TRADE, **extra}]
+    expected = FastPathPredictor.from_pipeline(pipeline).predict_records(records)
+    np.testing.assert_allclose(loaded["fast_path"].predict_records(records), expected, rtol=1e-6)
+
+def test_tampered_bundle_is_rejected(pipeline, tmp_path):
+    version = bundle.write_bundle(pipeline, str(tmp_path))
+    booster_path = tmp_path / version / bundle.BOOSTER_FILE
+    booster_path.write_bytes(booster_path.read_bytes() + b" ")
+    with pytest.raises(ValueError, match="content hash"):
+        bundle.load_bundle(str(tmp_path))
+
+def test_api_serves_committed_bundle(loaded_client):
+    health = loaded_client.get("/health").json()
+    assert health["model_source"] == "bundle"
+    assert health["model_version"] == bundle.current_version(os.path.join(MODEL_DIR, bundle.BUNDLE_DIR))
+    body = loaded_client.post("/predict", params={"explain": "none"}, json=SAMPLE_TRADE).json()
+    assert body["model_version"] == health["model_version"]
+
+def test_api_falls_back_to_pickled_pipeline(monkeypatch, tmp_path):
+    from app.main import app
+    monkeypatch.setenv("MODEL_BUNDLE_DIR", str(tmp_path))
+    with TestClient(app) as client:
+        health = client.get("/health").json()
+        assert health["model_source"] == "pipeline"
+        assert client.post("/predict", json=SAFE_TRADE).json()["model_version"] == health["model_version"]
+
+def test_watcher_hot_swaps_new_version(monkeypatch, pipeline, tmp_path):
+    from app.main import app, ml_models
+    shutil.copytree(os.path.join(MODEL_DIR, bundle.BUNDLE_DIR), tmp_path, dirs_exist_ok=True)
+    monkeypatch.setenv("MODEL_BUNDLE_DIR", str(tmp_path))
+    monkeypatch.setenv("PREDICTION_CACHE", "0")
+    with TestClient(app) as client:
+        old = client.get("/health").json()["model_version"]
+        before = client.post("/predict", params={"explain": "none"}, json=SAMPLE_TRADE).json()
+
+        # Nothing published yet -> no swap
+        assert not ml_models["model_watcher"].check()
+        # Publishing the same booster without the cascade config is a new version
+        new = bundle.write_bundle(pipeline, str(tmp_path))
+        assert new != old
+        assert ml_models["model_watcher"].check()
+
+        health = client.get("/health").json()
+        assert health["model_version"] == new and health["model_watcher"]["swaps"] == 1
+        after = client.post("/predict", params={"explain": "none"}, json=SAMPLE_TRADE).json()
+        assert after["model_version"] == new
+        assert after["failure_probability"] == pytest.approx(before["failure_probability"], abs=1e-6)
+
+        # A broken publish keeps the current model serving
+        (tmp_path / bundle.CURRENT_FILE).write_text("missing")
+        assert not ml_models["model_watcher"].check()
+        assert client.get("/health").json()["model_watcher"]["failures"] == 1
+        assert client.post("/predict", json=SAFE_TRADE).json()["model_version"] == new
+
+def test_importing_the_api_skips_training_libraries(tmp_path):
+    # Fresh interpreter: the test session itself has these loaded already
+    import subprocess, sys
+    probe = "import sys, app.main; print(sorted(m for m in ('sklearn', 'imblearn', 'pandas', 'xgboost') if m in sys.modules))"
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp_path}/import.db"}
+    out = subprocess.run([sys.executable, "-c", probe], env=env, capture_output=True, text=True,
+                         cwd=os.path.dirname(os.path.dirname(__file__)), check=True).stdout
+    assert out.strip().splitlines()[-1] == "[]"
@@ -0,0 +1,53 @@
+import os
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app.ml_runtime  # noqa: F401  (puts ml_service/ on sys.path)
+import cascade  # noqa: E402
+from tests.conftest import MODEL_DIR, SAMPLE_TRADE, SAFE_TRADE
+
+def test_fit_bands_covers_disagreements_within_budget():
+    prefix = np.array([0.10, 0.45, 0.48, 0.55, 0.79, 0.85, 0.20])
+    full = np.array([0.10, 0.60, 0.40, 0.45, 0.85, 0.90, 0.90])
+    # 0.45 and 0.79 cross upwards, 0.55 downwards; 0.20 -> 0.90 is the costly one
+    bands = cascade.fit_bands(prefix, full, allowed_misses=1)
+    escalate = cascade.in_bands(prefix, bands)
+    assert escalate[[1, 3, 4]].all() and not escalate[[0, 5, 6]].any()
+    assert bands[0] == pytest.approx([0.45, 0.55])
+
+    bands = cascade.fit_bands(prefix, full, allowed_misses=0)
+    assert cascade.in_bands(prefix, bands)[6]
+
+def test_calibrated_cascade_keeps_disagreement_under_target():
+    pytest.importorskip("faker")
+    import joblib
+    import data_generator
+    from fast_path import FastPathPredictor
+
+    fast_path = FastPathPredictor.from_pipeline(joblib.load(os.path.join(MODEL_DIR, "model.joblib")))
+    X = fast_path.encode_frame(data_generator.generate_market_data(20000, seed=21))
+    config = cascade.calibrate(fast_path, X, target_disagreement=0.002)
+    assert config["holdout_disagreement"] <= 0.002
+    assert config["prefix_trees"] < config["total_trees"]
+
+    model = cascade.CascadePredictor(fast_path, config["prefix_trees"], config["bands"])
+    probs, tiers = model.predict_proba(X)
+    assert (tiers == cascade.TIER_PREFIX).mean() > 0.5
+    full = fast_path.predict_proba(X)
+    escalated = tiers == cascade.TIER_FULL
+    np.testing.assert_allclose(probs[escalated], full[escalated])
+    assert np.mean(cascade.risk_levels(probs) != cascade.risk_levels(full)) <= 0.002
+
+def test_api_reports_scoring_tier(monkeypatch):
+    from app.main import app
+    monkeypatch.setenv("CASCADE", "1")
+    monkeypatch.setenv("PREDICTION_CACHE", "0")
+    with TestClient(app) as client:
+        assert client.get("/health").json()["cascade"]["prefix_trees"] > 0
+        safe = client.post("/predict", params={"explain": "none"}, json=SAFE_TRADE).json()
+        assert safe["scoring_tier"] == "prefix" and safe["risk_level"] == "LOW"
+
+        batch = client.post("/predict/batch", json={"trades": [SAMPLE_TRADE, SAFE_TRADE]}).json()
+        assert {r["scoring_tier"] for r in batch["results"]} <= {"prefix", "full"}
+        assert batch["results"][1]["scoring_tier"] == "prefix"
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import app.ml_runtime  # noqa: F401  (puts ml_service/ on sys.path)
+
+pytest.importorskip("faker")
+import columnar  # noqa: E402
+import data_generator  # noqa: E402
+
+def test_round_trip_and_projection(tmp_path):
+    df = data_generator.generate_market_data(2000, seed=3)
+    columnar.write_columnar(df, tmp_path / "ds", data_generator.generator_schema(3))
+
+    back = columnar.read_columnar(tmp_path / "ds")
+    assert list(back.columns) == list(df.columns)
+    assert back['Trade_ID'].tolist() == df['Trade_ID'].tolist()
+    assert back['SSI_Status'].astype(str).tolist() == df['SSI_Status'].tolist()
+    np.testing.assert_allclose(back['Notional_Amount_USD'], df['Notional_Amount_USD'], rtol=1e-6)
+
+    projected = columnar.load_dataset(str(tmp_path / "ds"), columns=['IS_FAILED', 'Currency'])
+    assert list(projected.columns) == ['IS_FAILED', 'Currency']
+    assert projected['IS_FAILED'].sum() == df['IS_FAILED'].sum()
+
+def test_parts_are_memory_mapped(tmp_path):
+    data_generator.generate_to_disk(2500, tmp_path / "ds", chunk_size=1000, workers=2, seed=7)
+    meta = columnar.read_schema(tmp_path / "ds")
+    assert meta['num_rows'] == 2500 and len(meta['parts']) == 3
+    arrays = columnar.read_part_arrays(tmp_path / "ds", meta['parts'][0], ['Notional_Amount_USD'])
+    assert isinstance(arrays['Notional_Amount_USD'], np.memmap)
+    assert len(columnar.read_columnar(tmp_path / "ds", ['Trade_Hour'])) == 2500
+
+def test_csv_export_matches(tmp_path):
+    df = data_generator.generate_market_data(500, seed=5)
+    columnar.write_columnar(df, tmp_path / "ds")
+    columnar.export_csv(tmp_path / "ds", tmp_path / "out.csv", columns=['Trade_ID', 'Asset_Class'])
+    exported = pd.read_csv(tmp_path / "out.csv")
+    assert exported['Trade_ID'].tolist() == df['Trade_ID'].tolist()
+    assert exported['Asset_Class'].tolist() == df['Asset_Class'].tolist()
+
+def test_unknown_category_is_rejected(tmp_path):
+    df = pd.DataFrame({'Currency': ['USD', 'EUR']})
+    with pytest.raises(ValueError):
+        columnar.write_part(df, tmp_path, "part-00000", {'Currency': {"kind": "category", "categories": ['USD']}})
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from app.services import columnar_codec as codec
+from tests.conftest import SAMPLE_TRADE, SAFE_TRADE
+
+TRADES = [SAMPLE_TRADE, SAFE_TRADE, {**SAMPLE_TRADE, "SSI_Status": "Match", "Notional_Amount_USD": 1e8}]
+
+def trade_columns(trades, string_fields=("Liquidity_Score",)):
+    """Required TradeRequest fields as columns: numerics, dictionary codes, and plain strings."""
+    columns = {}
+    for name in ("Notional_Amount_USD", "Market_Volatility_Index"):
+        columns[name] = {"kind": "numeric", "values": np.array([t[name] for t in trades])}
+    for name in ("Asset_Class", "Counterparty_Rating", "SSI_Status", "Liquidity_Score"):
+        values = [t[name] for t in trades]
+        if name in string_fields:
+            columns[name] = {"kind": "string", "values": np.array(values)}
+        else:
+            categories = sorted(set(values))
+            columns[name] = {"kind": "category", "categories": categories,
+                             "codes": np.array([categories.index(v) for v in values], dtype=np.int8)}
+    return columns
+
+def post(client, columns, n_rows, **params):
+    return client.post("/predict/columnar", params=params, content=codec.encode_batch(columns, n_rows),
+                       headers={"content-type": codec.MEDIA_TYPE})
+
+def test_codec_round_trip_is_zero_copy():
+    columns = trade_columns(TRADES)
+    columns["Trade_ID"] = {"kind": "string", "values": np.array(["T1", "T2", "T-333"])}
+    body = codec.encode_batch(columns, 3, {"source": "test"})
+    batch = codec.decode_batch(body)
+    assert batch["num_rows"] == 3 and batch["metadata"] == {"source": "test"}
+    notional = batch["columns"]["Notional_Amount_USD"]["values"]
+    np.testing.assert_array_equal(notional, columns["Notional_Amount_USD"]["values"])
+    assert not notional.flags.writeable and not notional.flags.owndata  # a view over the body
+    assert batch["columns"]["Trade_ID"]["values"].tolist() == [b"T1", b"T2", b"T-333"]
+    assert batch["columns"]["SSI_Status"]["categories"] == ["Match", "Mismatch"]
+
+def test_codec_rejects_malformed_payloads():
+    body = codec.encode_batch(trade_columns(TRADES), 3)
+    with pytest.raises(codec.ColumnarFormatError, match="magic"):
+        codec.decode_batch(b"XXXX" + body[4:])
+    with pytest.raises(codec.ColumnarFormatError, match="does not hold"):
+        codec.decode_batch(body[:-64])
+
+def with_header(body, edit):
+    """Re-packs an SGCB payload after `edit` mutates its parsed header."""
+    import json
+    magic, length = codec._PREFIX.unpack_from(body)
+    header_end = codec._PREFIX.size + length
+    header = json.loads(body[codec._PREFIX.size:header_end])
+    edit(header)
+    data = body[header_end + codec._pad(header_end):]
+    raw = json.dumps(header).encode()
+    prefix = codec._PREFIX.pack(magic, len(raw)) + raw
+    return prefix + b"\0" * codec._pad(len(prefix)) + data
+
+def test_codec_rejects_malformed_headers(loaded_client):
+    body = codec.encode_batch(trade_columns(TRADES), 3)
+    missing = with_header(body, lambda h: h["columns"][0].pop("nbytes"))
+    with pytest.raises(codec.ColumnarFormatError, match="missing 'nbytes'"):
+        codec.decode_batch(missing)
+    negative = with_header(body, lambda h: h["columns"][1].update(offset=-8))
+    with pytest.raises(codec.ColumnarFormatError, match="offset must be a non-negative integer"):
+        codec.decode_batch(negative)
+    with pytest.raises(codec.ColumnarFormatError, match="num_rows"):
+        codec.decode_batch(with_header(body, lambda h: h.pop("num_rows")))
+    with pytest.raises(codec.ColumnarFormatError, match="offset"):
+        codec.decode_batch(with_header(body, lambda h: h["columns"][0].update(offset="0")))
+    # A bad client payload is a 400, never a 500
+    for payload in (missing, negative):
+        response = loaded_client.post("/predict/columnar", content=payload, headers={"content-type": codec.MEDIA_TYPE})
+        assert response.status_code == 400
+
+def test_columnar_scores_match_batch_endpoint(loaded_client):
+    columns = trade_columns(TRADES)
+    columns["Trade_ID"] = {"kind": "string", "values": np.array(["T1", "T2", "T3"])}
+    response = post(loaded_client, columns, 3)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == codec.MEDIA_TYPE
+
+    result = codec.decode_batch(response.content)
+    out = result["columns"]
+    assert out["Trade_ID"]["values"].tolist() == [b"T1", b"T2", b"T3"]
+    expected = loaded_client.post("/predict/batch", json={"trades": TRADES}).json()
+    assert result["metadata"]["model_version"] == expected["model_version"]
+    for i, row in enumerate(expected["results"]):
+        assert out["failure_probability"]["values"][i] == pytest.approx(row["failure_probability"], abs=1e-4)
+        assert out["risk_level"]["categories"][out["risk_level"]["codes"][i]] == row["risk_level"]
+        assert out["scoring_tier"]["categories"][out["scoring_tier"]["codes"][i]] == "full"
+
+def test_columnar_validation_is_column_wise(loaded_client):
+    columns = trade_columns(TRADES)
+    del columns["Market_Volatility_Index"]
+    columns["SSI_Status"]["codes"][1] = 5
+    columns["Notional_Amount_USD"]["values"][2] = np.nan
+    detail = post(loaded_client, columns, 3).json()["detail"]
+    assert len(detail) == 3
+    assert any(d.startswith("Market_Volatility_Index: required") for d in detail)
+    assert any(d.startswith("SSI_Status: 1 null or out-of-range") for d in detail)
+    assert any(d.startswith("Notional_Amount_USD: 1 non-finite") for d in detail)
+
+def test_columnar_unknown_categories(loaded_client):
+    columns = trade_columns(TRADES)
+    columns["Asset_Class"] = {"kind": "string", "values": np.array(["Corp Bond", "Crypto", "Crypto"])}
+    result = codec.decode_batch(post(loaded_client, columns, 3).content)
+    assert result["metadata"]["unknown_categories"] == {"Asset_Class": ["Crypto"]}
+    assert post(loaded_client, columns, 3, unknown_categories="reject").status_code == 422
+
+def test_columnar_rejects_other_content_types(loaded_client):
+    assert loaded_client.post("/predict/columnar", json={"trades": TRADES}).status_code == 415
+
+def test_columnar_arrow_stream(loaded_client):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+    table = pa.table({name: [t[name] for t in TRADES] for name in SAMPLE_TRADE})
+    sink = pa.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    response = loaded_client.post("/predict/columnar", content=sink.getvalue().to_pybytes(),
+                                  headers={"content-type": codec.ARROW_MEDIA_TYPE})
+    assert response.status_code == 200
+    result = pyarrow.ipc.open_stream(response.content).read_all()
+    assert result.num_rows == 3 and result.column("risk_level").to_pylist()[1] == "LOW"
@@ -0,0 +1,59 @@
+import uuid
+import numpy as np
+import pandas as pd
+import pytest
+
+import app.ml_runtime  # noqa: F401  (puts ml_service/ on sys.path)
+
+pytest.importorskip("faker")
+import data_generator  # noqa: E402
+
+def reference_failure_prob(row):
+    # The original row-by-row rules, kept here as the spec for the vectorized version
+    prob = 0.01
+    if row['SSI_Status'] == 'Mismatch':
+        prob += 0.90
+    if row['Counterparty_Rating'] == 'CCC' and row['Asset_Class'] == 'Corp Bond':
+        prob += 0.30
+    elif row['Counterparty_Rating'] == 'BB' and row['Asset_Class'] == 'Corp Bond':
+        prob += 0.15
+    if row['Trade_Day'] == 'Friday' and row['Trade_Hour'] >= 16 and row['Currency'] != 'USD':
+        prob += 0.15
+    if row['Notional_Amount_USD'] > 100_000_000 and row['Liquidity_Score'] == 'Low':
+        prob += 0.25
+    if row['Market_Volatility_Index'] > 30:
+        prob += 0.05
+    return min(prob, 1.0)
+
+def test_vectorized_rules_match_row_rules():
+    df = data_generator.generate_market_data(5000)
+    # Force every rule to fire somewhere
+    rng = np.random.default_rng(0)
+    df.loc[rng.choice(len(df), 300, replace=False), 'SSI_Status'] = 'Mismatch'
+    df.loc[:, 'Trade_Day'] = rng.choice(['Friday', 'Monday'], len(df))
+    df.loc[:, 'Trade_Hour'] = rng.integers(0, 24, len(df))
+    df.loc[rng.choice(len(df), 300, replace=False), 'Notional_Amount_USD'] = 2e8
+    expected = df.apply(reference_failure_prob, axis=1).to_numpy()
+    np.testing.assert_allclose(data_generator.failure_probability(df), expected)
+
+def test_ids_are_well_formed():
+    rng = np.random.default_rng(1)
+    ids = data_generator.bulk_uuid4(rng, 1000)
+    assert len(set(ids)) == 1000
+    assert all(uuid.UUID(i).version == 4 for i in ids[:50])
+    isins = data_generator.bulk_isin(rng, 100)
+    assert all(len(s) == 12 and s[:2].isalpha() and s[2:].isdigit() for s in isins)
+
+def test_target_tracks_failure_probability():
+    df = data_generator.generate_market_data(50000)
+    assert df['IS_FAILED'].isin([0, 1]).all()
+    assert df[df['SSI_Status'] == 'Mismatch']['IS_FAILED'].mean() > 0.85
+    assert abs(df['IS_FAILED'].mean() - df['Failure_Prob'].mean()) < 0.005
+
+def test_chunked_output_is_independent_of_worker_count(tmp_path):
+    serial = data_generator.generate_to_disk(2500, tmp_path / "serial", chunk_size=1000, workers=1, seed=7, fmt="csv")
+    parallel = data_generator.generate_to_disk(2500, tmp_path / "parallel", chunk_size=1000, workers=2, seed=7, fmt="csv")
+    assert len(serial) == 3
+    for a, b in zip(serial, parallel):
+        pd.testing.assert_frame_equal(pd.read_csv(a), pd.read_csv(b))
+    assert len(pd.read_csv(serial[-1])) == 500
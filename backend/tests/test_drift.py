@@ -0,0 +1,106 @@
+import json
+import os
+import joblib
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app.ml_runtime  # noqa: F401  (puts ml_service/ on sys.path)
+import drift  # noqa: E402
+from fast_path import FastPathPredictor  # noqa: E402
+from tests.conftest import MODEL_DIR
+
+pytest.importorskip("faker")
+import data_generator  # noqa: E402
+from train_model import NUMERIC_FEATURES, CATEGORICAL_FEATURES  # noqa: E402
+
+@pytest.fixture(scope="module")
+def fast_path():
+    return FastPathPredictor.from_pipeline(joblib.load(os.path.join(MODEL_DIR, "model.joblib")))
+
+@pytest.fixture(scope="module")
+def reference(fast_path):
+    df = data_generator.generate_market_data(20_000, seed=1)
+    probs = fast_path.predict_proba(fast_path.encode_frame(df))
+    return drift.build_reference(df, NUMERIC_FEATURES, CATEGORICAL_FEATURES, probs)
+
+def live_flow(fast_path, n=5_000, seed=2, **overrides):
+    df = data_generator.generate_market_data(n, seed=seed)
+    for column, value in overrides.items():
+        df[column] = value(df[column]) if callable(value) else value
+    records = df[NUMERIC_FEATURES + CATEGORICAL_FEATURES].to_dict("records")
+    return records, fast_path.predict_proba(fast_path.encode_records(records))
+
+def test_same_distribution_is_stable_and_shifts_are_flagged(fast_path, reference):
+    monitor = drift.DriftMonitor(reference, min_samples=1000)
+    records, probs = live_flow(fast_path)
+    monitor.observe_records(records, probs)
+    report = monitor.report()
+    assert report["status"] == "stable" and report["window"] == 5000
+    assert report["features"]["Notional_Amount_USD"]["ks"] < 0.05
+    median = report["features"]["Market_Volatility_Index"]["quantiles"]["0.5"]
+    assert abs(median - reference["numeric"]["Market_Volatility_Index"]["quantiles"]["0.5"]) < 0.5
+
+    # Volatility regime change plus a broken SSI feed
+    monitor.reset()
+    records, probs = live_flow(fast_path, Market_Volatility_Index=lambda v: v + 15, SSI_Status="Mismatch")
+    monitor.observe_records(records, probs)
+    report = monitor.report()
+    assert report["status"] == "significant"
+    assert report["features"]["Market_Volatility_Index"]["status"] == "significant"
+    assert report["features"]["Market_Volatility_Index"]["ks"] > 0.5
+    assert report["features"]["SSI_Status"]["shares"]["Mismatch"] == 1.0
+    assert report["features"]["Asset_Class"]["status"] == "stable"
+    assert report["prediction"]["psi"] > 0.25
+
+def test_single_batch_and_columnar_updates_agree(fast_path, reference):
+    records, probs = live_flow(fast_path, n=600, Currency=lambda c: c.where(c != "JPY", "CHF"))
+    one, batch, columns = (drift.DriftMonitor(reference, min_samples=1) for _ in range(3))
+    for record, prob in zip(records, probs):
+        one.observe_one(record, float(prob))
+    batch.observe_records(records, probs)
+    numeric = {name: np.array([r[name] for r in records]) for name in NUMERIC_FEATURES}
+    coded = {}
+    for name in CATEGORICAL_FEATURES:
+        categories, codes = np.unique([r[name] for r in records], return_inverse=True)
+        coded[name] = (codes, categories)
+    columns.observe_columns(numeric, coded, probs)
+
+    reports = [m.report() for m in (one, batch, columns)]
+    assert reports[0]["features"] == reports[1]["features"] == reports[2]["features"]
+    assert reports[0]["prediction"] == reports[1]["prediction"] == reports[2]["prediction"]
+    currency = reports[0]["features"]["Currency"]
+    assert currency["shares"][drift.OTHER] > 0 and currency["unseen_categories"] == ["CHF"]
+
+def test_window_bounds_memory_and_history(fast_path, reference):
+    monitor = drift.DriftMonitor(reference, window=1000, min_samples=1)
+    for seed in range(5):
+        monitor.observe_records(*live_flow(fast_path, n=500, seed=seed))
+    report = monitor.report()
+    # Two generations: the last full window of 1000 plus the 500 since
+    assert report["observed"] == 2500 and report["window"] == 1500
+    assert report["rotations"] == 2
+
+def test_drift_endpoint(fast_path, reference, tmp_path, monkeypatch):
+    from app.main import app
+    path = tmp_path / drift.DRIFT_FILE
+    path.write_text(json.dumps(reference))
+    monkeypatch.setenv("DRIFT_REFERENCE_PATH", str(path))
+    monkeypatch.setenv("MODEL_BUNDLE_DIR", str(tmp_path / "serving"))  # pickled pipeline: reference from the file
+    monkeypatch.setenv("DRIFT_MIN_SAMPLES", "200")
+    records, _ = live_flow(fast_path, n=300, Market_Volatility_Index=lambda v: v + 20)
+    with TestClient(app) as client:
+        assert client.get("/drift").json()["status"] == "insufficient_data"
+        client.post("/predict/batch", json={"trades": records})
+        report = client.get("/drift").json()
+        assert report["window"] == 300
+        assert report["features"]["Market_Volatility_Index"]["status"] == "significant"
+        assert report["features"]["Asset_Class"]["type"] == "categorical"
+        assert client.post("/drift/reset").json()["status"] == "reset"
+        assert client.get("/drift").json()["window"] == 0
+
+def test_committed_bundle_ships_a_reference(loaded_client):
+    # Default deployment: the profile travels with the bundle, so /drift is live without extra files
+    import bundle
+    assert bundle.load_bundle(os.path.join(MODEL_DIR, bundle.BUNDLE_DIR))["drift_reference"]["rows"] > 0
+    assert loaded_client.get("/drift").status_code == 200
@@ -0,0 +1,46 @@
+import os
+import joblib
+import numpy as np
+import pytest
+
+from app.ml_runtime import FastPathPredictor, ExplanationEngine
+from tests.conftest import SAMPLE_TRADE, SAFE_TRADE
+
+DEFAULTS = {"Custodian_Location": "US", "Operation_Type": "DVP", "Currency": "USD", "Trade_Day": "Monday", "Trade_Hour": 12.0}
+
+@pytest.fixture(scope="module")
+def engine():
+    pipeline = joblib.load(os.environ["MODEL_PATH"])
+    feature_names = joblib.load(os.path.join(os.path.dirname(os.environ["MODEL_PATH"]), "feature_names.joblib"))
+    return ExplanationEngine(FastPathPredictor.from_pipeline(pipeline), feature_names)
+
+@pytest.fixture(scope="module")
+def records():
+    return [{**DEFAULTS, **SAMPLE_TRADE}, {**DEFAULTS, **SAFE_TRADE}]
+
+def test_contributions_fold_to_business_features(engine, records):
+    explanation = engine.explain_one(records[0])
+    assert explanation["feature_names"] == [
+        "Notional_Amount_USD", "Market_Volatility_Index", "Trade_Hour", "Asset_Class", "Counterparty_Rating",
+        "SSI_Status", "Liquidity_Score", "Custodian_Location", "Operation_Type", "Currency", "Trade_Day",
+    ]
+    # The SSI mismatch is the dominant risk driver
+    contributions = dict(zip(explanation["feature_names"], explanation["feature_contributions"]))
+    assert max(contributions, key=contributions.get) == "SSI_Status"
+
+def test_contributions_are_additive(engine, records):
+    X = engine.fast_path.encode_records(records)
+    base_values, folded = engine.contributions(X)
+    logits = base_values + folded.sum(axis=1)
+    probs = engine.fast_path.predict_proba(X)
+    np.testing.assert_allclose(1.0 / (1.0 + np.exp(-logits)), probs, atol=1e-5)
+
+def test_batch_matches_single(engine, records):
+    batch = engine.explain_records(records)
+    for record, explanation in zip(records, batch):
+        single = engine.explain_one(record)
+        np.testing.assert_allclose(single["feature_contributions"], explanation["feature_contributions"], atol=1e-6)
+
+def test_feature_names_fallback(engine):
+    rebuilt = ExplanationEngine(engine.fast_path, None)
+    assert rebuilt.feature_names == engine.feature_names
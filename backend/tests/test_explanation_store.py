@@ -0,0 +1,157 @@
+import threading
+import time
+
+from app.db.base import Base
+from app.db.session import SessionLocal, engine
+from app.db.models import Trade
+from app.services.explanation_store import DeferredExplainer, InMemoryExplanationStore, DatabaseExplanationStore
+from app.services.trade_writer import trade_row, upsert_trades
+from tests.conftest import SAMPLE_TRADE, SAFE_TRADE
+
+def fake_explain(records):
+    return [{"base_value": 0.0, "feature_names": ["x"], "feature_contributions": [r["x"]]} for r in records]
+
+def trade_ids():
+    db = SessionLocal()
+    try:
+        return {trade_id for (trade_id,) in db.query(Trade.trade_id)}
+    finally:
+        db.close()
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_deferred_explanations_land_in_store():
+    deferred = DeferredExplainer(fake_explain, InMemoryExplanationStore(), workers=1)
+    deferred.start()
+    try:
+        for i in range(10):
+            assert deferred.submit(f"id-{i}", {"x": i}, 0.1)
+        assert wait_for(lambda: deferred.get("id-9")["status"] == "ready")
+        assert deferred.get("id-3")["shap_explanation"]["feature_contributions"] == [3]
+        assert deferred.stats()["completed"] == 10
+    finally:
+        deferred.stop()
+
+def test_full_queue_rejects_instead_of_growing():
+    gate = threading.Event()
+
+    def slow_explain(records):
+        gate.wait()
+        return fake_explain(records)
+
+    deferred = DeferredExplainer(slow_explain, InMemoryExplanationStore(), workers=1, max_queue=2, max_batch=1)
+    deferred.start()
+    try:
+        accepted = [deferred.submit(f"id-{i}", {"x": i}, 0.1) for i in range(6)]
+        assert accepted.count(False) >= 3
+        assert deferred.stats()["rejected"] == accepted.count(False)
+    finally:
+        gate.set()
+        deferred.stop()
+
+def test_store_outage_keeps_results_and_retries():
+    class FlakyStore(InMemoryExplanationStore):
+        down = True
+
+        def save_many(self, entries):
+            if self.down:
+                raise ConnectionError("database unavailable")
+            super().save_many(entries)
+
+    store = FlakyStore()
+    deferred = DeferredExplainer(fake_explain, store, workers=1)
+    deferred.start()
+    try:
+        assert deferred.submit("id-1", {"x": 1}, 0.1)
+        assert wait_for(lambda: deferred.get("id-1")["status"] != "pending")
+        # Not lost (no 404): served from memory until the store takes it
+        assert deferred.get("id-1")["shap_explanation"]["feature_contributions"] == [1]
+        assert store.get("id-1") is None and deferred.stats()["unsaved"] == 1
+
+        store.down = False
+        assert deferred.submit("id-2", {"x": 2}, 0.1)
+        assert wait_for(lambda: store.get("id-2") is not None)
+        assert store.get("id-1")["status"] == "ready" and deferred.stats()["unsaved"] == 0
+    finally:
+        deferred.stop()
+
+def test_rejected_duplicate_keeps_the_running_job_pending():
+    gate = threading.Event()
+
+    def slow_explain(records):
+        gate.wait()
+        return fake_explain(records)
+
+    deferred = DeferredExplainer(slow_explain, InMemoryExplanationStore(), workers=1, max_queue=1, max_batch=1)
+    deferred.start()
+    try:
+        assert deferred.submit("dup", {"x": 1}, 0.1)
+        assert wait_for(lambda: deferred.stats()["queue_depth"] == 0)  # picked up, now running
+        assert deferred.submit("other", {"x": 2}, 0.1)
+        assert not deferred.submit("dup", {"x": 1}, 0.1)  # queue full
+        assert deferred.get("dup")["status"] == "pending"
+        gate.set()
+        assert wait_for(lambda: deferred.get("dup")["status"] == "ready")
+    finally:
+        gate.set()
+        deferred.stop()
+
+def test_memory_store_is_bounded():
+    store = InMemoryExplanationStore(max_entries=2)
+    store.save_many([{"id": str(i), "status": "ready"} for i in range(3)])
+    assert store.get("0") is None and store.get("2")["status"] == "ready"
+
+def test_database_store_uses_trade_prediction_details():
+    Base.metadata.create_all(bind=engine)
+    store = DatabaseExplanationStore(SessionLocal)
+    record = {**SAFE_TRADE, "Currency": "EUR", "Trade_ID": "TRD-DB-1"}
+    explanation = fake_explain([{"x": 0.25}])[0]
+    entry = {"record": record, "failure_probability": 0.02, "status": "ready", "shap_explanation": explanation}
+    # Explained before the write-behind writer flushed the trade, and an anonymous trade: no rows created
+    store.save_many([{**entry, "id": "TRD-DB-1"}, {**entry, "id": "anon-1", "record": SAFE_TRADE}])
+    assert trade_ids() & {"TRD-DB-1", "anon-1"} == set()
+    assert store.get("TRD-DB-1")["status"] == store.get("anon-1")["status"] == "ready"
+
+    # Once the trade row exists, the explanation is merged into its prediction_details
+    with engine.begin() as connection:
+        upsert_trades(connection, [trade_row("TRD-DB-1", record, 0.02, {"risk_level": "LOW"})])
+    assert store.get("TRD-DB-1")["status"] == "ready"
+    db = SessionLocal()
+    try:
+        trade = db.query(Trade).filter(Trade.trade_id == "TRD-DB-1").one()
+        assert trade.currency == "EUR" and trade.risk_score == 0.02
+        assert trade.prediction_details["shap_explanation"] == explanation
+        assert trade.prediction_details["risk_level"] == "LOW"
+    finally:
+        db.close()
+    assert store.get("TRD-DB-1")["shap_explanation"] == explanation and "anon-1" not in trade_ids()
+
+def test_predict_deferred_explanation(loaded_client):
+    body = loaded_client.post("/predict?explain=deferred", json={**SAMPLE_TRADE, "Trade_ID": "TRD-DEFER-1"}).json()
+    assert body["explanation_id"] == "TRD-DEFER-1" and body["explanation_status"] == "pending"
+    assert body["shap_explanation"]["feature_contributions"] == []
+
+    def ready():
+        return loaded_client.get("/explanations/TRD-DEFER-1").json()["status"] == "ready"
+    assert wait_for(ready)
+    explanation = loaded_client.get("/explanations/TRD-DEFER-1").json()
+    assert len(explanation["shap_explanation"]["feature_contributions"]) == 11
+    assert abs(explanation["failure_probability"] - body["failure_probability"]) < 1e-4
+
+def test_anonymous_deferred_explanation_is_not_persisted(loaded_client):
+    loaded_client.post("/persistence/flush")  # earlier tests' write-behind rows
+    before = trade_ids()
+    body = loaded_client.post("/predict?explain=deferred", json=SAMPLE_TRADE).json()
+    assert body["explanation_status"] == "pending"
+    assert wait_for(lambda: loaded_client.get(f"/explanations/{body['trade_id']}").json()["status"] == "ready")
+    loaded_client.post("/persistence/flush")
+    assert trade_ids() == before
+
+def test_unknown_explanation_is_404(loaded_client):
+    assert loaded_client.get("/explanations/does-not-exist").status_code == 404
@@ -0,0 +1,65 @@
+import os
+import joblib
+import numpy as np
+import pytest
+
+from app.ml_runtime import FastPathPredictor
+
+pytest.importorskip("faker")  # data_generator dependency (ml_service/requirements.txt)
+from data_generator import generate_market_data  # noqa: E402  (on sys.path via app.ml_runtime)
+
+PARITY_TOLERANCE = 1e-6
+
+@pytest.fixture(scope="module")
+def pipeline():
+    return joblib.load(os.environ["MODEL_PATH"])
+
+@pytest.fixture(scope="module")
+def dataset():
+    return generate_market_data(3000)
+
+def test_fast_path_batch_parity(pipeline, dataset):
+    fast_path = FastPathPredictor.from_pipeline(pipeline)
+    expected = pipeline.predict_proba(dataset)[:, 1]
+    actual = fast_path.predict_proba(fast_path.encode_frame(dataset))
+    assert np.max(np.abs(actual - expected)) < PARITY_TOLERANCE
+
+def test_fast_path_single_row_parity(pipeline, dataset):
+    fast_path = FastPathPredictor.from_pipeline(pipeline)
+    expected = pipeline.predict_proba(dataset)[:, 1]
+    records = dataset.to_dict(orient="records")
+    for i in range(0, len(records), 97):
+        assert abs(fast_path.predict_one(records[i]) - expected[i]) < PARITY_TOLERANCE
+
+def test_fast_path_unknown_category_matches_ignore(pipeline, dataset):
+    fast_path = FastPathPredictor.from_pipeline(pipeline)
+    row = dataset.iloc[[0]].copy()
+    row["Currency"] = "CHF"  # never seen in training -> all-zero one-hot block
+    expected = pipeline.predict_proba(row)[0, 1]
+    assert abs(fast_path.predict_one(row.iloc[0].to_dict()) - expected) < PARITY_TOLERANCE
+
+def test_fast_path_dictionary_encoded_columns(pipeline, dataset):
+    # (codes, categories) pairs encode exactly like the labels, unknown categories included
+    fast_path = FastPathPredictor.from_pipeline(pipeline)
+    frame = dataset.copy()
+    frame.loc[frame.index[:10], "Currency"] = "CHF"
+    coded = {}
+    for name in fast_path.categorical_names:
+        categorical = frame[name].astype("category")
+        coded[name] = (categorical.cat.codes.to_numpy(), list(categorical.cat.categories))
+    expected = fast_path.encode_frame(frame)
+    np.testing.assert_array_equal(fast_path.encode_columns(frame, len(frame), coded=coded), expected)
+
+def test_fast_path_variant_deltas_match_full_encoding(pipeline, dataset):
+    # Each delta row is bit-identical to encoding the perturbed trade from scratch
+    fast_path = FastPathPredictor.from_pipeline(pipeline)
+    base = dataset.iloc[0].to_dict()
+    variants = [
+        {"SSI_Status": "Match"},
+        {"Custodian_Location": "APAC", "Currency": "CHF"},  # CHF: unknown -> empty block
+        {"Notional_Amount_USD": base["Notional_Amount_USD"] / 2},
+        {"Trade_Day": "Monday", "Trade_Hour": 9.0},
+    ]
+    X = fast_path.encode_variants(base, variants)
+    expected = fast_path.encode_records([base] + [{**base, **changes} for changes in variants])
+    np.testing.assert_array_equal(X, expected)
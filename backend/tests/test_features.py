@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+import app.ml_runtime  # noqa: F401  (puts ml_service/ on sys.path)
+import features  # noqa: E402
+from app.services import columnar_codec as codec
+from tests.conftest import SAMPLE_TRADE, SAFE_TRADE
+
+def test_settlement_skips_weekends_and_each_currencys_holidays():
+    calendar = features.default_calendar()
+    trade_dates = np.array(["2025-07-03", "2025-07-03", "2025-04-17", "2025-12-24", "2025-12-24", "2025-03-14"],
+                           dtype="datetime64[D]")
+    currencies = ["USD", "EUR", "EUR", "GBP", "CHF", "JPY"]
+    # Independence Day; plain T+2; Good Friday + Easter Monday; Christmas + Boxing Day; weekends only; Fri -> Tue
+    assert calendar.settlement_dates(trade_dates, currencies).tolist() == [
+        "2025-07-08", "2025-07-07", "2025-04-23", "2025-12-30", "2025-12-26", "2025-03-18"]
+    # Vectorized lookups agree with the scalar path, for every currency and a span of days
+    days = np.datetime64("2025-12-01") + np.arange(60)
+    for currency in ["USD", "EUR", "GBP", "JPY", "CAD", "CHF"]:
+        batch = features.derive_trade_features(days, [currency] * len(days))
+        one = [features.derive_one(str(d), currency)["Settlement_Date"] for d in days]
+        assert batch["Settlement_Date"].tolist() == one
+        settled = calendar.day_numbers(batch["Settlement_Date"].astype("datetime64[D]"))
+        assert calendar.is_business_day(settled, calendar.currency_codes([currency] * len(days))).all()
+
+def test_usd_new_year_and_juneteenth_rules():
+    calendar = features.default_calendar()
+    days = np.array(["2021-12-31", "2022-12-30", "2023-01-02", "2021-06-18", "2022-06-20", "2023-06-19"],
+                    dtype="datetime64[D]")
+    open_ = calendar.is_business_day(calendar.day_numbers(days), calendar.currency_codes(["USD"] * len(days)))
+    # Saturday New Year's Day (2022) is not moved to Friday Dec 31; Sunday's (2023) moves to Monday.
+    # Juneteenth only from 2022 (2021's fell on a Saturday, no Friday closure either)
+    assert open_.tolist() == [True, True, False, True, False, False]
+    assert features.derive_one("2021-12-30", "USD")["Settlement_Date"] == "2022-01-03"
+
+def test_timestamps_parse_once_per_batch_with_per_value_fallback():
+    derived = features.derive_trade_features(
+        ["2025-03-14 16:30:00", "2025-03-14T09:05:00+01:00", "not a date", "1990-01-01", None])
+    assert derived["Trade_Day"][:2].tolist() == ["Friday", "Friday"]
+    assert derived["Trade_Hour"][:2].tolist() == [16, 9]  # booked wall-clock time, offset not applied
+    assert derived["invalid"].tolist() == [False, False, True, True, True]
+    assert features.derive_one("2025-03-15T10:00:00Z") == {"Trade_Day": "Saturday", "Trade_Hour": 10}
+    with pytest.raises(ValueError):
+        features.derive_one("2025-13-01")
+
+def test_z_suffixed_timestamps_parse_on_every_python():
+    # JS toISOString() output; Python 3.10's fromisoformat rejects the Z itself
+    stamps = ["2025-03-14T16:30:00.000Z", "2025-03-15T10:00:00z", "2025-03-14T09:05:00"]
+    assert features.derive_one(stamps[0]) == {"Trade_Day": "Friday", "Trade_Hour": 16}
+    derived = features.derive_trade_features(stamps, ["USD"] * 3)
+    assert not derived["invalid"].any()
+    assert derived["Trade_Day"].tolist() == ["Friday", "Saturday", "Friday"]
+    assert derived["Trade_Hour"].tolist() == [16, 10, 9]
+    assert derived["Settlement_Date"].tolist()[0] == "2025-03-18"
+    parsed = features.parse_timestamps(np.array([s.encode() for s in stamps]))
+    assert parsed.astype(str).tolist() == ["2025-03-14T16:30:00", "2025-03-15T10:00:00", "2025-03-14T09:05:00"]
+
+def test_generator_and_trainer_use_the_shared_derivation(tmp_path):
+    pytest.importorskip("faker")
+    import data_generator
+    import train_model
+    df = data_generator.generate_market_data(3000, seed=5)
+    derived = features.derive_trade_features(df["Trade_Date"].to_numpy(), df["Currency"].to_numpy())
+    assert not derived["invalid"].any()
+    for column in ("Trade_Day", "Trade_Hour", "Settlement_Date"):
+        np.testing.assert_array_equal(df[column].to_numpy(), derived[column])
+
+    # A raw export with timestamps only trains on the same features
+    df.drop(columns=["Trade_Day", "Trade_Hour"]).to_csv(tmp_path / "raw.csv", index=False)
+    columns = train_model.NUMERIC_FEATURES + train_model.CATEGORICAL_FEATURES + [train_model.TARGET]
+    loaded = train_model.read_training_data(str(tmp_path / "raw.csv"), columns)
+    assert list(loaded.columns) == columns
+    np.testing.assert_array_equal(loaded["Trade_Day"].to_numpy(), df["Trade_Day"].to_numpy())
+
+def test_api_derives_trade_time_from_the_booking_timestamp(loaded_client):
+    # Friday 16:45 non-USD trade: the timestamp alone must trigger the same score as the explicit fields
+    stamped = {**SAMPLE_TRADE, "SSI_Status": "Match", "Currency": "EUR", "Trade_Date": "2025-03-14T16:45:00"}
+    explicit = {**stamped, "Trade_Date": None, "Trade_Day": "Friday", "Trade_Hour": 16}
+    predict = lambda trade: loaded_client.post("/predict", params={"explain": "none"}, json=trade).json()
+    assert predict(stamped)["failure_probability"] == predict(explicit)["failure_probability"]
+    assert loaded_client.post("/predict", json={**stamped, "Trade_Date": "soon"}).status_code == 422
+
+    trades = [{**stamped, "Trade_ID": "FEAT-1"}, {**SAFE_TRADE, "Trade_Date": "yesterday"}, explicit]
+    body = loaded_client.post("/predict/batch", json={"trades": trades}).json()
+    assert body["scored"] == 2 and body["results"][1]["error"].startswith("Trade_Date")
+    assert body["results"][0]["failure_probability"] == body["results"][2]["failure_probability"]
+    # Settlement date derived as T+2 business days (Fri -> Tue) and booked
+    exposure = loaded_client.get("/book/exposure", params={"by": "settlement_date", "key": "2025-03-18"}).json()
+    assert exposure["groups"] and exposure["groups"][0]["trades"] >= 1
+
+    columns = {
+        "Notional_Amount_USD": {"kind": "numeric", "values": np.array([t["Notional_Amount_USD"] for t in (stamped, explicit)])},
+        "Market_Volatility_Index": {"kind": "numeric", "values": np.array([18.5, 18.5])},
+        "Currency": {"kind": "string", "values": np.array([b"EUR", b"EUR"])},
+        "Trade_Date": {"kind": "string", "values": np.array([b"2025-03-14T16:45:00", b"2025-03-14T16:45:00"])},
+    }
+    for name in ("Asset_Class", "Counterparty_Rating", "SSI_Status", "Liquidity_Score"):
+        columns[name] = {"kind": "string", "values": np.array([stamped[name].encode()] * 2)}
+    response = loaded_client.post("/predict/columnar", content=codec.encode_batch(columns, 2),
+                                  headers={"content-type": codec.MEDIA_TYPE})
+    probs = codec.decode_batch(response.content)["columns"]["failure_probability"]["values"]
+    assert abs(float(probs[0]) - body["results"][0]["failure_probability"]) < 1e-3
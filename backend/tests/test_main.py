@@ -1,5 +1,6 @@
 from fastapi.testclient import TestClient
 from app.main import app
+from tests.conftest import SAMPLE_TRADE, SAFE_TRADE
 
 client = TestClient(app)
 
@@ -8,3 +9,45 @@ def test_health_check():
     assert response.status_code == 200
     assert response.json()["service"] == "api-gateway"
     # Note: Status might be "no_model" in CI environment if artifacts aren't present
+
+def test_predict_batch_matches_single(loaded_client):
+    response = loaded_client.post("/predict/batch", json={"trades": [SAMPLE_TRADE, SAFE_TRADE]})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["scored"] == 2 and body["failed"] == 0
+
+    for trade, item in zip([SAMPLE_TRADE, SAFE_TRADE], body["results"]):
+        single = loaded_client.post("/predict", json=trade).json()
+        assert item["failure_probability"] == single["failure_probability"]
+        assert item["risk_level"] == single["risk_level"]
+
+def test_predict_batch_reports_row_errors(loaded_client):
+    bad_trade = {"Notional_Amount_USD": "lots", "Asset_Class": "Equity"}
+    response = loaded_client.post("/predict/batch", json={"trades": [SAFE_TRADE, bad_trade, SAMPLE_TRADE]})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["scored"] == 2 and body["failed"] == 1
+    assert [r["index"] for r in body["results"]] == [0, 1, 2]
+    assert body["results"][1]["error"] and body["results"][1]["failure_probability"] is None
+    assert body["results"][2]["risk_level"] == "CRITICAL"
+
+def test_predict_batch_rejects_oversized(loaded_client, monkeypatch):
+    monkeypatch.setattr("app.main.MAX_BATCH_SIZE", 1)
+    response = loaded_client.post("/predict/batch", json={"trades": [SAFE_TRADE, SAFE_TRADE]})
+    assert response.status_code == 413
+
+def test_micro_batcher_reports_batch_sizes(loaded_client):
+    # Fresh profile so the prediction cache does not answer it
+    loaded_client.post("/predict", json={**SAFE_TRADE, "Notional_Amount_USD": 123457.0})
+    stats = loaded_client.get("/predict/batcher").json()
+    assert stats["enabled"] is True
+    assert stats["requests"] >= 1 and stats["batches"] >= 1
+
+def test_predict_returns_named_explanation(loaded_client):
+    explanation = loaded_client.post("/predict", json=SAMPLE_TRADE).json()["shap_explanation"]
+    assert len(explanation["feature_names"]) == len(explanation["feature_contributions"]) == 11
+
+def test_predict_batch_explain(loaded_client):
+    body = loaded_client.post("/predict/batch", json={"trades": [SAMPLE_TRADE, {"bad": 1}], "explain": True}).json()
+    assert len(body["results"][0]["shap_explanation"]["feature_contributions"]) == 11
+    assert body["results"][1]["shap_explanation"] is None
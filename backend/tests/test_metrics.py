@@ -0,0 +1,44 @@
+import app.ml_runtime  # noqa: F401  (puts ml_service on sys.path)
+from metrics import Metrics
+
+from tests.conftest import SAMPLE_TRADE
+
+def test_histogram_renders_cumulative_prometheus_buckets():
+    m = Metrics("test")
+    m.histogram("size", "Rows per call", (1, 10, 100))
+    m.counter("errors_total", "Errors")
+    for value in (1, 5, 50, 500):
+        m.observe("size", value, endpoint="batch")
+    m.inc("errors_total", 3, stage='say "hi"')
+    lines = m.render().splitlines()
+    assert "# TYPE test_size histogram" in lines
+    assert 'test_size_bucket{endpoint="batch",le="1.0"} 1' in lines
+    assert 'test_size_bucket{endpoint="batch",le="100.0"} 3' in lines
+    assert 'test_size_bucket{endpoint="batch",le="+Inf"} 4' in lines
+    assert 'test_size_sum{endpoint="batch"} 556.0' in lines
+    assert 'test_size_count{endpoint="batch"} 4' in lines
+    assert 'test_errors_total{stage="say \\"hi\\""} 3' in lines
+
+def test_sampling_off_skips_timers_but_not_counters():
+    m = Metrics("test", sample_rate=0.0)
+    m.counter("trades_total", "Trades")
+    with m.stage("encode"):
+        m.inc("trades_total")
+    text = m.render()
+    assert "stage_seconds" not in text
+    assert "test_trades_total 1" in text
+
+def test_metrics_endpoint_and_timing_header(loaded_client):
+    response = loaded_client.post("/predict", json={**SAMPLE_TRADE, "Notional_Amount_USD": 4321.0},
+                                  headers={"X-Debug-Timing": "1"})
+    assert response.status_code == 200
+    stages = [part.split(";")[0] for part in response.headers["server-timing"].split(", ")]
+    assert stages[0] == "validate" and stages[-1] == "total"
+    assert {"score", "explain"} <= set(stages)
+    # No header unless asked for
+    assert "server-timing" not in loaded_client.post("/predict", json=SAMPLE_TRADE).headers
+
+    text = loaded_client.get("/metrics").text
+    assert 'settlement_http_requests_total{method="POST",route="/predict",status="200"}' in text
+    assert 'settlement_stage_seconds_count{stage="explain"}' in text
+    assert 'settlement_trades_scored_total{endpoint="predict"}' in text
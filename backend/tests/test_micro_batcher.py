@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+
+from app.services.micro_batcher import MicroBatcher
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_concurrent_requests_are_coalesced():
+    seen_batches = []
+
+    def score(records):
+        seen_batches.append(len(records))
+        return [r["x"] * 2 for r in records]
+
+    async def scenario():
+        batcher = MicroBatcher(score, max_batch_size=16, max_wait_ms=20)
+        await batcher.start()
+        try:
+            results = await asyncio.gather(*(batcher.submit({"x": i}) for i in range(40)))
+        finally:
+            await batcher.stop()
+        return results, batcher.stats()
+
+    results, stats = run(scenario())
+    assert results == [i * 2.0 for i in range(40)]
+    assert max(seen_batches) == 16
+    assert stats["requests"] == 40 and stats["batches"] == len(seen_batches) < 40
+
+def test_bad_row_does_not_fail_neighbours():
+    def score(records):
+        if any(r["x"] < 0 for r in records):
+            raise ValueError("negative notional")
+        return [float(r["x"]) for r in records]
+
+    async def scenario():
+        batcher = MicroBatcher(score, max_batch_size=8, max_wait_ms=20)
+        await batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.submit({"x": x}) for x in [1, -1, 3]), return_exceptions=True)
+        finally:
+            await batcher.stop()
+
+    ok, bad, ok2 = run(scenario())
+    assert ok == 1.0 and ok2 == 3.0
+    assert isinstance(bad, ValueError)
+
+def test_submit_requires_running_batcher():
+    with pytest.raises(RuntimeError):
+        run(MicroBatcher(lambda r: r).submit({"x": 1}))
+
+def test_batches_never_mix_keys():
+    seen = []
+
+    def score(records, key):
+        seen.append((key["name"], [r["x"] for r in records]))
+        return [r["x"] * key["factor"] for r in records]
+
+    old, new = {"name": "old", "factor": 2}, {"name": "new", "factor": 3}
+
+    async def scenario():
+        batcher = MicroBatcher(score, max_batch_size=16, max_wait_ms=20)
+        await batcher.start()
+        try:
+            # Requests admitted before and after a model swap, interleaved in the queue
+            keys = [old, old, new, old, new, new]
+            return await asyncio.gather(*(batcher.submit({"x": i}, key) for i, key in enumerate(keys)))
+        finally:
+            await batcher.stop()
+
+    assert run(scenario()) == [0, 2, 6, 6, 12, 15]
+    assert seen == [("old", [0, 1]), ("new", [2]), ("old", [3]), ("new", [4, 5])]
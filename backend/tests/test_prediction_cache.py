@@ -0,0 +1,45 @@
+from app.services.prediction_cache import PredictionCache
+from tests.conftest import SAFE_TRADE
+
+RECORD = {**SAFE_TRADE, "Custodian_Location": "US", "Operation_Type": "DVP", "Currency": "USD",
+          "Trade_Day": "Monday", "Trade_Hour": 12.0, "Trade_ID": "A"}
+
+def test_key_ignores_identifiers_and_can_round():
+    cache = PredictionCache(notional_step=1000, volatility_step=0.5)
+    other = {**RECORD, "Trade_ID": "B", "Notional_Amount_USD": 250321.0, "Market_Volatility_Index": 12.2}
+    assert cache.key(RECORD) == cache.key(other)
+    assert cache.key(RECORD) != cache.key({**RECORD, "SSI_Status": "Mismatch"})
+    assert PredictionCache().key(RECORD) != PredictionCache().key(other)
+
+def test_lru_eviction_and_counters():
+    cache = PredictionCache(max_entries=2)
+    for n in (1.0, 2.0, 3.0):
+        cache.put(cache.key({**RECORD, "Notional_Amount_USD": n}), "v1", n / 10)
+    assert cache.get(cache.key({**RECORD, "Notional_Amount_USD": 1.0}), "v1") is None
+    assert cache.get(cache.key({**RECORD, "Notional_Amount_USD": 3.0}), "v1") == (0.3, None)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["size"]) == (1, 1, 1, 2)
+
+def test_ttl_expiry():
+    cache = PredictionCache(ttl_seconds=0)
+    cache.put(cache.key(RECORD), "v1", 0.5)
+    assert cache.get(cache.key(RECORD), "v1") is None
+    assert cache.stats()["expirations"] == 1
+
+def test_model_version_change_invalidates():
+    cache = PredictionCache(model_version="v1")
+    key = cache.key(RECORD)
+    cache.put(key, "v1", 0.5, {"feature_contributions": [1.0]})
+    assert cache.get(key, "v1") == (0.5, {"feature_contributions": [1.0]})
+    assert cache.get(key, "v2") is None
+    assert cache.stats()["invalidations"] == 1 and cache.stats()["model_version"] == "v2"
+
+def test_endpoint_counts_hits(loaded_client):
+    trade = {**SAFE_TRADE, "Notional_Amount_USD": 777777.0}
+    before = loaded_client.get("/cache/stats").json()
+    first = loaded_client.post("/predict", json=trade).json()
+    second = loaded_client.post("/predict", json={**trade, "Trade_ID": "other"}).json()
+    after = loaded_client.get("/cache/stats").json()
+    assert first["failure_probability"] == second["failure_probability"]
+    assert first["shap_explanation"] == second["shap_explanation"]
+    assert after["hits"] == before["hits"] + 1 and after["misses"] == before["misses"] + 1
@@ -0,0 +1,43 @@
+from tests.conftest import SAMPLE_TRADE, SAFE_TRADE
+
+def predict(client, trade):
+    return client.post("/predict", params={"explain": "none"}, json=trade).json()["failure_probability"]
+
+def test_simulate_ranks_explicit_perturbations(loaded_client):
+    perturbations = [
+        {"name": "split_notional", "changes": {"Notional_Amount_USD": SAMPLE_TRADE["Notional_Amount_USD"] / 2}},
+        {"name": "fix_ssi", "changes": {"SSI_Status": "Match"}},
+        {"name": "monday_morning", "changes": {"Trade_Day": "Monday", "Trade_Hour": 9}},
+    ]
+    response = loaded_client.post("/simulate", json={"trade": SAMPLE_TRADE, "perturbations": perturbations})
+    assert response.status_code == 200
+    body = response.json()
+    variants = body["variants"]
+    assert [v["rank"] for v in variants] == [1, 2, 3]
+    reductions = [v["risk_reduction"] for v in variants]
+    assert reductions == sorted(reductions, reverse=True)
+    assert variants[0]["name"] == "fix_ssi" and variants[0]["risk_reduction"] > 0
+    assert all(v["shap_explanation"] is None for v in variants)
+
+def test_simulate_matches_scoring_each_variant(loaded_client):
+    trade = {**SAMPLE_TRADE, "Custodian_Location": "EU", "Trade_Day": "Friday", "Trade_Hour": 16.5}
+    body = loaded_client.post("/simulate", json={"trade": trade, "explain": True}).json()
+    assert abs(body["failure_probability"] - predict(loaded_client, trade)) < 1e-3
+    names = {v["name"] for v in body["variants"]}
+    # Default menu, minus the no-op switch to the trade's own custodian
+    assert names == {"fix_ssi", "switch_custodian_APAC", "switch_custodian_US", "split_notional", "monday_morning"}
+    for variant in body["variants"]:
+        expected = predict(loaded_client, {**trade, **variant["changes"]})
+        assert abs(variant["failure_probability"] - expected) < 1e-3
+        assert abs(variant["risk_reduction"] - (body["failure_probability"] - variant["failure_probability"])) < 1e-3
+        assert len(variant["shap_explanation"]["feature_contributions"]) == 11
+    assert body["shap_explanation"]["base_value"] is not None
+
+def test_simulate_rejects_invalid_perturbations(loaded_client):
+    response = loaded_client.post("/simulate", json={"trade": SAFE_TRADE, "perturbations": [
+        {"name": "typo", "changes": {"SSI": "Match"}},
+        {"name": "bad_notional", "changes": {"Notional_Amount_USD": "a lot"}},
+    ]})
+    assert response.status_code == 422
+    detail = response.json()["detail"]
+    assert detail[0].startswith("typo: unknown fields") and detail[1].startswith("bad_notional:")
@@ -0,0 +1,72 @@
+import asyncio
+import json
+import pytest
+
+from app.services.stream_ingest import StreamHub, StreamSession
+from tests.conftest import SAMPLE_TRADE, SAFE_TRADE
+
+def test_stream_ingest_websocket_with_fan_out(loaded_client):
+    trades = [{**SAMPLE_TRADE, "Trade_ID": "WS-1"}, {**SAFE_TRADE, "Trade_ID": "WS-2"}, {"Trade_ID": "WS-3"}]
+    with loaded_client.websocket_connect("/stream/subscribe") as dashboard_a, \
+            loaded_client.websocket_connect("/stream/subscribe") as dashboard_b:
+        with loaded_client.websocket_connect("/stream/trades") as ingest:
+            ingest.send_text(json.dumps(trades[:2]))
+            ingest.send_text(json.dumps(trades[2]))
+            ingest.send_text("not json")
+            results = []
+            while len(results) < 4:
+                results.extend(ingest.receive_json()["results"])
+
+        assert [r["seq"] for r in results] == [0, 1, 2, 3]
+        assert results[0]["trade_id"] == "WS-1" and results[0]["risk_level"] in ("HIGH", "CRITICAL")
+        assert results[1]["risk_level"] == "LOW" and results[1]["model_version"]
+        assert "Notional_Amount_USD" in results[2]["error"]
+        assert results[3]["error"].startswith("Invalid JSON")
+
+        # Both dashboards see the same scored trades (errors are not published)
+        for dashboard in (dashboard_a, dashboard_b):
+            published = dashboard.receive_json()["results"]
+            while len(published) < 2:
+                published.extend(dashboard.receive_json()["results"])
+            assert published == results[:2]
+
+    stats = loaded_client.get("/stream/stats").json()
+    assert stats["trades"] >= 4 and stats["errors"] >= 2 and stats["active_sessions"] == 0
+
+def test_stream_ingest_ndjson(loaded_client):
+    lines = [json.dumps({**SAMPLE_TRADE, "Trade_ID": f"N-{i}"}) for i in range(300)]
+    response = loaded_client.post("/stream/trades", content="\n".join(lines) + "\n",
+                                  headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["trade_id"] for r in results] == [f"N-{i}" for i in range(300)]
+    assert len({r["failure_probability"] for r in results}) == 1
+
+def test_stream_session_flow_control():
+    # The reader never runs more than max_in_flight trades ahead of the results sent back
+    async def scenario():
+        hub = StreamHub(max_queue=2)
+        slow_dashboard = hub.subscribe()
+        pending = list(range(50))
+        in_flight = []
+
+        async def receive():
+            await asyncio.sleep(0)
+            return [{"i": pending.pop(0)}] if pending else None
+
+        async def send(results):
+            in_flight.append(session.received - session.sent)
+            await asyncio.sleep(0.001)
+
+        async def score_batch(records):
+            return [{"failure_probability": 0.1} for _ in records]
+
+        session = StreamSession(lambda raw: (raw, None), score_batch, hub,
+                                max_batch_size=4, max_wait_ms=1, max_in_flight=8)
+        await session.run(receive, send)
+        return session, hub, slow_dashboard, in_flight
+
+    session, hub, slow_dashboard, in_flight = asyncio.run(scenario())
+    assert session.sent == 50 and max(in_flight) <= 8
+    # The dashboard that never reads keeps only the newest batches
+    assert slow_dashboard.qsize() == 2 and hub.dropped == hub.published - 2
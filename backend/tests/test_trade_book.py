@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.models import Base
+from app.services.trade_book import TradeBook
+from app.services.trade_writer import TradeWriter, trade_row
+from tests.conftest import SAMPLE_TRADE, SAFE_TRADE
+
+def row(trade_id, prob, notional, counterparty="BANK-A", currency="USD", settlement="2024-03-15"):
+    record = {**SAFE_TRADE, "Notional_Amount_USD": notional, "Currency": currency,
+              "Counterparty": counterparty, "Settlement_Date": settlement}
+    return trade_row(trade_id, record, prob, {"risk_level": "HIGH" if prob > 0.5 else "LOW", "inputs": record})
+
+def test_top_and_exposure_follow_rescoring():
+    book = TradeBook()
+    book.upsert_many([row("T1", 0.9, 1e6), row("T2", 0.2, 5e6, "BANK-B"), row("T3", 0.6, 2e6, currency="EUR")])
+    assert [t["trade_id"] for t in book.top(2)] == ["T1", "T3"]
+    assert [t["trade_id"] for t in book.top(10, min_probability=0.5)] == ["T1", "T3"]
+
+    bank_a = book.exposure("counterparty", "BANK-A")[0]
+    assert bank_a["trades"] == 2 and bank_a["notional_at_risk"] == pytest.approx(0.9e6 + 1.2e6)
+    assert bank_a["high_risk_trades"] == 2 and bank_a["high_risk_notional"] == pytest.approx(3e6)
+    assert [g["counterparty"] for g in book.exposure("counterparty")] == ["BANK-A", "BANK-B"]
+
+    # Re-scoring moves the trade in the index and backs its old contribution out of the aggregates
+    book.upsert_many([row("T1", 0.05, 1e6, "BANK-B")])
+    assert [t["trade_id"] for t in book.top(1)] == ["T3"]
+    assert book.exposure("counterparty", "BANK-A")[0]["notional_at_risk"] == pytest.approx(1.2e6)
+    assert book.exposure("counterparty", "BANK-B")[0]["trades"] == 2
+    assert book.exposure("currency", limit=1)[0]["currency"] == "EUR"
+
+    assert book.remove("T3") and book.exposure("currency", "EUR") == []
+    assert book.stats()["trades"] == 2 and book.stats()["groups"]["settlement_date"] == 1
+
+def test_rebuild_from_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/book.db")
+    Base.metadata.create_all(engine)
+    writer = TradeWriter(engine, overflow="drop")
+    writer.submit([row(f"T{i}", i / 100, 1e5 * (i + 1), f"BANK-{i % 3}") for i in range(100)])
+    writer.submit([{**row("CLOSED", 0.99, 1e9), "status": "SETTLED"}])
+    assert writer.flush()
+
+    book = TradeBook()
+    assert book.rebuild(sessionmaker(bind=engine), chunk_size=30) == 100
+    assert book.top(1)[0]["trade_id"] == "T99" and book.top(1)[0]["settlement_date"] == "2024-03-15"
+    assert sum(g["trades"] for g in book.exposure("counterparty")) == 100
+
+def test_book_endpoints(loaded_client):
+    trades = [
+        {**SAMPLE_TRADE, "Trade_ID": "BOOK-1", "Counterparty": "Risky Bank Intl", "Settlement_Date": "2024-03-15"},
+        {**SAFE_TRADE, "Trade_ID": "BOOK-2", "Counterparty": "Goldman Sachs", "Settlement_Date": "2024-03-15"},
+    ]
+    loaded_client.post("/predict/batch", json={"trades": trades})
+    top = loaded_client.get("/book/top", params={"n": 1}).json()["trades"]
+    assert len(top) == 1 and top[0]["failure_probability"] >= 0.5
+
+    groups = loaded_client.get("/book/exposure", params={"by": "counterparty", "key": "Risky Bank Intl"}).json()["groups"]
+    assert groups[0]["trades"] == 1 and groups[0]["high_risk_trades"] == 1
+    dates = loaded_client.get("/book/exposure", params={"by": "settlement_date", "limit": 5}).json()["groups"]
+    assert "2024-03-15" in [g["settlement_date"] for g in dates]
+    assert loaded_client.get("/book/exposure", params={"by": "isin"}).status_code == 422
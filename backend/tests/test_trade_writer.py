@@ -0,0 +1,132 @@
+import json
+import os
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.db.models import Base
+from app.services.trade_writer import TradeWriter, copy_upsert_trades, trade_row
+from tests.conftest import SAMPLE_TRADE, SAFE_TRADE
+
+RECORD = {**SAFE_TRADE, "Currency": "EUR"}
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/trades.db")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+def stored(engine):
+    with engine.connect() as c:
+        return {row.trade_id: row for row in c.execute(text("SELECT * FROM trades"))}
+
+def rows(n, prob=0.1, prefix="T"):
+    return [trade_row(f"{prefix}{i}", RECORD, prob, {"risk_level": "LOW"}) for i in range(n)]
+
+def test_size_and_time_triggers_flush_in_bulk(engine):
+    writer = TradeWriter(engine, batch_size=50, flush_interval_ms=50, overflow="drop")
+    writer.start()
+    try:
+        writer.submit(rows(120))
+        writer.submit(rows(1, prob=0.9))  # rescored before the flush: written once, latest score
+        deadline = time.time() + 5
+        while len(stored(engine)) < 120 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        writer.stop()
+    trades = stored(engine)
+    assert len(trades) == 120 and trades["T0"].risk_score == 0.9 and trades["T5"].currency == "EUR"
+    assert writer.stats()["written"] <= 121 and writer.stats()["buffered"] == 0
+
+def test_stop_flushes_buffer(engine):
+    writer = TradeWriter(engine, batch_size=1000, flush_interval_ms=60_000, overflow="drop")
+    writer.start()
+    writer.submit(rows(10))
+    assert stored(engine) == {}
+    writer.stop()
+    assert len(stored(engine)) == 10
+
+def test_overflow_spills_and_replays(engine, tmp_path):
+    spill = str(tmp_path / "spill.ndjson")
+    writer = TradeWriter(engine, batch_size=5, max_buffer=5, overflow="spill", spill_path=spill)
+    assert writer.submit(rows(8)) == 5
+    assert os.path.exists(spill) and writer.stats()["spilled"] == 3
+    assert writer.flush()
+    assert len(stored(engine)) == 8 and not os.path.exists(spill)
+
+    dropping = TradeWriter(engine, batch_size=5, max_buffer=5, overflow="drop")
+    assert dropping.submit(rows(8, prefix="D")) == 5 and dropping.stats()["dropped"] == 3
+
+def test_failed_flush_keeps_rows_for_retry(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/empty.db")  # no trades table yet
+    writer = TradeWriter(engine, batch_size=10, overflow="drop")
+    writer.submit(rows(3))
+    assert not writer.flush()
+    assert writer.stats()["buffered"] == 3 and writer.stats()["failures"] == 1
+    Base.metadata.create_all(engine)
+    assert writer.flush() and len(stored(engine)) == 3
+
+def test_rescoring_keeps_closed_trades_closed(engine):
+    writer = TradeWriter(engine, overflow="drop")
+    writer.submit([{**row, "status": status} for row, status in zip(rows(3), ("SETTLED", "FAILED", "PENDING"))])
+    assert writer.flush()
+    writer.submit(rows(3, prob=0.7))  # re-scored: default status SCORED
+    assert writer.flush()
+    trades = stored(engine)
+    assert [trades[f"T{i}"].status for i in range(3)] == ["SETTLED", "FAILED", "SCORED"]
+    assert all(trades[f"T{i}"].risk_score == 0.7 for i in range(3))
+
+def test_copy_falls_back_to_upserts_without_copy_expert(engine):
+    # sqlite3 cursors (like psycopg 3's) have no copy_expert: the rows are upserted instead
+    copy_upsert_trades(engine, rows(3))
+    copy_upsert_trades(engine, [{**row, "prediction_details": {"shap": 1}} for row in rows(2, prob=0.6)])
+    trades = stored(engine)
+    assert len(trades) == 3 and trades["T0"].risk_score == 0.6 and trades["T2"].risk_score == 0.1
+    assert json.loads(trades["T0"].prediction_details) == {"risk_level": "LOW", "shap": 1}
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="set TEST_POSTGRES_URL to a PostgreSQL database")
+def test_copy_upsert_on_postgres():
+    pytest.importorskip("psycopg2")
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"].replace("postgresql+psycopg://", "postgresql://"))
+    assert engine.dialect.driver == "psycopg2"  # the COPY path, not the fallback
+    Base.metadata.create_all(engine)
+    try:
+        copy_upsert_trades(engine, [{**row, "status": status} for row, status in zip(rows(2, prefix="PG-COPY-"), ("SETTLED", "PENDING"))])
+        copy_upsert_trades(engine, [{**row, "prediction_details": {"shap": 1}} for row in rows(2, prob=0.7, prefix="PG-COPY-")])
+        with engine.connect() as c:
+            trades = {r.trade_id: r for r in c.execute(text("SELECT * FROM trades WHERE trade_id LIKE 'PG-COPY-%'"))}
+        assert [trades[f"PG-COPY-{i}"].status for i in range(2)] == ["SETTLED", "SCORED"]
+        assert all(trades[f"PG-COPY-{i}"].risk_score == 0.7 for i in range(2))
+        assert trades["PG-COPY-0"].prediction_details == {"risk_level": "LOW", "shap": 1}
+    finally:
+        with engine.begin() as c:
+            c.execute(text("DELETE FROM trades WHERE trade_id LIKE 'PG-COPY-%'"))
+        engine.dispose()
+
+def test_predict_persists_scores_and_keeps_explanations(loaded_client):
+    from app.db.session import engine
+    body = loaded_client.post("/predict?explain=deferred", json={**SAMPLE_TRADE, "Trade_ID": "TRD-PERSIST-1"}).json()
+    anonymous = loaded_client.post("/predict", params={"explain": "none"}, json=SAFE_TRADE).json()
+    batch = loaded_client.post("/predict/batch", json={"trades": [{**SAFE_TRADE, "Trade_ID": "TRD-PERSIST-2"}]}).json()
+    assert anonymous["trade_id"] and batch["results"][0]["trade_id"] == "TRD-PERSIST-2"
+
+    deadline = time.time() + 5
+    while loaded_client.get("/explanations/TRD-PERSIST-1").json()["status"] != "ready" and time.time() < deadline:
+        time.sleep(0.01)
+    assert loaded_client.post("/persistence/flush").json()["buffered"] == 0
+
+    trades = stored(engine)
+    assert trades["TRD-PERSIST-1"].risk_score == pytest.approx(body["failure_probability"], abs=1e-4)
+    assert trades["TRD-PERSIST-1"].status == "SCORED"
+    assert "TRD-PERSIST-2" in trades
+    # Anonymous calls are answered but neither persisted nor booked (nothing would ever evict them)
+    from app.main import ml_models
+    assert anonymous["trade_id"] not in trades and ml_models["trade_book"].get(anonymous["trade_id"]) is None
+    assert ml_models["trade_book"].get("TRD-PERSIST-2") is not None
+    # Scoring fields and the deferred SHAP explanation share prediction_details
+    details = loaded_client.get("/explanations/TRD-PERSIST-1").json()
+    assert details["status"] == "ready" and details["shap_explanation"]["feature_contributions"]
+    stored_details = json.loads(trades["TRD-PERSIST-1"].prediction_details)
+    assert stored_details["risk_level"] == body["risk_level"] and stored_details["inputs"]["SSI_Status"] == "Mismatch"
@@ -0,0 +1,89 @@
+import json
+import os
+import numpy as np
+import pytest
+
+import app.ml_runtime  # noqa: F401  (puts ml_service/ on sys.path)
+
+pytest.importorskip("faker")
+import columnar  # noqa: E402
+import data_generator  # noqa: E402
+import train_model  # noqa: E402
+from fast_path import FastPathPredictor  # noqa: E402
+
+def test_chunk_split_is_stratified_and_repeatable():
+    y = np.r_[np.zeros(900, dtype=np.int8), np.ones(100, dtype=np.int8)]
+    mask = train_model.chunk_split_mask(y, 3)
+    assert mask.sum() == 200 and y[mask].sum() == 20
+    np.testing.assert_array_equal(mask, train_model.chunk_split_mask(y, 3))
+    assert not np.array_equal(mask, train_model.chunk_split_mask(y, 4))
+
+def test_streaming_training_writes_standard_artifacts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data_generator.generate_to_disk(6000, "data", chunk_size=2000, seed=11)
+
+    predictor = train_model.SettlementPredictor()
+    X_sample = predictor.train_streaming("data", chunk_size=1500, sample_size=1000)
+    predictor.generate_explanation(X_sample)
+    predictor.save_artifacts()
+
+    assert sorted(os.listdir("model")) == ['feature_names.joblib', 'metrics.json', 'model.joblib',
+                                           'serving', 'shap_explainer.joblib']
+    assert '1' in json.load(open("model/metrics.json"))
+
+    # The artifact serves through both the pipeline and the fast path, identically
+    df = columnar.read_columnar("data").head(500)
+    fast = FastPathPredictor.from_pipeline(predictor.pipeline)
+    np.testing.assert_allclose(fast.predict_proba(fast.encode_frame(df)),
+                               predictor.pipeline.predict_proba(df)[:, 1], atol=1e-6)
+    mismatch = df['SSI_Status'].astype(str) == 'Mismatch'
+    probs = predictor.pipeline.predict_proba(df)[:, 1]
+    assert probs[mismatch.to_numpy()].mean() > probs[~mismatch.to_numpy()].mean()
+
+def test_compare_writes_both_variants_and_keeps_the_selected_one(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data_generator.save_dataset(data_generator.generate_market_data(4000, seed=12), "data", seed=12)
+
+    predictor, X_test = train_model.compare_variants("data", selected='categorical')
+    metrics = json.load(open("model/metrics.json"))
+    assert metrics['selected'] == 'categorical'
+    for variant in train_model.VARIANTS:
+        numbers = metrics['variants'][variant]
+        for key in ('recall', 'precision', 'f1', 'train_wall_seconds', 'train_peak_memory_mb',
+                    'artifact_bytes', 'single_row_p50_ms', 'batch_ms'):
+            assert key in numbers
+    assert metrics['variants']['categorical']['encoded_columns'] == 11
+
+    # Native categorical artifact: one code column per feature on the fast path, unknown -> missing
+    fast = FastPathPredictor.from_pipeline(predictor.pipeline)
+    assert 'smote' not in predictor.pipeline.named_steps and fast.n_features == 11
+    np.testing.assert_allclose(fast.predict_proba(fast.encode_frame(X_test)),
+                               predictor.pipeline.predict_proba(X_test)[:, 1], atol=1e-6)
+    record = {**X_test.iloc[0].to_dict(), 'Currency': 'XXX'}
+    assert np.isnan(fast.encode_one(record)[0][fast.code_columns[fast.categorical_names.index('Currency')]])
+    assert 0.0 <= fast.predict_one(record) <= 1.0
+
+def test_tuning_shares_folds_and_writes_the_winner(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data_generator.save_dataset(data_generator.generate_market_data(3000, seed=13), "data", seed=13)
+
+    predictor, _ = train_model.tune("data", variant='categorical', n_folds=2, n_candidates=3, budget_seconds=120,
+                                    workers=2, max_rounds=200, early_stopping_rounds=10)
+    tuning = json.load(open("model/best_params.json"))
+    assert os.path.exists("model/metrics.json")
+    assert tuning['pruned'] == 0 and len(tuning['candidates']) == 4
+    baseline = tuning['baseline']
+    assert baseline['n_estimators'] == train_model.BASELINE_ROUNDS
+    best = tuning['best']
+    assert predictor.pipeline.named_steps['classifier'].n_estimators == best['n_estimators']
+    winner = next(c for c in tuning['candidates'] if c['n_estimators'] == best['n_estimators'])
+    assert winner['recall'] >= baseline['recall'] - train_model.RECALL_TOLERANCE
+
+def test_tuning_budget_prunes_candidates(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data_generator.save_dataset(data_generator.generate_market_data(2000, seed=14), "data", seed=14)
+
+    train_model.tune("data", variant='categorical', n_folds=2, n_candidates=3, budget_seconds=0, workers=1)
+    tuning = json.load(open("model/best_params.json"))
+    assert tuning['pruned'] == 4 and tuning['baseline'] is None
+    assert tuning['best']['n_estimators'] == train_model.BASELINE_ROUNDS
@@ -0,0 +1,139 @@
+import os
+import shutil
+import joblib
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app, ml_models, score_records
+from app.schemas.predict import TradeRequest
+from app.services.worker_pool import InferenceWorkerPool
+from tests.conftest import MODEL_DIR, SAMPLE_TRADE, SAFE_TRADE
+
+def double(records):
+    if any(r["x"] < 0 for r in records):
+        raise ValueError("negative")
+    return np.array([r["x"] * 2.0 for r in records])
+
+def broken_init():
+    raise OSError("model bundle missing")
+
+@pytest.fixture
+def pool():
+    # Preloaded in the forkserver: workers start without re-importing the app
+    pool = InferenceWorkerPool(double, n_workers=2, task_timeout=10, min_chunk_size=10, preload=[__name__])
+    pool.start()
+    yield pool
+    pool.stop()
+
+def test_pool_scores_in_worker_processes(pool):
+    assert list(pool.score([{"x": 1}, {"x": 2}])) == [2.0, 4.0]
+    pids = {w["pid"] for w in pool.health()}
+    assert os.getpid() not in pids and len(pids) == 2
+
+def test_pool_parallel_preserves_order(pool):
+    records = [{"x": i} for i in range(100)]
+    assert list(pool.score_parallel(records)) == [i * 2.0 for i in range(100)]
+
+def test_pool_reports_errors_and_keeps_serving(pool):
+    with pytest.raises(RuntimeError, match="negative"):
+        pool.score([{"x": -1}])
+    assert list(pool.score([{"x": 3}])) == [6.0]
+
+def test_dead_worker_is_replaced(pool):
+    victim = pool.health()[0]
+    os.kill(victim["pid"], 9)
+    for _ in range(4):
+        assert list(pool.score([{"x": 1}])) == [2.0]
+    worker = next(w for w in pool.health() if w["id"] == victim["id"])
+    assert worker["alive"] and worker["pid"] != victim["pid"]
+
+def test_rolling_restart(pool):
+    before = {w["id"]: w["pid"] for w in pool.health()}
+    pool.restart()
+    after = pool.health()
+    assert all(w["restarts"] == 1 and w["alive"] and w["pid"] != before[w["id"]] for w in after)
+    assert list(pool.score([{"x": 5}])) == [10.0]
+
+def test_worker_init_failure_surfaces_at_start():
+    pool = InferenceWorkerPool(double, n_workers=1, worker_init=broken_init, preload=[__name__])
+    with pytest.raises(RuntimeError, match="failed to start: OSError: model bundle missing"):
+        pool.start()
+    pool.stop()
+
+def stage_count(client, stage):
+    line = f'settlement_stage_seconds_count{{stage="{stage}"}} '
+    return next((int(l.split()[-1]) for l in client.get("/metrics").text.splitlines() if l.startswith(line)), 0)
+
+def test_gateway_pool_mode(monkeypatch):
+    with TestClient(app) as inprocess:
+        expected = [inprocess.post("/predict", json=t).json()["failure_probability"] for t in (SAMPLE_TRADE, SAFE_TRADE)]
+        assert inprocess.get("/health").json()["inference_mode"] == "inprocess"
+
+    monkeypatch.setenv("INFERENCE_MODE", "pool")
+    monkeypatch.setenv("INFERENCE_WORKERS", "2")
+    with TestClient(app) as client:
+        health = client.get("/health").json()
+        assert health["inference_mode"] == "pool" and len(health["workers"]) == 2
+        assert all(w["alive"] for w in health["workers"])
+
+        timed = stage_count(client, "predict")
+        actual = [client.post("/predict", json=t).json()["failure_probability"] for t in (SAMPLE_TRADE, SAFE_TRADE)]
+        assert actual == expected
+        # Scoring stages only run in the workers; their timings come back with the answers
+        assert stage_count(client, "predict") == timed + 2
+
+        restarted = client.post("/workers/restart").json()
+        assert all(w["restarts"] == 1 for w in restarted["workers"])
+        batch = client.post("/predict/batch", json={"trades": [SAMPLE_TRADE, SAFE_TRADE]}).json()
+        assert [r["failure_probability"] for r in batch["results"]] == expected
+
+def test_pool_scores_with_the_request_snapshot_across_a_swap(monkeypatch, tmp_path):
+    import bundle
+    shutil.copytree(os.path.join(MODEL_DIR, bundle.BUNDLE_DIR), tmp_path, dirs_exist_ok=True)
+    monkeypatch.setenv("MODEL_BUNDLE_DIR", str(tmp_path))
+    monkeypatch.setenv("INFERENCE_MODE", "pool")
+    monkeypatch.setenv("INFERENCE_WORKERS", "1")
+    with TestClient(app) as client:
+        record = TradeRequest(**SAMPLE_TRADE).model_dump()
+        admitted = ml_models["model"]
+        before = score_records([record], admitted)
+
+        # Publish and swap: the worker is replaced by one holding the new version only
+        new = bundle.write_bundle(joblib.load(os.path.join(MODEL_DIR, "model.joblib")), str(tmp_path))
+        assert ml_models["model_watcher"].check() and client.get("/health").json()["model_version"] == new
+        # A request admitted before the swap is still scored by its own version
+        np.testing.assert_array_equal(score_records([record], admitted), before)
+        with pytest.raises(RuntimeError, match="missing"):
+            ml_models["worker_pool"].score([record], ("missing", "bundle"))
+        assert client.post("/predict", json=SAFE_TRADE).json()["model_version"] == new
+
+MEMORY_PROBE = """
+import json, sys
+from fastapi.testclient import TestClient
+from app.main import app
+
+def rollup(pid):
+    fields = (line.split() for line in open(f"/proc/{pid}/smaps_rollup"))
+    return {f[0].rstrip(":"): int(f[1]) for f in fields if len(f) == 3 and f[2] == "kB"}
+
+with TestClient(app) as client:
+    print(json.dumps([rollup(w["pid"]) for w in client.get("/health").json()["workers"]]))
+"""
+
+def worker_memory(preload, tmp_path):
+    # Fresh interpreter: the forkserver (and what it preloads) is per process
+    import subprocess, sys, json as _json
+    env = {**os.environ, "INFERENCE_MODE": "pool", "INFERENCE_WORKERS": "2", "INFERENCE_PRELOAD": preload,
+           "DATABASE_URL": f"sqlite:///{tmp_path}/memory-{preload}.db", "MODEL_WATCH_INTERVAL": "0"}
+    out = subprocess.run([sys.executable, "-c", MEMORY_PROBE], env=env, capture_output=True, text=True,
+                         cwd=os.path.dirname(os.path.dirname(__file__)), timeout=300, check=True).stdout
+    return _json.loads(out.strip().splitlines()[-1])
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/smaps_rollup"), reason="needs Linux smaps_rollup")
+def test_workers_share_the_preloaded_model(tmp_path):
+    shared, private = worker_memory("1", tmp_path), worker_memory("0", tmp_path)
+    # The booster and encoder tables (~4 MB in memory) are inherited copy-on-write instead of loaded per worker
+    for with_preload, without in zip(shared, private):
+        assert without["Private_Dirty"] - with_preload["Private_Dirty"] > 2048
+        assert with_preload["Pss"] < without["Pss"]
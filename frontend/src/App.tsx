@@ -1,6 +1,6 @@
-import { useState } from 'react';
-import { analyzeTrade } from './services/api';
-import type { TradeRequest } from './services/api';
+import { useEffect, useRef, useState } from 'react';
+import { analyzeTrade, openTradeStream, simulateFixes, subscribeScoredFeed } from './services/api';
+import type { StreamResult, TradeRequest } from './services/api';
 import RiskGauge from './components/dashboard/RiskGauge';
 import ExplainabilityChart from './components/dashboard/ExplainabilityChart';
 import LiveFeedTable from './components/dashboard/LiveFeedTable';
@@ -13,29 +13,86 @@ const MOCK_TRADES = [
   { Trade_ID: 'TRD-2024-003', Asset_Class: 'FX', Counterparty: 'JP Morgan', failure_probability: 0.12, risk_level: 'LOW', shap_explanation: { base_value: 0, feature_contributions: [] } },
 ];
 
+const STREAM_BURST_SIZE = 25;
+const FEED_MAX_ROWS = 500;
+const COUNTERPARTIES = ['Risky Bank Intl', 'Goldman Sachs', 'JP Morgan', 'Deutsche Bank', 'Nomura'];
+const RATINGS = ['AAA', 'AA', 'A', 'BBB', 'BB', 'CCC'];
+
+// Defines a "Risky" trade (SSI Mismatch)
+const RISKY_TRADE: TradeRequest = {
+  Notional_Amount_USD: 15000000,
+  Market_Volatility_Index: 35.0, // High Volatility
+  Asset_Class: 'Corp Bond',
+  Counterparty_Rating: 'CCC',
+  SSI_Status: 'Mismatch', // FATAL
+  Liquidity_Score: 'Low',
+  Custodian_Location: 'EU',
+  Operation_Type: 'DVP',
+  Currency: 'EUR'
+};
+
+const pick = <T,>(values: T[]): T => values[Math.floor(Math.random() * values.length)];
+
 function App() {
   const [selectedTrade, setSelectedTrade] = useState<any>(MOCK_TRADES[0]);
   const [tableData, setTableData] = useState<any[]>(MOCK_TRADES);
   const [analyzing, setAnalyzing] = useState(false);
+  const ingestSocket = useRef<WebSocket | null>(null);
+  // Inputs of the trades this dashboard pushed, to label the scored rows coming back on the feed
+  const pushedTrades = useRef(new Map<string, { Asset_Class: string; Counterparty: string }>());
 
-  // Simulation Function
-  const simulateNewTrade = async () => {
-    // Defines a "Risky" trade (SSI Mismatch)
-    const riskyTrade: TradeRequest = {
-      Notional_Amount_USD: 15000000,
-      Market_Volatility_Index: 35.0, // High Volatility
-      Asset_Class: 'Corp Bond',
-      Counterparty_Rating: 'CCC',
-      SSI_Status: 'Mismatch', // FATAL
-      Liquidity_Score: 'Low',
-      Custodian_Location: 'EU',
-      Operation_Type: 'DVP',
-      Currency: 'EUR'
+  // Scored stream results arrive through the shared feed, so every open dashboard sees them
+  useEffect(() => {
+    const feed = subscribeScoredFeed((results: StreamResult[]) => {
+      const rows = results.map(r => ({
+        ...r,
+        Trade_ID: r.trade_id,
+        ...(pushedTrades.current.get(r.trade_id ?? '') ?? { Asset_Class: '-', Counterparty: '-' }),
+        shap_explanation: { base_value: 0, feature_contributions: [] },
+      }));
+      results.forEach(r => pushedTrades.current.delete(r.trade_id ?? ''));
+      setTableData(prev => [...rows.reverse(), ...prev].slice(0, FEED_MAX_ROWS));
+    });
+    return () => {
+      feed.close();
+      ingestSocket.current?.close();
     };
+  }, []);
+
+  // Push a burst of trades over one WebSocket; the server scores them in micro-batches
+  const ingestTradeStream = () => {
+    if (!ingestSocket.current || ingestSocket.current.readyState > WebSocket.OPEN) {
+      ingestSocket.current = openTradeStream(results => {
+        results.filter(r => r.error).forEach(r => console.error('Stream Trade Failed', r.trade_id, r.error));
+      });
+    }
+    const trades: TradeRequest[] = Array.from({ length: STREAM_BURST_SIZE }, () => {
+      const tradeId = `TRD-${Math.floor(Math.random() * 1000000)}`;
+      const trade: TradeRequest = {
+        Trade_ID: tradeId,
+        Notional_Amount_USD: Math.round(Math.random() * 20000000),
+        Market_Volatility_Index: 10 + Math.random() * 30,
+        Asset_Class: pick(['Corp Bond', 'Equity', 'FX', 'Govt Bond']),
+        Counterparty_Rating: pick(RATINGS),
+        SSI_Status: Math.random() < 0.1 ? 'Mismatch' : 'Match',
+        Liquidity_Score: pick(['High', 'Medium', 'Low']),
+      };
+      pushedTrades.current.set(tradeId, { Asset_Class: trade.Asset_Class, Counterparty: pick(COUNTERPARTIES) });
+      return trade;
+    });
+    const socket = ingestSocket.current;
+    if (socket.readyState === WebSocket.OPEN) {
+      socket.send(JSON.stringify(trades));
+    } else {
+      socket.addEventListener('open', () => socket.send(JSON.stringify(trades)), { once: true });
+    }
+  };
 
+  // Simulation Function
+  const simulateNewTrade = async () => {
     setAnalyzing(true);
     try {
-      const result = await analyzeTrade(riskyTrade);
+      const result = await analyzeTrade(RISKY_TRADE);
       const newRecord = {
         ...result,
         Trade_ID: `TRD-${Math.floor(Math.random() * 10000)}`,
@@ -56,25 +113,19 @@ function App() {
   const handleAutoCorrect = async () => {
     if (!selectedTrade) return;
 
-    // Simulate fixing the SSI
-    const fixedTrade: TradeRequest = {
-      Notional_Amount_USD: 15000000,
-      Market_Volatility_Index: 35.0,
-      Asset_Class: 'Corp Bond',
-      Counterparty_Rating: 'CCC',
-      SSI_Status: 'Match', // FIX: Match
-      Liquidity_Score: 'Low',
-      Custodian_Location: 'EU',
-      Operation_Type: 'DVP',
-      Currency: 'EUR'
-    };
-
     setAnalyzing(true);
     try {
-      const result = await analyzeTrade(fixedTrade);
+      // Score the standard fixes (SSI, custodian, split notional, Monday morning) in one call
+      // and apply the one that lowers the failure probability the most
+      const simulation = await simulateFixes(RISKY_TRADE);
+      const best = simulation.variants[0];
+      if (!best || best.risk_reduction <= 0) return;
       const fixedRecord = {
         ...selectedTrade,
-        ...result,
+        failure_probability: best.failure_probability,
+        risk_level: best.risk_level,
+        shap_explanation: best.shap_explanation ?? selectedTrade.shap_explanation,
+        applied_fix: best.name,
       };
       // Update in list
       setTableData(prev => prev.map(t => t.Trade_ID === selectedTrade.Trade_ID ? fixedRecord : t));
@@ -93,13 +144,21 @@ function App() {
           <h1 className="text-3xl font-bold text-emerald-400 tracking-tight">SettlementGuard <span className="text-slate-500 text-lg font-normal">v1.0</span></h1>
           <p className="text-slate-400">Intelligent Trade Failure Prediction</p>
         </div>
-        <button
-          onClick={simulateNewTrade}
-          disabled={analyzing}
-          className="bg-emerald-600 hover:bg-emerald-500 text-white px-6 py-2 rounded-lg font-semibold shadow-lg shadow-emerald-500/20 transition-all border border-emerald-500"
-        >
-          {analyzing ? 'Analyzing...' : '+ Ingest Trade Stream'}
-        </button>
+        <div className="flex gap-3">
+          <button
+            onClick={simulateNewTrade}
+            disabled={analyzing}
+            className="bg-slate-700 hover:bg-slate-600 text-white px-6 py-2 rounded-lg font-semibold transition-all border border-slate-600"
+          >
+            {analyzing ? 'Analyzing...' : '+ Risky Trade'}
+          </button>
+          <button
+            onClick={ingestTradeStream}
+            className="bg-emerald-600 hover:bg-emerald-500 text-white px-6 py-2 rounded-lg font-semibold shadow-lg shadow-emerald-500/20 transition-all border border-emerald-500"
+          >
+            + Ingest Trade Stream
+          </button>
+        </div>
       </header>
 
       <main className="grid grid-cols-12 gap-6 h-[calc(100vh-140px)]">
@@ -4,6 +4,7 @@ import { BarChart, Bar, XAxis, YAxis, Tooltip, ResponsiveContainer, Cell, Refere
 interface ExplainabilityChartProps {
     shapData: {
         base_value: number;
+        feature_names?: string[];
         feature_contributions: number[];
     };
     featureNames: string[]; // We currently don't have these dynamically from API unless we pass them. Simplification: hardcode or generic names.
@@ -25,7 +26,7 @@ const ExplainabilityChart: React.FC<ExplainabilityChartProps> = ({ shapData }) =
     // But our schema was list[float]. Let's try to make it usable.
 
     const formattedData = shapData.feature_contributions.map((val, index) => ({
-        name: `Feat ${index}`,
+        name: shapData.feature_names?.[index]?.replace(/_/g, ' ') ?? `Feat ${index}`,
         value: val,
         fill: val > 0 ? '#ef4444' : '#10b981' // Red for risk increase, Green for decrease
     })).sort((a, b) => Math.abs(b.value) - Math.abs(a.value)) // Sort by magnitude
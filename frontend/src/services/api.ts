@@ -22,6 +22,9 @@ export interface TradeRequest {
     Currency?: string;
     Trade_Day?: string;
     Trade_Hour?: number;
+    // Raw booking timestamp (ISO 8601); the API derives Trade_Day / Trade_Hour / Settlement_Date from it
+    Trade_Date?: string;
+    Trade_ID?: string;
 }
 
 export interface PredictionResponse {
@@ -29,8 +32,19 @@ export interface PredictionResponse {
     risk_level: string;
     shap_explanation: {
         base_value: number;
+        feature_names?: string[]; // Business features, aligned with feature_contributions
         feature_contributions: number[];
     };
+    explanation_id?: string | null;
+    explanation_status?: string | null; // 'pending' | 'rejected' when explain=deferred
+}
+
+export interface ExplanationResponse {
+    id: string;
+    status: 'pending' | 'ready' | 'failed';
+    failure_probability?: number | null;
+    shap_explanation?: PredictionResponse['shap_explanation'] | null;
+    error?: string | null;
 }
 
 export const analyzeTrade = async (trade: TradeRequest): Promise<PredictionResponse> => {
@@ -38,4 +52,79 @@ export const analyzeTrade = async (trade: TradeRequest): Promise<PredictionRespo
     return response.data;
 };
 
+// Score now, fetch the SHAP drivers later (e.g. when the trade is selected)
+export const analyzeTradeDeferred = async (trade: TradeRequest): Promise<PredictionResponse> => {
+    const response = await api.post<PredictionResponse>('/predict', trade, { params: { explain: 'deferred' } });
+    return response.data;
+};
+
+export const fetchExplanation = async (explanationId: string): Promise<ExplanationResponse> => {
+    const response = await api.get<ExplanationResponse>(`/explanations/${encodeURIComponent(explanationId)}`);
+    return response.data;
+};
+
+// --- What-if simulation ---
+export interface Perturbation {
+    name: string;
+    changes: Partial<TradeRequest>;
+}
+
+export interface SimulationVariant extends Perturbation {
+    failure_probability: number;
+    risk_level: string;
+    risk_reduction: number; // base minus variant failure probability
+    rank: number;
+    shap_explanation?: PredictionResponse['shap_explanation'] | null;
+}
+
+export interface SimulationResponse {
+    failure_probability: number;
+    risk_level: string;
+    model_version?: string | null;
+    shap_explanation?: PredictionResponse['shap_explanation'] | null;
+    variants: SimulationVariant[]; // best fix first
+}
+
+// Scores candidate fixes for one trade in a single call; omit perturbations for the standard menu
+export const simulateFixes = async (
+    trade: TradeRequest,
+    perturbations?: Perturbation[],
+    explain = true,
+): Promise<SimulationResponse> => {
+    const response = await api.post<SimulationResponse>('/simulate', { trade, perturbations, explain });
+    return response.data;
+};
+
+// --- Streaming ingestion (WebSocket) ---
+const WS_URL = API_URL.replace(/^http/, 'ws');
+
+export interface StreamResult {
+    seq: number;
+    trade_id?: string | null;
+    failure_probability?: number;
+    risk_level?: string;
+    scoring_tier?: string;
+    model_version?: string;
+    error?: string;
+}
+
+type StreamResultsHandler = (results: StreamResult[]) => void;
+
+const openSocket = (path: string, onResults: StreamResultsHandler): WebSocket => {
+    const socket = new WebSocket(`${WS_URL}${path}`);
+    socket.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.type === 'results') onResults(message.results);
+    };
+    return socket;
+};
+
+// Push trades continuously; results for this connection come back per scored micro-batch
+export const openTradeStream = (onResults: StreamResultsHandler): WebSocket =>
+    openSocket('/stream/trades', onResults);
+
+// Every trade scored by any stream, fanned out to all dashboards (not re-scored)
+export const subscribeScoredFeed = (onResults: StreamResultsHandler): WebSocket =>
+    openSocket('/stream/subscribe', onResults);
+
 export default api;
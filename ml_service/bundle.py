@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from fast_path import FastPathPredictor
+
+# Lean serving bundle: <root>/<version>/{booster.ubj, spec.json} plus a CURRENT pointer file.
+# Loading it needs numpy and xgboost only: no pickles, and nothing here imports sklearn, imblearn or
+# pandas. xgboost itself is imported on the first load (and brings its own sklearn/pandas integration
+# along when those packages are installed), so importing the API stays free of all of them.
+BUNDLE_DIR = "serving"
+CURRENT_FILE = "CURRENT"
+BOOSTER_FILE = "booster.ubj"
+SPEC_FILE = "spec.json"
+FORMAT_NAME = "settlement-serving"
+FORMAT_VERSION = 1
+
+
+def bundle_version(booster_raw, spec):
+    """Content hash of the booster bytes and the spec (minus its timestamp)."""
+    digest = hashlib.sha256(bytes(booster_raw))
+    digest.update(json.dumps({k: v for k, v in spec.items() if k != "created_at"}, sort_keys=True).encode())
+    return digest.hexdigest()[:12]
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def write_bundle(pipeline, root, feature_names=None, cascade=None, drift_reference=None):
+    """
+    Exports a fitted pipeline as a bundle under `root` and points CURRENT
+    at it. The version directory is fully written before the pointer moves,
+    so a watching server never sees a half-written bundle. Returns the version.
+    """
+    compiled = FastPathPredictor.from_pipeline(pipeline)
+    raw = compiled.booster.save_raw("ubj")
+    spec = {
+        "format": FORMAT_NAME,
+        "format_version": FORMAT_VERSION,
+        "preprocessor": compiled.spec,
+        "iteration_range": list(compiled.iteration_range),
+        "feature_names": list(feature_names) if feature_names is not None else None,
+        "cascade": cascade,
+        "drift_reference": drift_reference,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    version = bundle_version(raw, spec)
+    spec["version"] = version
+
+    os.makedirs(root, exist_ok=True)
+    target = os.path.join(root, version)
+    if not os.path.isdir(target):
+        staging = f"{target}.tmp-{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        with open(os.path.join(staging, BOOSTER_FILE), "wb") as f:
+            f.write(raw)
+        with open(os.path.join(staging, SPEC_FILE), "w") as f:
+            json.dump(spec, f, indent=2)
+        os.replace(staging, target)
+    _write_atomic(os.path.join(root, CURRENT_FILE), version.encode())
+    return version
+
+
+def current_version(root):
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_bundle(root, version=None):
+    """
+    Loads a bundle into a FastPathPredictor. Returns a dict with version,
+    fast_path, feature_names, the cascade config and the drift reference
+    profile (either may be None).
+    """
+    import xgboost as xgb  # only the booster runtime; imported on first load
+
+    version = version or current_version(root)
+    if version is None:
+        raise FileNotFoundError(f"No {CURRENT_FILE} in {root}")
+    directory = os.path.join(root, version)
+    with open(os.path.join(directory, SPEC_FILE)) as f:
+        spec = json.load(f)
+    if spec.get("format") != FORMAT_NAME:
+        raise ValueError(f"{directory} is not a {FORMAT_NAME} bundle")
+    with open(os.path.join(directory, BOOSTER_FILE), "rb") as f:
+        raw = bytearray(f.read())
+    if bundle_version(raw, {k: v for k, v in spec.items() if k != "version"}) != version:
+        raise ValueError(f"Bundle {version} does not match its content hash")
+
+    booster = xgb.Booster()
+    booster.load_model(raw)
+    return {
+        "version": version,
+        "fast_path": FastPathPredictor(spec["preprocessor"], booster, tuple(spec["iteration_range"])),
+        "feature_names": spec["feature_names"],
+        "cascade": spec["cascade"],
+        "drift_reference": spec.get("drift_reference"),  # absent in bundles written before drift monitoring
+    }
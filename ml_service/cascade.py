@@ -0,0 +1,144 @@
+import json
+
+import numpy as np
+
+# Same cut-offs as risk_level in the API: > 0.5 HIGH, > 0.8 CRITICAL
+RISK_THRESHOLDS = (0.5, 0.8)
+
+# Which tier produced a score
+TIER_FULL = 0
+TIER_PREFIX = 1
+TIER_NAMES = {TIER_FULL: "full", TIER_PREFIX: "prefix"}
+
+CASCADE_FILE = "cascade.json"
+
+
+def risk_levels(probs):
+    """Vectorized risk level: 0 LOW, 1 HIGH, 2 CRITICAL."""
+    probs = np.asarray(probs)
+    return sum((probs > t).astype(np.int8) for t in RISK_THRESHOLDS)
+
+
+def in_bands(probs, bands):
+    mask = np.zeros(len(probs), dtype=bool)
+    for lo, hi in bands:
+        mask |= (probs >= lo) & (probs <= hi)
+    return mask
+
+
+class CascadePredictor:
+    """
+    Early-exit scoring on top of a FastPathPredictor.
+
+    Every trade is first scored with the first `prefix_trees` trees of the
+    booster (iteration_range). Only trades whose prefix probability falls in
+    one of the uncertainty bands (intervals around the risk thresholds,
+    calibrated offline by calibrate()) are re-scored with the full
+    ensemble; the rest keep the prefix score.
+    """
+
+    def __init__(self, fast_path, prefix_trees, bands):
+        self.fast_path = fast_path
+        self.prefix_trees = int(prefix_trees)
+        self.prefix_range = (0, self.prefix_trees)
+        self.bands = [tuple(band) for band in bands]
+
+    @classmethod
+    def from_config(cls, fast_path, config):
+        total = total_trees(fast_path)
+        if config["total_trees"] != total:
+            raise ValueError(f"Cascade was calibrated for {config['total_trees']} trees, the model has {total}")
+        return cls(fast_path, config["prefix_trees"], config["bands"])
+
+    @classmethod
+    def from_file(cls, fast_path, path):
+        with open(path) as f:
+            return cls.from_config(fast_path, json.load(f))
+
+    def predict_proba(self, X):
+        """(probabilities, tiers) for an already-encoded matrix."""
+        probs = np.array(self.fast_path.booster.inplace_predict(X, iteration_range=self.prefix_range))
+        escalate = in_bands(probs, self.bands)
+        if escalate.any():
+            probs[escalate] = self.fast_path.predict_proba(X[escalate])
+        return probs, np.where(escalate, TIER_FULL, TIER_PREFIX)
+
+    def predict_records(self, records):
+        """(n, 2) array: failure probability, tier."""
+        probs, tiers = self.predict_proba(self.fast_path.encode_records(records))
+        return np.column_stack([probs, tiers])
+
+    def predict_one(self, record):
+        probs, tiers = self.predict_proba(self.fast_path.encode_one(record))
+        return float(probs[0]), int(tiers[0])
+
+
+def total_trees(fast_path):
+    end = fast_path.iteration_range[1]
+    return end if end else fast_path.booster.num_boosted_rounds()
+
+
+def fit_bands(prefix, full, allowed_misses=0):
+    """
+    Narrowest bands around each threshold that send every trade whose prefix
+    and full risk level disagree to the full model, except the
+    `allowed_misses` trades that would need the widest bands.
+    """
+    # Distance from each threshold a disagreeing trade needs covered: (below, above) per threshold
+    needs = []
+    for t in RISK_THRESHOLDS:
+        below = (prefix <= t) & (full > t)  # prefix says under t, full model says over
+        above = (prefix > t) & (full <= t)
+        needs.append(np.where(below, t - prefix, np.inf))
+        needs.append(np.where(above, prefix - t, np.inf))
+    needs = np.stack(needs, axis=1)  # (n, 2 * thresholds); inf = no requirement on that side
+    cheapest = needs.min(axis=1)
+    disagreeing = np.flatnonzero(np.isfinite(cheapest))
+
+    # Give up on the most expensive ones, cover each remaining trade on its cheapest side
+    keep = disagreeing[np.argsort(cheapest[disagreeing])][:max(0, len(disagreeing) - allowed_misses)]
+    margins = np.zeros(needs.shape[1])
+    for i in keep:
+        side = int(np.argmin(needs[i]))
+        margins[side] = max(margins[side], needs[i, side])
+
+    return [[float(t - margins[2 * j]), float(t + margins[2 * j + 1])] for j, t in enumerate(RISK_THRESHOLDS)]
+
+
+def calibrate(fast_path, X, target_disagreement=0.001, prefix_fractions=(0.05, 0.1, 0.2, 0.3, 0.5)):
+    """
+    Picks the prefix length and uncertainty bands on a holdout matrix.
+
+    For each candidate prefix the bands are fitted so that the share of
+    holdout trades whose reported risk level differs from the full model's
+    stays under `target_disagreement`; the candidate with the fewest
+    expected trees per trade wins.
+    """
+    n_total = total_trees(fast_path)
+    full = fast_path.predict_proba(X)
+    full_levels = risk_levels(full)
+    allowed = int(np.floor(target_disagreement * len(X)))
+
+    best = None
+    for fraction in prefix_fractions:
+        k = max(1, int(round(n_total * fraction)))
+        if k >= n_total:
+            continue
+        prefix = np.asarray(fast_path.booster.inplace_predict(X, iteration_range=(0, k)))
+        prefix_levels = risk_levels(prefix)
+        bands = fit_bands(prefix, full, allowed)
+        escalate = in_bands(prefix, bands)
+        disagreement = float(np.mean(~escalate & (prefix_levels != full_levels)))
+        candidate = {
+            "prefix_trees": k,
+            "total_trees": n_total,
+            "bands": bands,
+            "target_disagreement": target_disagreement,
+            "holdout_disagreement": disagreement,
+            "holdout_prefix_rate": float(1.0 - escalate.mean()),
+            "expected_trees_per_trade": float(k + escalate.mean() * n_total),
+            "holdout_rows": len(X),
+        }
+        if best is None or candidate["expected_trees_per_trade"] < best["expected_trees_per_trade"]:
+            best = candidate
+    return best
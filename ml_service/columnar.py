@@ -0,0 +1,187 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+SCHEMA_FILE = "_schema.json"
+FORMAT_NAME = "settlement-columnar"
+FORMAT_VERSION = 1
+
+# Strings with at most this many distinct values are dictionary-encoded
+MAX_CATEGORIES = 65535
+
+
+def _codes_dtype(n_categories):
+    return np.int8 if n_categories < 128 else np.int16 if n_categories < 32768 else np.int32
+
+
+def infer_schema(df):
+    """
+    Column kinds for a frame: low-cardinality strings become dictionary-encoded
+    categories, floats become float32, ints are downcast, and the remaining
+    (ID-like) strings are stored as fixed-width bytes.
+    """
+    columns = {}
+    for name in df.columns:
+        series = df[name]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            columns[name] = {"kind": "category", "categories": [str(c) for c in series.cat.categories]}
+        elif pd.api.types.is_float_dtype(series):
+            columns[name] = {"kind": "numeric", "dtype": "float32"}
+        elif pd.api.types.is_integer_dtype(series) or pd.api.types.is_bool_dtype(series):
+            dtype = pd.to_numeric(series, downcast="integer").dtype if len(series) else np.dtype(np.int64)
+            columns[name] = {"kind": "numeric", "dtype": np.dtype(dtype).name}
+        else:
+            uniques = pd.unique(series.astype(str))
+            if len(uniques) <= MAX_CATEGORIES and len(uniques) < max(2, len(series) // 2):
+                columns[name] = {"kind": "category", "categories": sorted(uniques.tolist())}
+            else:
+                columns[name] = {"kind": "string"}
+    return columns
+
+
+def write_part(df, dataset_dir, part_name, schema):
+    """Writes one fixed-size part (one .npy per column) using a shared schema."""
+    part_dir = os.path.join(dataset_dir, part_name)
+    os.makedirs(part_dir, exist_ok=True)
+    for name, spec in schema.items():
+        series = df[name]
+        if spec["kind"] == "category":
+            categories = pd.Index(spec["categories"])
+            codes = categories.get_indexer(series.astype(str))
+            if (codes < 0).any():
+                unknown = pd.unique(series[codes < 0].astype(str))[:5]
+                raise ValueError(f"Column '{name}' has values outside its declared categories: {list(unknown)}")
+            values = codes.astype(_codes_dtype(len(categories)))
+        elif spec["kind"] == "numeric":
+            values = series.to_numpy().astype(spec["dtype"])
+        else:
+            values = np.char.encode(series.astype(str).to_numpy().astype(str), "utf-8")  # fixed-width 'S<n>'
+        np.save(os.path.join(part_dir, f"{name}.npy"), values)
+    return {"name": part_name, "num_rows": len(df)}
+
+
+def write_schema(dataset_dir, schema, parts):
+    meta = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "num_rows": int(sum(p["num_rows"] for p in parts)),
+        "columns": schema,
+        "parts": sorted(parts, key=lambda p: p["name"]),
+    }
+    with open(os.path.join(dataset_dir, SCHEMA_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def write_columnar(df, dataset_dir, schema=None):
+    """Writes a whole frame as a single-part columnar dataset."""
+    os.makedirs(dataset_dir, exist_ok=True)
+    schema = schema or infer_schema(df)
+    write_schema(dataset_dir, schema, [write_part(df, dataset_dir, "part-00000", schema)])
+
+
+def is_columnar(path):
+    return os.path.isfile(os.path.join(path, SCHEMA_FILE))
+
+
+def read_schema(dataset_dir):
+    with open(os.path.join(dataset_dir, SCHEMA_FILE)) as f:
+        meta = json.load(f)
+    if meta.get("format") != FORMAT_NAME:
+        raise ValueError(f"{dataset_dir} is not a {FORMAT_NAME} dataset")
+    return meta
+
+
+def _project(meta, columns):
+    if columns is None:
+        return list(meta["columns"])
+    missing = [c for c in columns if c not in meta["columns"]]
+    if missing:
+        raise KeyError(f"Columns not in dataset: {missing}")
+    return list(columns)
+
+
+def read_part_arrays(dataset_dir, part, columns, mmap=True):
+    """Raw column arrays for one part (category codes, not labels); memory-mapped by default."""
+    part_dir = os.path.join(dataset_dir, part["name"])
+    return {name: np.load(os.path.join(part_dir, f"{name}.npy"), mmap_mode="r" if mmap else None)
+            for name in columns}
+
+
+def _to_frame(meta, arrays):
+    data = {}
+    for name, values in arrays.items():
+        spec = meta["columns"][name]
+        if spec["kind"] == "category":
+            data[name] = pd.Categorical.from_codes(np.asarray(values), categories=spec["categories"])
+        elif spec["kind"] == "string":
+            data[name] = np.char.decode(np.asarray(values), "utf-8").astype(object)
+        else:
+            data[name] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def iter_columnar(dataset_dir, columns=None, mmap=True):
+    """Yields one DataFrame per part; only the projected columns are touched."""
+    meta = read_schema(dataset_dir)
+    columns = _project(meta, columns)
+    for part in meta["parts"]:
+        yield _to_frame(meta, read_part_arrays(dataset_dir, part, columns, mmap))
+
+
+def read_columnar(dataset_dir, columns=None, mmap=True):
+    frames = list(iter_columnar(dataset_dir, columns, mmap))
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_dataset(path, columns=None):
+    """
+    Loads a columnar dataset directory or a CSV file (or a directory of CSV
+    part files), reading only `columns` when given.
+    """
+    if os.path.isdir(path) and is_columnar(path):
+        return read_columnar(path, columns)
+    if os.path.isdir(path):
+        files = sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(".csv"))
+        return pd.concat([pd.read_csv(f, usecols=columns) for f in files], ignore_index=True)
+    return pd.read_csv(path, usecols=columns)
+
+
+def dataset_columns(path):
+    """Column names of a dataset (any format load_dataset accepts), without reading any rows."""
+    if os.path.isdir(path) and is_columnar(path):
+        return list(read_schema(path)["columns"])
+    if os.path.isdir(path):
+        path = sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(".csv"))[0]
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def iter_dataset(path, columns=None, chunk_size=1_000_000):
+    """
+    Streams a dataset (any format load_dataset accepts) as DataFrames of at
+    most `chunk_size` rows. Columnar parts are sliced straight off the
+    memory map, so only the current chunk is ever resident.
+    """
+    if os.path.isdir(path) and is_columnar(path):
+        meta = read_schema(path)
+        columns = _project(meta, columns)
+        for part in meta["parts"]:
+            arrays = read_part_arrays(path, part, columns)
+            for start in range(0, part["num_rows"], chunk_size):
+                yield _to_frame(meta, {name: a[start:start + chunk_size] for name, a in arrays.items()})
+        return
+    if os.path.isdir(path):
+        files = sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(".csv"))
+    else:
+        files = [path]
+    for f in files:
+        yield from pd.read_csv(f, usecols=columns, chunksize=chunk_size)
+
+
+def export_csv(dataset_dir, csv_path, columns=None):
+    """CSV export, streamed part by part."""
+    for i, frame in enumerate(iter_columnar(dataset_dir, columns)):
+        frame.to_csv(csv_path, index=False, mode="w" if i == 0 else "a", header=i == 0)
@@ -1,116 +1,288 @@
-import pandas as pd
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
 import numpy as np
-import random
+import pandas as pd
 from faker import Faker
-from datetime import datetime, timedelta
 
-# Initialize Faker
-fake = Faker()
-Faker.seed(42)
-np.random.seed(42)
+import columnar
+import features
+
+# 1. Setup Distributions (The "Physics" of the market)
+ASSET_CLASSES = (['Equity', 'Gov Bond', 'Corp Bond', 'FX', 'Derivatives'], [0.5, 0.2, 0.15, 0.1, 0.05])
+RATINGS = (['AAA', 'AA', 'A', 'BBB', 'BB', 'CCC'], [0.15, 0.25, 0.3, 0.2, 0.08, 0.02])  # Skewed better
+LOCATIONS = (['US', 'EU', 'APAC'], [0.5, 0.3, 0.2])
+SSI_STATUSES = (['Match', 'Mismatch'], [0.98, 0.02])  # 2% mismatch (Fatal)
+LIQUIDITY_SCORES = (['High', 'Medium', 'Low'], [0.6, 0.3, 0.1])
+OPERATION_TYPES = (['DVP', 'FOP'], [0.9, 0.1])  # Delivery vs Payment, Free of Payment
+CURRENCIES = (['USD', 'EUR', 'GBP', 'JPY', 'CAD'], [0.6, 0.2, 0.1, 0.05, 0.05])
+
+START_DATE = datetime(2025, 1, 1)
+DAYS_IN_RANGE = 365
+# Counterparties are drawn from a fixed universe instead of inventing a new company per trade
+NUM_COUNTERPARTIES = 2000
+DEFAULT_SEED = 42
+
+_HEX = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+_UPPER = np.frombuffer(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ', dtype=np.uint8)
+# Positions of the 32 hex digits inside 'xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx'
+_UUID_HEX_POS = np.array([i for i in range(36) if i not in (8, 13, 18, 23)])
+
+_counterparty_cache = {}
+
+
+def _choice(rng, spec, n):
+    values, p = spec
+    return np.asarray(values, dtype=object)[rng.choice(len(values), n, p=p)]
+
+
+def bulk_uuid4(rng, n):
+    """n random RFC 4122 version-4 UUID strings, built as one byte matrix."""
+    raw = np.frombuffer(rng.bytes(16 * n), dtype=np.uint8).reshape(n, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40  # version 4
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+    out = np.full((n, 36), ord('-'), dtype=np.uint8)
+    digits = np.empty((n, 32), dtype=np.uint8)
+    digits[:, 0::2] = _HEX[raw >> 4]
+    digits[:, 1::2] = _HEX[raw & 0x0F]
+    out[:, _UUID_HEX_POS] = digits
+    return out.view('S36').ravel().astype(str).astype(object)
+
+
+def bulk_isin(rng, n):
+    """Mock ISINs: 2 letters + 10 digits (same shape as the old '??##########' bothify)."""
+    out = np.empty((n, 12), dtype=np.uint8)
+    out[:, :2] = _UPPER[rng.integers(0, 26, (n, 2))]
+    out[:, 2:] = rng.integers(ord('0'), ord('9') + 1, (n, 10))
+    return out.view('S12').ravel().astype(str).astype(object)
+
+
+def counterparty_universe(seed=DEFAULT_SEED, size=NUM_COUNTERPARTIES):
+    """Fixed set of (name, id) pairs; Faker runs `size` times instead of once per trade."""
+    key = (seed, size)
+    if key not in _counterparty_cache:
+        fake = Faker()
+        fake.seed_instance(seed)
+        names = np.array([fake.company() for _ in range(size)], dtype=object)
+        ids = bulk_uuid4(np.random.default_rng(seed), size)
+        _counterparty_cache[key] = (names, ids)
+    return _counterparty_cache[key]
+
 
-def generate_market_data(num_rows=100000):
+def _calendar_tables():
+    # Only DAYS_IN_RANGE distinct dates exist, so derive their features once and index into the tables
+    stamps = np.datetime64(START_DATE, 's') + np.arange(DAYS_IN_RANGE) * np.timedelta64(1, 'D')
+    trade_dates = np.char.replace(np.datetime_as_string(stamps), 'T', ' ').astype(object)
+    derived = features.derive_trade_features(stamps)
+    # T+2 business days on each settlement currency's calendar: one row per calendar currency
+    calendar = features.default_calendar()
+    day_numbers = calendar.day_numbers(stamps)
+    settlement_dates = np.stack([
+        calendar.date_strings[calendar.add_business_days(day_numbers, np.full(DAYS_IN_RANGE, row))]
+        for row in range(calendar.default + 1)
+    ])
+    return trade_dates, settlement_dates, derived['Trade_Day'], derived['Trade_Hour']
+
+
+def generator_schema(seed=DEFAULT_SEED):
     """
-    Generates a synthetic dataset of trades with probabilistic failure logic.
+    Columnar schema with the complete category sets known up front, so chunks
+    written by different processes share one dictionary encoding.
     """
-    print(f"Generating {num_rows} trades...")
-    
-    # 1. Setup Distributions (The "Physics" of the market)
-    asset_classes = ['Equity', 'Gov Bond', 'Corp Bond', 'FX', 'Derivatives']
-    ratings = ['AAA', 'AA', 'A', 'BBB', 'BB', 'CCC']
-    currencies = ['USD', 'EUR', 'GBP', 'JPY', 'CAD']
-    locations = ['US', 'EU', 'APAC']
-    ssi_statuses = ['Match', 'Mismatch']
-    liquidity_scores = ['High', 'Medium', 'Low']
-    operation_types = ['DVP', 'FOP'] # Delivery vs Payment, Free of Payment
+    trade_dates, settlement_dates, days_of_week, _ = _calendar_tables()
+    cp_names, cp_ids = counterparty_universe(seed)
+
+    def category(values):
+        return {"kind": "category", "categories": sorted(set(values))}
+
+    return {
+        'Trade_ID': {"kind": "string"},
+        'Trade_Date': category(trade_dates),
+        'Settlement_Date': category(settlement_dates.ravel()),
+        'Trade_Day': category(days_of_week),
+        'Trade_Hour': {"kind": "numeric", "dtype": "int8"},
+        'Asset_Class': category(ASSET_CLASSES[0]),
+        'Counterparty': category(cp_names),
+        'Counterparty_ID': category(cp_ids),
+        'Counterparty_Rating': category(RATINGS[0]),
+        'Custodian_Location': category(LOCATIONS[0]),
+        'SSI_Status': category(SSI_STATUSES[0]),
+        'Liquidity_Score': category(LIQUIDITY_SCORES[0]),
+        'Market_Volatility_Index': {"kind": "numeric", "dtype": "float32"},
+        'Operation_Type': category(OPERATION_TYPES[0]),
+        'Currency': category(CURRENCIES[0]),
+        'Notional_Amount_USD': {"kind": "numeric", "dtype": "float32"},
+        'ISIN': {"kind": "string"},
+        'Failure_Prob': {"kind": "numeric", "dtype": "float32"},
+        'IS_FAILED': {"kind": "numeric", "dtype": "int8"},
+    }
+
+
+def save_dataset(df, out, fmt="columnar", seed=DEFAULT_SEED):
+    if fmt == "csv":
+        df.to_csv(out, index=False)
+    else:
+        columnar.write_columnar(df, out, generator_schema(seed))
+    print(f"Saved to {out} ({fmt})")
+
+
+def failure_probability(df):
+    """
+    The "Causal Logic" (The Intelligence), as column-wise mask arithmetic.
+    Works on any frame with the rule columns, including single rows.
+    """
+    asset = df['Asset_Class'].to_numpy()
+    rating = df['Counterparty_Rating'].to_numpy()
+
+    prob = np.full(len(df), 0.01)  # Base failure rate (1% random operational noise)
+
+    # Rule 1: The "Fat Finger" Rule (SSI Mismatch)
+    # If SSI is wrong, it almost certainly fails.
+    prob += 0.90 * (df['SSI_Status'].to_numpy() == 'Mismatch')
+
+    # Rule 2: The "Junk Bond" Rule (Credit Risk)
+    # Risky Counterparty + Risky Asset = High Trouble
+    corp_bond = asset == 'Corp Bond'
+    prob += 0.30 * (corp_bond & (rating == 'CCC'))
+    prob += 0.15 * (corp_bond & (rating == 'BB'))
+
+    # Rule 3: The "Friday Afternoon" Rule (Operational Friction)
+    # Friday after 4 PM local time (assuming UTC/simulated), non-USD trades are hard to clear.
+    prob += 0.15 * ((df['Trade_Day'].to_numpy() == 'Friday')
+                    & (df['Trade_Hour'].to_numpy() >= 16)
+                    & (df['Currency'].to_numpy() != 'USD'))
+
+    # Rule 4: The "Whale" Rule (Liquidity)
+    # Huge trades (>100M) in illiquid assets.
+    prob += 0.25 * ((df['Notional_Amount_USD'].to_numpy() > 100_000_000)
+                    & (df['Liquidity_Score'].to_numpy() == 'Low'))
+
+    # Rule 5: Volatility Shock
+    # If VIX is super high (>30), general failure rate increases
+    prob += 0.05 * (df['Market_Volatility_Index'].to_numpy() > 30)
+
+    return np.minimum(prob, 1.0)
+
+
+def _generate_chunk(num_rows, rng, counterparty_seed=DEFAULT_SEED):
+    trade_dates, settlement_dates, days_of_week, hours = _calendar_tables()
+    cp_names, cp_ids = counterparty_universe(counterparty_seed)
 
     # 2. Generate Base Features
-    # Vectorized generation for speed
-    
     # Dates: Random dates within last year
-    start_date = datetime(2025, 1, 1)
-    date_range = [start_date + timedelta(days=np.random.randint(0, 365)) for _ in range(num_rows)]
-    trade_dates = [d.strftime("%Y-%m-%d %H:%M:%S") for d in date_range]
-    days_of_week = [d.strftime("%A") for d in date_range]
-    hours = [d.hour for d in date_range]
+    day_offset = rng.integers(0, DAYS_IN_RANGE, num_rows)
+    counterparty = rng.integers(0, len(cp_names), num_rows)
 
     data = {
-        'Trade_ID': [fake.uuid4() for _ in range(num_rows)],
-        'Trade_Date': trade_dates,
-        # T+2 Settlement (Simplified, ignoring weekends for logic for now)
-        'Settlement_Date': [(d + timedelta(days=2)).strftime("%Y-%m-%d") for d in date_range], 
-        'Trade_Day': days_of_week, # Helper for logic
-        'Trade_Hour': hours,       # Helper for logic
-        'Asset_Class': np.random.choice(asset_classes, num_rows, p=[0.5, 0.2, 0.15, 0.1, 0.05]),
-        'Counterparty': [fake.company() for _ in range(num_rows)],
-        'Counterparty_ID': [fake.uuid4() for _ in range(num_rows)],
-        'Counterparty_Rating': np.random.choice(ratings, num_rows, p=[0.15, 0.25, 0.3, 0.2, 0.08, 0.02]), # Skewed better
-        'Custodian_Location': np.random.choice(locations, num_rows, p=[0.5, 0.3, 0.2]),
-        'SSI_Status': np.random.choice(ssi_statuses, num_rows, p=[0.98, 0.02]), # 2% mismatch (Fatal)
-        'Liquidity_Score': np.random.choice(liquidity_scores, num_rows, p=[0.6, 0.3, 0.1]),
-        'Market_Volatility_Index': np.random.normal(15, 5, num_rows).round(2), # VIX, mean 15
-        'Operation_Type': np.random.choice(operation_types, num_rows, p=[0.9, 0.1]),
-        'Currency': np.random.choice(currencies, num_rows, p=[0.6, 0.2, 0.1, 0.05, 0.05]),
+        'Trade_ID': bulk_uuid4(rng, num_rows),
+        'Trade_Date': trade_dates[day_offset],
+        'Settlement_Date': None,  # needs the currency, filled in below
+        'Trade_Day': days_of_week[day_offset],  # Helper for logic
+        'Trade_Hour': hours[day_offset],        # Helper for logic
+        'Asset_Class': _choice(rng, ASSET_CLASSES, num_rows),
+        'Counterparty': cp_names[counterparty],
+        'Counterparty_ID': cp_ids[counterparty],
+        'Counterparty_Rating': _choice(rng, RATINGS, num_rows),
+        'Custodian_Location': _choice(rng, LOCATIONS, num_rows),
+        'SSI_Status': _choice(rng, SSI_STATUSES, num_rows),
+        'Liquidity_Score': _choice(rng, LIQUIDITY_SCORES, num_rows),
+        'Market_Volatility_Index': rng.normal(15, 5, num_rows).round(2),  # VIX, mean 15
+        'Operation_Type': _choice(rng, OPERATION_TYPES, num_rows),
+        'Currency': _choice(rng, CURRENCIES, num_rows),
         # Log-normal distribution for amounts to simulate "fat tails" (occasional massive trades)
-        'Notional_Amount_USD': np.random.lognormal(mean=14, sigma=1.5, size=num_rows).round(2) 
+        'Notional_Amount_USD': rng.lognormal(mean=14, sigma=1.5, size=num_rows).round(2),
+        # Generate ISINs (Mock)
+        'ISIN': bulk_isin(rng, num_rows),
     }
-    
-    # Generate ISINs (Mock)
-    data['ISIN'] = [fake.bothify(text='??##########') for _ in range(num_rows)]
-    
+    data['Settlement_Date'] = settlement_dates[features.default_calendar().currency_codes(data['Currency']), day_offset]
     df = pd.DataFrame(data)
-    
-    # 3. Apply The "Causal Logic" (The Intelligence)
-    print("Applying applying causal logic...")
-
-    def calculate_failure_prob(row):
-        prob = 0.01 # Base failure rate (1% random operational noise)
-        
-        # Rule 1: The "Fat Finger" Rule (SSI Mismatch)
-        # If SSI is wrong, it almost certainly fails.
-        if row['SSI_Status'] == 'Mismatch':
-            prob += 0.90
-            
-        # Rule 2: The "Junk Bond" Rule (Credit Risk)
-        # Risky Counterparty + Risky Asset = High Trouble
-        if row['Counterparty_Rating'] == 'CCC' and row['Asset_Class'] == 'Corp Bond':
-            prob += 0.30
-        elif row['Counterparty_Rating'] == 'BB' and row['Asset_Class'] == 'Corp Bond': 
-            prob += 0.15
-
-        # Rule 3: The "Friday Afternoon" Rule (Operational Friction)
-        # Friday after 4 PM local time (assuming UTC/simulated), non-USD trades are hard to clear.
-        if row['Trade_Day'] == 'Friday' and row['Trade_Hour'] >= 16 and row['Currency'] != 'USD':
-            prob += 0.15
-            
-        # Rule 4: The "Whale" Rule (Liquidity)
-        # Huge trades (>100M) in illiquid assets.
-        if row['Notional_Amount_USD'] > 100_000_000 and row['Liquidity_Score'] == 'Low':
-            prob += 0.25
-            
-        # Rule 5: Volatility Shock
-        # If VIX is super high (>30), general failure rate increases
-        if row['Market_Volatility_Index'] > 30:
-            prob += 0.05
-
-        return min(prob, 1.0)
-
-    # Apply logic row by row
-    df['Failure_Prob'] = df.apply(calculate_failure_prob, axis=1)
-    
+
+    # 3. Apply The "Causal Logic"
+    df['Failure_Prob'] = failure_probability(df)
+
     # 4. Generate Target Variable
-    # Flip the weighted coin
-    df['IS_FAILED'] = df.apply(lambda row: np.random.choice([1, 0], p=[row['Failure_Prob'], 1-row['Failure_Prob']]), axis=1)
-    
-    # Cleanup helper columns if needed, but keeping them for now is fine for EDA
-    # Remove large objects if saving space is priority, but 100k is small.
-    
+    # Flip the weighted coin, for every row at once
+    df['IS_FAILED'] = (rng.random(num_rows) < df['Failure_Prob'].to_numpy()).astype(np.int64)
+    return df
+
+
+def generate_market_data(num_rows=100000, seed=DEFAULT_SEED):
+    """
+    Generates a synthetic dataset of trades with probabilistic failure logic.
+    """
+    print(f"Generating {num_rows} trades...")
+    df = _generate_chunk(num_rows, np.random.default_rng(seed), seed)
+
     fail_count = df['IS_FAILED'].sum()
     print(f"Dataset Generated. Total: {num_rows}, Failures: {fail_count} ({fail_count/num_rows:.2%})")
-    
     return df
 
+
+# --- Chunked streaming mode (10M-100M rows) ---
+def chunk_rng(seed, chunk_index):
+    # Independent, reproducible stream per chunk: same data whatever the worker count or order
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk_index,)))
+
+
+def _write_chunk(args):
+    chunk_index, num_rows, out_dir, seed, fmt = args
+    df = _generate_chunk(num_rows, chunk_rng(seed, chunk_index), seed)
+    if fmt == "csv":
+        path = os.path.join(out_dir, f"part-{chunk_index:05d}.csv")
+        df.to_csv(path, index=False)
+        part = None
+    else:
+        part = columnar.write_part(df, out_dir, f"part-{chunk_index:05d}", generator_schema(seed))
+        path = os.path.join(out_dir, part["name"])
+    return path, part, int(df['IS_FAILED'].sum())
+
+
+def generate_to_disk(num_rows, out_dir, chunk_size=1_000_000, workers=1, seed=DEFAULT_SEED, fmt="columnar"):
+    """
+    Streams `num_rows` trades to `out_dir` as fixed-size parts (columnar
+    part directories, or CSV part files with fmt="csv").
+
+    Only `workers` chunks are in memory at any time. Chunk i always comes
+    from the same seed, so the output is identical for any `workers`.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    n_chunks = -(-num_rows // chunk_size)
+    tasks = [(i, min(chunk_size, num_rows - i * chunk_size), out_dir, seed, fmt) for i in range(n_chunks)]
+    print(f"Generating {num_rows} trades in {n_chunks} chunks of {chunk_size} ({workers} workers)...")
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_write_chunk, tasks))
+    else:
+        results = [_write_chunk(task) for task in tasks]
+
+    if fmt != "csv":
+        # Parts are written independently; the schema ties them together at the end
+        columnar.write_schema(out_dir, generator_schema(seed), [r[1] for r in results])
+
+    fail_count = sum(r[2] for r in results)
+    print(f"Dataset Generated. Total: {num_rows}, Failures: {fail_count} ({fail_count/num_rows:.2%})")
+    return [r[0] for r in results]
+
+
 if __name__ == "__main__":
-    df = generate_market_data(100000)
-    df.to_csv("settlement_data.csv", index=False)
-    print("Saved to settlement_data.csv")
+    parser = argparse.ArgumentParser(description="Synthetic settlement trade generator")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--format", choices=["columnar", "csv"], default="columnar",
+                        help="columnar: memory-mappable .npy columns (default); csv: export format")
+    parser.add_argument("--out", default=None,
+                        help="Dataset directory (columnar / chunked) or CSV file. "
+                             "Default: settlement_data/ or settlement_data.csv")
+    parser.add_argument("--chunk-size", type=int, default=0, help="Stream fixed-size chunks to --out (directory)")
+    parser.add_argument("--workers", type=int, default=1, help="Processes for chunked mode")
+    args = parser.parse_args()
+    out = args.out or ("settlement_data.csv" if args.format == "csv" and not args.chunk_size else "settlement_data")
+
+    if args.chunk_size:
+        generate_to_disk(args.rows, out, args.chunk_size, args.workers, args.seed, args.format)
+    else:
+        df = generate_market_data(args.rows, args.seed)
+        save_dataset(df, out, args.format, args.seed)
@@ -0,0 +1,327 @@
+import bisect
+import threading
+import time
+
+import numpy as np
+
+# Reference profile of the features the model was trained on, saved next to the
+# model artifacts (and inside the serving bundle) by train_model.py
+DRIFT_FILE = "drift_reference.json"
+PROFILE_VERSION = 1
+
+# Numeric sketches count trades between the reference percentiles (1% steps);
+# PSI is taken over the deciles so small samples do not blow it up
+SKETCH_PERCENTILES = np.arange(1, 100)
+PSI_PERCENTILES = np.arange(10, 100, 10)
+REPORT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+# Live values outside the reference categories share one slot
+OTHER = "__other__"
+
+# Usual PSI reading: < 0.1 stable, 0.1 - 0.25 moderate shift, > 0.25 significant shift
+PSI_THRESHOLDS = (0.1, 0.25)
+# Floor on bin shares so an empty bin does not make PSI infinite
+EPSILON = 1e-4
+
+
+def _numeric_profile(values):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    edges = np.unique(np.percentile(values, SKETCH_PERCENTILES))
+    counts = np.bincount(np.searchsorted(edges, values, side="right"), minlength=len(edges) + 1)
+    psi_edges = np.unique(np.percentile(values, PSI_PERCENTILES))
+    return {
+        "edges": edges.tolist(),
+        "counts": counts.tolist(),
+        # Decile boundaries snapped onto the sketch edges (indices into `edges`)
+        "psi_index": sorted(set(np.searchsorted(edges, psi_edges).clip(0, len(edges) - 1).tolist())),
+        "quantiles": {str(q): float(np.quantile(values, q)) for q in REPORT_QUANTILES},
+        "min": float(values.min()),
+        "max": float(values.max()),
+    }
+
+
+def _categorical_profile(values):
+    categories, counts = np.unique(np.asarray(values, dtype=str), return_counts=True)
+    return {"categories": categories.tolist(), "counts": counts.tolist()}
+
+
+def build_reference(frame, numeric_features, categorical_features, probabilities, model_version=None):
+    """
+    Reference profile from a feature frame (the training holdout) and the
+    model's probabilities on it: percentile sketch per numeric feature and
+    for the probability, category counts per categorical feature. JSON-ready.
+    """
+    return {
+        "profile_version": PROFILE_VERSION,
+        "rows": int(len(frame)),
+        "model_version": model_version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "numeric": {name: _numeric_profile(frame[name]) for name in numeric_features},
+        "categorical": {name: _categorical_profile(frame[name]) for name in categorical_features},
+        "probability": _numeric_profile(probabilities),
+    }
+
+
+def psi(expected, actual):
+    """Population stability index between two count vectors over the same bins."""
+    expected = np.asarray(expected, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+    e = np.maximum(expected / max(expected.sum(), 1.0), EPSILON)
+    a = np.maximum(actual / max(actual.sum(), 1.0), EPSILON)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def psi_status(value):
+    return "stable" if value < PSI_THRESHOLDS[0] else "moderate" if value < PSI_THRESHOLDS[1] else "significant"
+
+
+class _NumericSketch:
+    """Edges and reference shares of one numeric feature; live counts live in the monitor's window."""
+
+    def __init__(self, profile):
+        self.edges = np.asarray(profile["edges"], dtype=np.float64)
+        self.edge_list = self.edges.tolist()  # bisect on a list beats numpy for a handful of values
+        self.reference = np.asarray(profile["counts"], dtype=np.float64)
+        self.psi_index = np.asarray(profile["psi_index"], dtype=np.intp)
+        self.profile = profile
+
+    def bins(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        finite = np.isfinite(values)
+        counts = np.bincount(np.searchsorted(self.edges, values[finite], side="right"), minlength=len(self.edges) + 1)
+        return counts, int(len(values) - finite.sum())
+
+    def coarse(self, counts):
+        # Fine bins -> decile bins: cumulative counts at the decile edges
+        cumulative = np.cumsum(counts)
+        return np.diff(np.concatenate([[0], cumulative[self.psi_index], [cumulative[-1]]]))
+
+    def quantile(self, counts, q):
+        # Linear interpolation inside the fine bin holding the q-th trade; the open-ended
+        # outer bins are bounded by the reference min/max
+        total = counts.sum()
+        target = q * total
+        cumulative = np.cumsum(counts)
+        i = int(np.searchsorted(cumulative, target, side="left"))
+        lower = self.edges[i - 1] if i > 0 else min(self.profile["min"], self.edges[0])
+        upper = self.edges[i] if i < len(self.edges) else max(self.profile["max"], self.edges[-1])
+        before = cumulative[i - 1] if i > 0 else 0
+        fraction = (target - before) / counts[i] if counts[i] else 0.0
+        return float(lower + (upper - lower) * fraction)
+
+    def report(self, counts, missing):
+        n = int(counts.sum())
+        reference_cdf = np.cumsum(self.reference)[:-1] / self.reference.sum()
+        live_cdf = np.cumsum(counts)[:-1] / n
+        value = psi(self.coarse(self.reference), self.coarse(counts))
+        return {
+            "psi": round(value, 6),
+            # Largest CDF gap at the sketch edges (KS statistic up to the 1% bin width)
+            "ks": round(float(np.max(np.abs(live_cdf - reference_cdf))), 6) if len(live_cdf) else 0.0,
+            "status": psi_status(value),
+            "count": n,
+            "missing": missing,
+            "quantiles": {str(q): self.quantile(counts, q) for q in REPORT_QUANTILES},
+            "reference_quantiles": self.profile["quantiles"],
+        }
+
+
+class _CategoricalTable:
+    def __init__(self, profile):
+        self.categories = list(profile["categories"])
+        self.index = {c: i for i, c in enumerate(self.categories)}
+        self.other = len(self.categories)
+        self.reference = np.asarray(profile["counts"] + [0], dtype=np.float64)
+
+    def report(self, counts, other_values):
+        n = int(counts.sum())
+        shares = counts / n
+        reference_shares = self.reference / self.reference.sum()
+        value = psi(self.reference, counts)
+        labels = self.categories + [OTHER]
+        return {
+            "psi": round(value, 6),
+            # Largest change in one category's share
+            "max_shift": round(float(np.max(np.abs(shares - reference_shares))), 6),
+            "status": psi_status(value),
+            "count": n,
+            "shares": {label: round(float(s), 6) for label, s in zip(labels, shares)},
+            "reference_shares": {label: round(float(s), 6) for label, s in zip(labels, reference_shares)},
+            "unseen_categories": sorted(other_values),
+        }
+
+
+class DriftMonitor:
+    """
+    Streaming drift sketches of the scored trades against a reference profile.
+
+    Memory is fixed by the reference: one count array per feature (~100 bins
+    per numeric feature and for the probability, one slot per known category
+    plus "other"). An update is a bisect per numeric value and a dict lookup
+    per categorical one, or searchsorted/bincount for a whole batch.
+
+    With `window` > 0 the counts rotate between two generations of `window`
+    trades each (a batch is never split), so reports cover roughly the last
+    window..2*window trades instead of everything since startup. Reports
+    need at least `min_samples` trades.
+    """
+
+    MAX_UNSEEN = 20  # unseen category names remembered per feature (for the report only)
+
+    def __init__(self, reference, window=0, min_samples=500):
+        self.reference = reference
+        self.window = max(0, int(window))
+        self.min_samples = max(1, int(min_samples))
+        self.numeric = {name: _NumericSketch(p) for name, p in reference["numeric"].items()}
+        self.probability = _NumericSketch(reference["probability"])
+        self.categorical = {name: _CategoricalTable(p) for name, p in reference["categorical"].items()}
+        self._lock = threading.Lock()
+        self._current = self._empty()
+        self._previous = None
+        self.observed = 0
+        self.rotations = 0
+        self.started_at = time.time()
+
+    def _empty(self):
+        return {
+            "n": 0,
+            "numeric": {name: np.zeros(len(s.edges) + 1, dtype=np.int64) for name, s in self.numeric.items()},
+            "missing": {name: 0 for name in self.numeric},
+            "probability": np.zeros(len(self.probability.edges) + 1, dtype=np.int64),
+            "categorical": {name: np.zeros(t.other + 1, dtype=np.int64) for name, t in self.categorical.items()},
+            "unseen": {name: set() for name in self.categorical},
+        }
+
+    def _rotate(self):
+        if self.window and self._current["n"] >= self.window:
+            self._previous, self._current = self._current, self._empty()
+            self.rotations += 1
+
+    def _note_unseen(self, name, value):
+        unseen = self._current["unseen"][name]
+        if len(unseen) < self.MAX_UNSEEN:
+            unseen.add(str(value))
+
+    # --- Updates ---
+    def observe_one(self, record, probability):
+        """One scored trade (validated trade dict) — the single /predict path."""
+        with self._lock:
+            self._rotate()
+            current = self._current
+            for name, sketch in self.numeric.items():
+                value = record.get(name)
+                if value is None or value != value:
+                    current["missing"][name] += 1
+                else:
+                    current["numeric"][name][bisect.bisect_right(sketch.edge_list, value)] += 1
+            for name, table in self.categorical.items():
+                value = record.get(name)
+                i = table.index.get(value, table.other)
+                if i == table.other:
+                    self._note_unseen(name, value)
+                current["categorical"][name][i] += 1
+            current["probability"][bisect.bisect_right(self.probability.edge_list, probability)] += 1
+            current["n"] += 1
+            self.observed += 1
+
+    def observe_records(self, records, probabilities):
+        """A batch of scored trade dicts, row-aligned with their probabilities."""
+        if len(records) == 1:
+            return self.observe_one(records[0], float(probabilities[0]))
+        numeric = {name: np.array([r.get(name) for r in records], dtype=np.float64) for name in self.numeric}
+        counts = {}
+        unseen = {}
+        for name, table in self.categorical.items():
+            index, other = table.index, table.other
+            codes = [index.get(r.get(name), other) for r in records]
+            counts[name] = np.bincount(codes, minlength=other + 1)
+            if counts[name][other]:
+                unseen[name] = {r.get(name) for r in records if r.get(name) not in index}
+        self._add(len(records), numeric, counts, unseen, probabilities)
+
+    def observe_columns(self, numeric, coded, probabilities):
+        """
+        A columnar batch: float arrays per numeric field and (codes, categories)
+        per categorical field, so categories are resolved once per dictionary entry.
+        """
+        counts = {}
+        unseen = {}
+        for name, table in self.categorical.items():
+            if name not in coded:
+                continue
+            codes, categories = coded[name]
+            per_entry = np.bincount(codes, minlength=len(categories))
+            slots = np.array([table.index.get(c, table.other) for c in categories], dtype=np.intp)
+            counts[name] = np.bincount(slots, weights=per_entry, minlength=table.other + 1).astype(np.int64)
+            if counts[name][table.other]:
+                unseen[name] = {c for c, n in zip(categories, per_entry) if n and c not in table.index}
+        self._add(len(probabilities), {k: v for k, v in numeric.items() if k in self.numeric}, counts, unseen,
+                  probabilities)
+
+    def _add(self, n, numeric, categorical_counts, unseen, probabilities):
+        # Bin outside the lock, then one short locked merge
+        numeric_bins = {name: self.numeric[name].bins(values) for name, values in numeric.items()}
+        probability_bins, _ = self.probability.bins(probabilities)
+        with self._lock:
+            self._rotate()
+            current = self._current
+            for name, (bins, missing) in numeric_bins.items():
+                current["numeric"][name] += bins
+                current["missing"][name] += missing
+            for name, counts in categorical_counts.items():
+                current["categorical"][name] += counts
+            for name, values in unseen.items():
+                for value in values:
+                    self._note_unseen(name, value)
+            current["probability"] += probability_bins
+            current["n"] += n
+            self.observed += n
+
+    def reset(self):
+        with self._lock:
+            self._current, self._previous = self._empty(), None
+            self.observed = 0
+            self.rotations = 0
+            self.started_at = time.time()
+
+    # --- Reporting ---
+    def _window_counts(self):
+        with self._lock:
+            generations = [g for g in (self._previous, self._current) if g is not None]
+            merged = {
+                "n": sum(g["n"] for g in generations),
+                "numeric": {name: sum(g["numeric"][name] for g in generations) for name in self.numeric},
+                "missing": {name: sum(g["missing"][name] for g in generations) for name in self.numeric},
+                "probability": sum(g["probability"] for g in generations),
+                "categorical": {name: sum(g["categorical"][name] for g in generations) for name in self.categorical},
+                "unseen": {name: set().union(*(g["unseen"][name] for g in generations)) for name in self.categorical},
+            }
+        return merged
+
+    def report(self):
+        """PSI / KS per feature and for the probability histogram, plus an overall status."""
+        counts = self._window_counts()
+        summary = {
+            "window": counts["n"],
+            "window_size": self.window or None,
+            "observed": self.observed,
+            "rotations": self.rotations,
+            "min_samples": self.min_samples,
+            "since": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started_at)),
+            "reference": {k: self.reference.get(k) for k in ("rows", "model_version", "created_at")},
+        }
+        if counts["n"] < self.min_samples:
+            return {**summary, "status": "insufficient_data", "features": {}, "prediction": None}
+
+        features = {}
+        for name, sketch in self.numeric.items():
+            if counts["numeric"][name].sum():
+                features[name] = {"type": "numeric", **sketch.report(counts["numeric"][name], counts["missing"][name])}
+        for name, table in self.categorical.items():
+            if counts["categorical"][name].sum():
+                features[name] = {"type": "categorical",
+                                  **table.report(counts["categorical"][name], counts["unseen"][name])}
+        prediction = self.probability.report(counts["probability"], 0)
+        worst = max([f["psi"] for f in features.values()] + [prediction["psi"]])
+        return {**summary, "status": psi_status(worst), "max_psi": round(worst, 6),
+                "features": features, "prediction": prediction}
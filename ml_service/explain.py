@@ -0,0 +1,69 @@
+import numpy as np
+
+
+class ExplanationEngine:
+    """
+    SHAP explanations straight from the booster (pred_contribs=True).
+
+    XGBoost computes exact TreeSHAP values natively on the already-encoded
+    matrix, so no pickled shap.TreeExplainer is needed. The per-column values
+    are then folded back onto the 11 business features: the one-hot columns of
+    a categorical (e.g. 'Currency_EUR', 'Currency_USD', ...) are summed into
+    'Currency' (native categorical models already have one column per
+    feature, so the fold is the identity). Values are in log-odds space;
+    base_value + sum(contributions) equals the logit of the failure probability.
+    """
+
+    def __init__(self, fast_path, feature_names=None):
+        self.fast_path = fast_path
+        self.original_features = fast_path.numeric_names + fast_path.categorical_names
+
+        if feature_names is None or len(feature_names) != fast_path.n_features:
+            # No (or stale) feature_names.joblib: rebuild the names the same way the trainer does
+            feature_names = list(fast_path.numeric_names)
+            for feature in fast_path.spec['categorical']:
+                if feature.get('encoding') == 'ordinal':
+                    feature_names.append(feature['name'])
+                else:
+                    feature_names += [f"{feature['name']}_{cat}" for cat in feature['categories']]
+        self.feature_names = list(feature_names)
+
+        # Fold matrix: transformed column -> business feature (longest matching prefix wins)
+        self.fold = np.zeros((fast_path.n_features, len(self.original_features)), dtype=np.float32)
+        by_length = sorted(range(len(self.original_features)), key=lambda k: -len(self.original_features[k]))
+        for j, name in enumerate(self.feature_names):
+            for k in by_length:
+                original = self.original_features[k]
+                if name == original or name.startswith(original + "_"):
+                    self.fold[j, k] = 1.0
+                    break
+            else:
+                raise ValueError(f"Cannot map transformed feature '{name}' to a business feature")
+
+    def contributions(self, X):
+        """(base_values, contributions) for an encoded matrix; one booster call for the whole batch."""
+        import xgboost as xgb  # already loaded with the booster; kept off the import path
+        raw = self.fast_path.booster.predict(
+            xgb.DMatrix(X),
+            pred_contribs=True,
+            iteration_range=self.fast_path.iteration_range,
+        )
+        # Last column is the bias term
+        return raw[:, -1], raw[:, :-1] @ self.fold
+
+    def format(self, base_value, row):
+        return {
+            "base_value": float(base_value),
+            "feature_names": self.original_features,
+            "feature_contributions": [float(v) for v in row],
+        }
+
+    def explain_matrix(self, X):
+        base_values, folded = self.contributions(X)
+        return [self.format(b, row) for b, row in zip(base_values, folded)]
+
+    def explain_records(self, records):
+        return self.explain_matrix(self.fast_path.encode_records(records))
+
+    def explain_one(self, record):
+        return self.explain_matrix(self.fast_path.encode_one(record))[0]
@@ -0,0 +1,214 @@
+import threading
+import numpy as np
+
+# Column order of the ColumnTransformer in train_model.build_pipeline.
+# The fast path reads the real order from the fitted pipeline; these are only the defaults.
+NUMERIC_FEATURES = ['Notional_Amount_USD', 'Market_Volatility_Index', 'Trade_Hour']
+CATEGORICAL_FEATURES = ['Asset_Class', 'Counterparty_Rating', 'SSI_Status', 'Liquidity_Score',
+                        'Custodian_Location', 'Operation_Type', 'Currency', 'Trade_Day']
+
+
+def extract_preprocessor_spec(pipeline):
+    """
+    Reads the fitted RobustScaler / OneHotEncoder (or OrdinalEncoder, for the
+    native-categorical variant) parameters out of the pipeline into a plain
+    dict, so inference does not need pandas or ColumnTransformer.
+    """
+    preprocessor = pipeline.named_steps['preprocessor']
+    spec = {'numeric': [], 'categorical': []}
+
+    for name, transformer, columns in preprocessor.transformers_:
+        if transformer == 'drop' or name == 'remainder':
+            continue
+        if name == 'num':
+            center = transformer.center_ if transformer.center_ is not None else np.zeros(len(columns))
+            scale = transformer.scale_ if transformer.scale_ is not None else np.ones(len(columns))
+            for col, c, s in zip(columns, center, scale):
+                spec['numeric'].append({'name': col, 'center': float(c), 'scale': float(s)})
+        elif name == 'cat' and not hasattr(transformer, 'drop_idx_'):
+            # OrdinalEncoder: one column of category codes per feature
+            for col, categories in zip(columns, transformer.categories_):
+                spec['categorical'].append({'name': col, 'categories': [str(c) for c in categories],
+                                            'encoding': 'ordinal'})
+        elif name == 'cat':
+            if transformer.drop_idx_ is not None:
+                raise ValueError("Fast path does not support OneHotEncoder(drop=...)")
+            for col, categories in zip(columns, transformer.categories_):
+                spec['categorical'].append({'name': col, 'categories': [str(c) for c in categories]})
+        else:
+            raise ValueError(f"Fast path does not know how to compile transformer '{name}'")
+
+    return spec
+
+
+class FastPathPredictor:
+    """
+    Compiled replacement for pipeline.predict_proba on the serving path.
+
+    The numeric columns are scaled with the fitted center/scale, and every
+    (column, category) pair is resolved to its one-hot output index through a
+    precomputed lookup table. Rows are written straight into a float32 matrix
+    and handed to the XGBoost booster with inplace_predict. Ordinal-encoded
+    features (native categorical models) take a single column holding the
+    category code, with NaN (missing) for unknown values.
+    """
+
+    def __init__(self, spec, booster, iteration_range=(0, 0)):
+        self.spec = spec
+        self.booster = booster
+        self.iteration_range = iteration_range
+
+        self.numeric_names = [f['name'] for f in spec['numeric']]
+        self.center = np.array([f['center'] for f in spec['numeric']], dtype=np.float64)
+        self.scale = np.array([f['scale'] for f in spec['numeric']], dtype=np.float64)
+
+        # Lookup tables: category value -> output column index (one-hot),
+        # or category value -> code with the feature's column in code_columns (ordinal)
+        self.categorical_names = []
+        self.lookup = []
+        self.code_columns = []
+        self.blocks = []  # (first, last + 1) output columns of each categorical feature
+        offset = len(self.numeric_names)
+        for feature in spec['categorical']:
+            self.categorical_names.append(feature['name'])
+            if feature.get('encoding') == 'ordinal':
+                self.lookup.append({cat: float(j) for j, cat in enumerate(feature['categories'])})
+                self.code_columns.append(offset)
+                width = 1
+            else:
+                self.lookup.append({cat: offset + j for j, cat in enumerate(feature['categories'])})
+                self.code_columns.append(None)
+                width = len(feature['categories'])
+            self.blocks.append((offset, offset + width))
+            offset += width
+        self.n_features = offset
+        self._numeric_position = {name: j for j, name in enumerate(self.numeric_names)}
+        self._categorical_position = {name: k for k, name in enumerate(self.categorical_names)}
+
+        # Preallocated single-trade row, one per thread (handlers run in a threadpool)
+        self._local = threading.local()
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        classifier = pipeline.named_steps['classifier']
+        booster = classifier.get_booster()
+        # Mirror XGBClassifier.predict_proba: respect early-stopping's best iteration
+        best_iteration = getattr(classifier, 'best_iteration', None)
+        iteration_range = (0, best_iteration + 1) if best_iteration is not None else (0, 0)
+        return cls(extract_preprocessor_spec(pipeline), booster, iteration_range)
+
+    # --- Encoding ---
+    def _row_buffer(self):
+        row = getattr(self._local, 'row', None)
+        if row is None:
+            row = np.zeros((1, self.n_features), dtype=np.float32)
+            self._local.row = row
+        return row
+
+    def encode_one(self, record):
+        """Encodes a single trade dict into the thread's preallocated row."""
+        row = self._row_buffer()
+        row.fill(0.0)
+        out = row[0]
+        for j, name in enumerate(self.numeric_names):
+            out[j] = (float(record[name]) - self.center[j]) / self.scale[j]
+        for name, table, column in zip(self.categorical_names, self.lookup, self.code_columns):
+            idx = table.get(str(record[name]))
+            if column is not None:
+                out[column] = np.nan if idx is None else idx
+            elif idx is not None:  # unknown category -> all zeros (handle_unknown='ignore')
+                out[idx] = 1.0
+        return row
+
+    def encode_columns(self, columns, n_rows, coded=None):
+        """
+        Encodes a batch given as column name -> sequence (dict of lists, DataFrame, ...).
+        `coded` maps categorical names to (codes, categories) pairs for dictionary-encoded
+        batches; those are resolved once per category instead of once per row.
+        """
+        X = np.zeros((n_rows, self.n_features), dtype=np.float32)
+        if n_rows == 0:
+            return X
+        numeric = [np.asarray(columns[name]) for name in self.numeric_names]
+        # Same arithmetic as RobustScaler.transform: float32 columns (columnar datasets) are
+        # centered in float32 before the division, so the split thresholds see identical values
+        work = np.float32 if np.result_type(*numeric, np.float32) == np.float32 else np.float64
+        numeric = np.column_stack(numeric).astype(work)
+        numeric -= self.center.astype(work)
+        numeric /= self.scale
+        X[:, :len(self.numeric_names)] = numeric
+
+        rows = np.arange(n_rows)
+        coded = coded or {}
+        for name, table, column in zip(self.categorical_names, self.lookup, self.code_columns):
+            if name in coded:
+                codes, categories = coded[name]
+                # Per-category translation table; the trailing entry catches code -1 (null -> unknown)
+                if column is not None:
+                    remap = np.array([table.get(str(c), np.nan) for c in categories] + [np.nan], dtype=np.float32)
+                    X[:, column] = remap[codes]
+                    continue
+                remap = np.array([table.get(str(c), -1) for c in categories] + [-1], dtype=np.int64)
+                idx = remap[codes]
+            elif column is not None:
+                X[:, column] = np.fromiter((table.get(str(v), np.nan) for v in columns[name]),
+                                           dtype=np.float32, count=n_rows)
+                continue
+            else:
+                idx = np.fromiter((table.get(str(v), -1) for v in columns[name]), dtype=np.int64, count=n_rows)
+            known = idx >= 0
+            X[rows[known], idx[known]] = 1.0
+        return X
+
+    def apply_change(self, out, name, value):
+        """
+        Overwrites one feature of an encoded row in place: the scaled value of a
+        numeric column, the code of an ordinal column, or the one-hot block of a
+        categorical (cleared, then the new category set). Non-model fields are ignored.
+        """
+        j = self._numeric_position.get(name)
+        if j is not None:
+            out[j] = (float(value) - self.center[j]) / self.scale[j]
+            return
+        k = self._categorical_position.get(name)
+        if k is None:
+            return
+        idx = self.lookup[k].get(str(value))
+        column = self.code_columns[k]
+        if column is not None:
+            out[column] = np.nan if idx is None else idx
+            return
+        first, stop = self.blocks[k]
+        out[first:stop] = 0.0
+        if idx is not None:
+            out[idx] = 1.0
+
+    def encode_variants(self, base, variants):
+        """
+        What-if matrix: row 0 is the encoded base trade, row i + 1 the base with
+        variants[i] ({field: new value}) applied as a delta on the encoded row.
+        The base is encoded once; each variant only touches the columns it changes.
+        """
+        X = np.repeat(self.encode_one(base), len(variants) + 1, axis=0)
+        for out, changes in zip(X[1:], variants):
+            for name, value in changes.items():
+                self.apply_change(out, name, value)
+        return X
+
+    def encode_records(self, records):
+        columns = {name: [r[name] for r in records] for name in self.numeric_names + self.categorical_names}
+        return self.encode_columns(columns, len(records))
+
+    def encode_frame(self, df):
+        return self.encode_columns(df, len(df))
+
+    # --- Scoring ---
+    def predict_proba(self, X):
+        """Failure probability (class 1) for an already-encoded matrix."""
+        return self.booster.inplace_predict(X, iteration_range=self.iteration_range)
+
+    def predict_one(self, record):
+        return float(self.predict_proba(self.encode_one(record))[0])
+
+    def predict_records(self, records):
+        return self.predict_proba(self.encode_records(records))
@@ -0,0 +1,322 @@
+import warnings
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+# Trade-time features shared by the generator, the trainer and both services, so every
+# side derives Trade_Day / Trade_Hour / Settlement_Date from a timestamp the same way
+
+DAY_NAMES = np.array(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'], dtype=object)
+# Standard settlement cycle (T+2 business days)
+SETTLEMENT_LAG = 2
+
+# Span of the precomputed calendar; trade dates outside it are rejected
+CALENDAR_START = date(2000, 1, 1)
+CALENDAR_END = date(2040, 12, 31)
+# Slack past CALENDAR_END so T+n of the last trade dates still resolves
+_CALENDAR_SLACK_DAYS = 60
+
+_EPOCH_WEEKDAY = 3  # 1970-01-01 was a Thursday (Monday = 0)
+
+
+# --- Holiday rules (main market closures per settlement currency) ---
+def _nth_weekday(year, month, weekday, n):
+    """n-th `weekday` (Monday = 0) of the month; n = -1 is the last one."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = (date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1))
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year):
+    # Anonymous Gregorian algorithm
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    return date(year, month, (h + l - 7 * m + 114) % 31 + 1)
+
+
+def _nearest_weekday(day):
+    # US convention: Saturday holidays are observed on Friday, Sunday ones on Monday
+    return day - timedelta(days=1) if day.weekday() == 5 else day + timedelta(days=1) if day.weekday() == 6 else day
+
+
+def _substitute(days):
+    # UK / Canada / Japan convention: a weekend holiday moves to the next free weekday
+    observed = set()
+    for day in sorted(days):
+        while day.weekday() >= 5 or day in observed:
+            day += timedelta(days=1)
+        observed.add(day)
+    return observed
+
+
+def _usd_holidays(year):
+    # Federal Reserve holiday schedule
+    new_year = date(year, 1, 1)
+    days = [
+        # Sunday -> Monday, but a Saturday New Year's Day is not observed (Dec 31 closes the prior year's books)
+        new_year + timedelta(days=1) if new_year.weekday() == 6 else new_year,
+        _nth_weekday(year, 1, 0, 3),   # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),   # Washington's Birthday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _nearest_weekday(date(year, 7, 4)),
+        _nth_weekday(year, 9, 0, 1),   # Labor Day
+        _nth_weekday(year, 10, 0, 2),  # Columbus Day
+        _nearest_weekday(date(year, 11, 11)),
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _nearest_weekday(date(year, 12, 25)),
+    ]
+    if year >= 2022:
+        days.append(_nearest_weekday(date(year, 6, 19)))  # Juneteenth, first observed by the Fed in 2022
+    return set(days)
+
+
+def _eur_holidays(year):
+    # TARGET2 closing days
+    easter = _easter(year)
+    return {date(year, 1, 1), easter - timedelta(days=2), easter + timedelta(days=1),
+            date(year, 5, 1), date(year, 12, 25), date(year, 12, 26)}
+
+
+def _gbp_holidays(year):
+    # England & Wales bank holidays
+    easter = _easter(year)
+    return _substitute([date(year, 1, 1), date(year, 12, 25), date(year, 12, 26)]) | {
+        easter - timedelta(days=2),
+        easter + timedelta(days=1),
+        _nth_weekday(year, 5, 0, 1),   # Early May
+        _nth_weekday(year, 5, 0, -1),  # Spring
+        _nth_weekday(year, 8, 0, -1),  # Summer
+    }
+
+
+def _jpy_holidays(year):
+    # Tokyo bank holidays; equinox days from the usual 1980-2099 approximation
+    shift = 0.242194 * (year - 1980) - (year - 1980) // 4
+    fixed = [date(year, 1, 1), date(year, 2, 11), date(year, 3, int(20.8431 + shift)), date(year, 4, 29),
+             date(year, 5, 3), date(year, 5, 4), date(year, 5, 5), date(year, 8, 11),
+             date(year, 9, int(23.2488 + shift)), date(year, 11, 3), date(year, 11, 23)]
+    if year >= 2020:
+        fixed.append(date(year, 2, 23))  # Emperor's Birthday
+    return _substitute(fixed) | {
+        date(year, 1, 2), date(year, 1, 3), date(year, 12, 31),  # bank year-end closure
+        _nth_weekday(year, 1, 0, 2),   # Coming of Age Day
+        _nth_weekday(year, 7, 0, 3),   # Marine Day
+        _nth_weekday(year, 9, 0, 3),   # Respect for the Aged Day
+        _nth_weekday(year, 10, 0, 2),  # Sports Day
+    }
+
+
+def _cad_holidays(year):
+    # Canadian bank holidays
+    fixed = [date(year, 1, 1), date(year, 7, 1), date(year, 11, 11), date(year, 12, 25), date(year, 12, 26)]
+    if year >= 2021:
+        fixed.append(date(year, 9, 30))  # National Day for Truth and Reconciliation
+    may_24 = date(year, 5, 24)
+    return _substitute(fixed) | {
+        _easter(year) - timedelta(days=2),
+        may_24 - timedelta(days=may_24.weekday()),  # Victoria Day: Monday on or before May 24
+        _nth_weekday(year, 9, 0, 1),   # Labour Day
+        _nth_weekday(year, 10, 0, 2),  # Thanksgiving
+    }
+
+
+HOLIDAY_RULES = {
+    'USD': _usd_holidays,
+    'EUR': _eur_holidays,
+    'GBP': _gbp_holidays,
+    'JPY': _jpy_holidays,
+    'CAD': _cad_holidays,
+}
+
+
+class SettlementCalendar:
+    """
+    Per-currency business-day tables over a fixed date range.
+
+    Days are numbered from `start`. For every currency (plus a weekends-only
+    row for currencies without holiday rules) two arrays are precomputed:
+    the running count of business days up to each day, and the list of
+    business days. The n-th business day after day d is then
+    business_days[count[d] + n - 1]: two array lookups per trade, vectorized
+    over a batch, whatever the gap to the next business day.
+    """
+
+    def __init__(self, start=CALENDAR_START, end=CALENDAR_END, holiday_rules=None):
+        holiday_rules = HOLIDAY_RULES if holiday_rules is None else holiday_rules
+        self.first_day = start
+        self.start = np.datetime64(start, 'D')
+        self.end = np.datetime64(end, 'D')
+        n_days = (end - start).days + 1 + _CALENDAR_SLACK_DAYS
+        days = self.start + np.arange(n_days)
+        weekday = (days.astype(np.int64) + _EPOCH_WEEKDAY) % 7
+        self.date_strings = np.datetime_as_string(days).astype(object)
+
+        self.currencies = list(holiday_rules)
+        self.index = {currency: i for i, currency in enumerate(self.currencies)}
+        self.default = len(self.currencies)  # weekends-only row
+        years = range(start.year, end.year + 2)
+        business = np.tile(weekday < 5, (len(self.currencies) + 1, 1))
+        for i, currency in enumerate(self.currencies):
+            holidays = np.array(sorted(d for y in years for d in holiday_rules[currency](y)), dtype='datetime64[D]')
+            offsets = (holidays - self.start).astype(np.int64)
+            business[i, offsets[(offsets >= 0) & (offsets < n_days)]] = False
+
+        self.business_count = np.cumsum(business, axis=1, dtype=np.int32)
+        # Business days per row, padded with the last day so out-of-range lookups stay in bounds
+        self.business_days = np.full((len(business), int(business.sum(axis=1).max())), n_days - 1, dtype=np.int32)
+        for i, row in enumerate(business):
+            days_i = np.flatnonzero(row)
+            self.business_days[i, :len(days_i)] = days_i
+        self.n_days = (end - start).days + 1
+
+    def currency_codes(self, currencies):
+        """Row index per trade; one comparison pass per known currency instead of a dict lookup per trade."""
+        currencies = np.asarray(currencies, dtype=object)
+        codes = np.full(len(currencies), self.default, dtype=np.intp)
+        for currency, i in self.index.items():
+            codes[currencies == currency] = i
+        return codes
+
+    def day_numbers(self, days):
+        """Calendar day numbers for datetime64 values; -1 where outside the calendar (or NaT)."""
+        numbers = (np.asarray(days, dtype='datetime64[D]') - self.start).astype(np.int64)
+        return np.where((numbers >= 0) & (numbers < self.n_days), numbers, -1)
+
+    def add_business_days(self, day_numbers, codes, n=SETTLEMENT_LAG):
+        """Day numbers n business days after each day (codes from currency_codes)."""
+        return self.business_days[codes, self.business_count[codes, day_numbers] + n - 1]
+
+    def is_business_day(self, day_numbers, codes):
+        previous = np.where(day_numbers > 0, self.business_count[codes, np.maximum(day_numbers - 1, 0)], 0)
+        return self.business_count[codes, day_numbers] > previous
+
+    def settlement_dates(self, days, currencies, n=SETTLEMENT_LAG):
+        """ISO settlement date strings for trade dates (datetime64) and currencies, vectorized."""
+        numbers = self.day_numbers(days)
+        if (numbers < 0).any():
+            raise ValueError(f"Trade dates outside the settlement calendar ({self.start} .. {self.end})")
+        return self.date_strings[self.add_business_days(numbers, self.currency_codes(currencies), n)]
+
+
+_default_calendar = None
+
+
+def default_calendar():
+    """The process-wide calendar, built on first use (a few ms)."""
+    global _default_calendar
+    if _default_calendar is None:
+        _default_calendar = SettlementCalendar()
+    return _default_calendar
+
+
+# --- Timestamp parsing ---
+def _to_datetime(value):
+    # Wall-clock time as booked: an explicit offset or Z is dropped, not converted. None if unparseable
+    if isinstance(value, np.datetime64):
+        return None if np.isnat(value) else value.astype('datetime64[s]').item()
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, bytes):
+        value = value.decode()
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if value[-1:] in ('Z', 'z'):
+        value = value[:-1] + '+00:00'  # fromisoformat only takes Z from Python 3.11 (JS toISOString sends it)
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def parse_timestamps(values):
+    """
+    datetime64[s] array for a batch of ISO-8601 timestamps (strings, bytes,
+    datetimes or datetime64), NaT where a value does not parse. Plain ISO
+    strings go through numpy's parser in one call; batches with offsets, a
+    trailing Z or other oddities fall back to _to_datetime per value.
+    """
+    if isinstance(values, np.ndarray) and values.dtype.kind == 'M':
+        return values.astype('datetime64[s]')
+    values = np.asarray(values, dtype=object if not isinstance(values, np.ndarray) else None)
+    if values.dtype.kind == 'S':
+        values = np.char.decode(values, 'utf-8')
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')  # numpy warns (and converts to UTC) on timezone offsets
+            return np.array(values, dtype='datetime64[s]')
+    except (ValueError, TypeError, UserWarning, DeprecationWarning):
+        parsed = (_to_datetime(v) for v in values)
+        return np.array([np.datetime64('NaT') if p is None else p for p in parsed], dtype='datetime64[s]')
+
+
+# --- Derivation ---
+def derive_trade_features(trade_dates, currencies=None, lag=SETTLEMENT_LAG, calendar=None):
+    """
+    Trade_Day, Trade_Hour and (with currencies) Settlement_Date for a whole
+    batch of trade timestamps, as arrays, plus an `invalid` mask for values
+    that do not parse or fall outside the calendar (their features are
+    placeholders). One parse per batch, table lookups for everything else.
+    """
+    calendar = calendar or default_calendar()
+    stamps = parse_timestamps(trade_dates)
+    seconds = stamps.astype(np.int64)
+    numbers = calendar.day_numbers(stamps)
+    invalid = np.isnat(stamps) | (numbers < 0)
+    numbers[invalid] = 0
+    seconds[invalid] = 0
+    epoch_days = seconds // 86400
+    out = {
+        'Trade_Day': DAY_NAMES[(epoch_days + _EPOCH_WEEKDAY) % 7],
+        'Trade_Hour': (seconds - epoch_days * 86400) // 3600,
+        'invalid': invalid,
+    }
+    if currencies is not None:
+        settled = calendar.add_business_days(numbers, calendar.currency_codes(currencies), lag)
+        out['Settlement_Date'] = calendar.date_strings[settled]
+    return out
+
+
+def derive_one(trade_date, currency=None, lag=SETTLEMENT_LAG, calendar=None):
+    """Scalar version for a single trade: {Trade_Day, Trade_Hour[, Settlement_Date]}; ValueError if invalid."""
+    calendar = calendar or default_calendar()
+    moment = _to_datetime(trade_date)
+    number = (moment.date() - calendar.first_day).days if moment is not None else -1
+    if not 0 <= number < calendar.n_days:
+        raise ValueError(f"Unparseable or out-of-range trade timestamp: {trade_date!r}")
+    features = {'Trade_Day': DAY_NAMES[moment.weekday()], 'Trade_Hour': moment.hour}
+    if currency is not None:
+        code = calendar.index.get(currency, calendar.default)
+        features['Settlement_Date'] = calendar.date_strings[
+            calendar.business_days[code, calendar.business_count[code, number] + lag - 1]]
+    return features
+
+
+def add_trade_features(df, lag=SETTLEMENT_LAG, calendar=None):
+    """
+    Fills Trade_Day / Trade_Hour (and Settlement_Date when Currency is there)
+    from Trade_Date on a DataFrame that lacks them, e.g. a booking-system
+    export with raw timestamps only. Columns already present are kept.
+    """
+    missing = [c for c in ('Trade_Day', 'Trade_Hour', 'Settlement_Date') if c not in df.columns]
+    if not missing or 'Trade_Date' not in df.columns:
+        return df
+    derived = derive_trade_features(df['Trade_Date'].to_numpy(),
+                                    df['Currency'].to_numpy() if 'Currency' in df.columns else None, lag, calendar)
+    if derived['invalid'].any():
+        raise ValueError(f"{int(derived['invalid'].sum())} unparseable or out-of-range Trade_Date values")
+    df = df.copy()
+    for column in missing:
+        if column in derived:
+            df[column] = derived[column]
+    return df
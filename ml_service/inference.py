@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from pydantic import BaseModel
 import logging
 
@@ -18,11 +18,23 @@ import joblib
 import pandas as pd
 import shap
 import os
+from fast_path import FastPathPredictor
+from features import derive_one
+from metrics import Metrics, TimingMiddleware
 
 # Load Artifacts at Startup
 MODEL_PATH = "model/model.joblib"
 EXPLAINER_PATH = "model/shap_explainer.joblib"
 FEATURE_NAMES_PATH = "model/feature_names.joblib"
+# Compiled preprocessor + booster.inplace_predict (set FAST_PATH=0 to go through the sklearn pipeline)
+FAST_PATH_ENABLED = os.getenv("FAST_PATH", "1") != "0"
+# Stage timers on a sample of requests (/metrics); Server-Timing header: request | always | off
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "1.0"))
+METRICS_TIMING_HEADER = os.getenv("METRICS_TIMING_HEADER", "request")
+
+metrics = Metrics("ml_inference", METRICS_SAMPLE_RATE)
+metrics.counter("errors_total", "Errors, by stage")
+app.add_middleware(TimingMiddleware, metrics=metrics, timing_header=METRICS_TIMING_HEADER)
 
 print("Loading model artifacts...")
 try:
@@ -38,11 +50,23 @@ except Exception as e:
     print(f"Error loading model: {e}")
     pipeline = None
 
+fast_path = None
+if pipeline is not None and FAST_PATH_ENABLED:
+    try:
+        fast_path = FastPathPredictor.from_pipeline(pipeline)
+        print(f"Fast path compiled ({fast_path.n_features} features).")
+    except Exception as e:
+        print(f"Fast path disabled: {e}")
+
 @app.get("/health")
 def health_check():
     status = "healthy" if pipeline else "degraded"
     return {"status": status, "service": "ml-inference"}
 
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 class PredictionRequest(BaseModel):
     # We need all features used in training
     Trade_ID: str
@@ -58,32 +82,48 @@ class PredictionRequest(BaseModel):
     Operation_Type: str
     Currency: str
     Notional_Amount_USD: float
-    # Derived features like Trade_Hour/Day need to be computed
+    # Derived features (Trade_Day, Trade_Hour) are computed from Trade_Date by the shared features module
 
 @app.post("/predict")
 def predict_trade(trade: PredictionRequest):
     if not pipeline:
         raise HTTPException(status_code=503, detail="Model not loaded")
 
+    metrics.checkpoint("validate")
+
     # 1. Prepare Data
-    # Convert incoming JSON to DataFrame
     input_data = trade.dict()
-    df = pd.DataFrame([input_data])
-    
+
     # 2. Feature Engineering (Must match training!)
-    # Parse Dates to get Hour/Day
-    dt_obj = pd.to_datetime(df['Trade_Date'])
-    df['Trade_Day'] = dt_obj.dt.day_name()
-    df['Trade_Hour'] = dt_obj.dt.hour
-    
-    # ensure numeric types
-    df['Notional_Amount_USD'] = pd.to_numeric(df['Notional_Amount_USD'])
-    df['Market_Volatility_Index'] = pd.to_numeric(df['Market_Volatility_Index'])
+    # Same derivation as the generator and the trainer; the client's Settlement_Date is kept as sent
+    with metrics.stage("features"):
+        try:
+            input_data.update(derive_one(input_data['Trade_Date']))
+        except ValueError as e:
+            metrics.inc("errors_total", stage="features")
+            raise HTTPException(status_code=422, detail=str(e))
 
     # 3. Predict
     try:
-        probability = pipeline.predict_proba(df)[0][1] # Probability of Class 1 (Fail)
-        prediction = pipeline.predict(df)[0] # 0 or 1
+        if fast_path is not None:
+            # Compiled encoder straight into the booster, no DataFrame round trip
+            with metrics.stage("encode"):
+                X = fast_path.encode_one(input_data)
+            with metrics.stage("predict"):
+                probability = float(fast_path.predict_proba(X)[0])
+        else:
+            # Convert incoming JSON to DataFrame
+            with metrics.stage("dataframe"):
+                df = pd.DataFrame([input_data])
+                # ensure numeric types
+                df['Notional_Amount_USD'] = pd.to_numeric(df['Notional_Amount_USD'])
+                df['Market_Volatility_Index'] = pd.to_numeric(df['Market_Volatility_Index'])
+            # Same as pipeline.predict_proba (SMOTE only runs at fit time), one stage per step
+            with metrics.stage("transform"):
+                X = pipeline.named_steps['preprocessor'].transform(df)
+            with metrics.stage("predict"):
+                probability = pipeline.named_steps['classifier'].predict_proba(X)[0][1] # Probability of Class 1 (Fail)
+        prediction = int(probability > 0.5) # 0 or 1, same threshold as pipeline.predict
         
         # 4. Explain (SHAP) - Simplified
         # We can implement full SHAP later, for now let's just return key drivers based on logic or partial SHAP
@@ -93,11 +133,11 @@ def predict_trade(trade: PredictionRequest):
         return {
             "trade_id": trade.Trade_ID,
             "probability": float(probability),
-            "prediction": int(prediction),
+            "prediction": prediction,
             "risk_level": "CRITICAL" if probability > 0.8 else "HIGH" if probability > 0.5 else "LOW",
             "model_version": "v1.0.0"
         }
     except Exception as e:
+        metrics.inc("errors_total", stage="predict")
         logger.error(f"Prediction error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-
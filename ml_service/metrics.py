@@ -0,0 +1,273 @@
+import bisect
+import contextvars
+import random
+import threading
+import time
+
+# Latency buckets in seconds (upper bounds; +Inf is implicit), 100us .. 10s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Rows per scoring call
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384, 65536)
+
+# Timing of the HTTP request being handled (None outside a request, e.g. on the micro-batcher thread).
+# run_in_threadpool copies the context, so stages timed in handler threads land on the right request.
+_current_request = contextvars.ContextVar("request_timing", default=None)
+
+
+class Histogram:
+    """Fixed-bucket histogram: bisect into the bucket, then one locked increment."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def drain(self):
+        # Snapshot and reset in one step (deltas shipped from another process)
+        with self._lock:
+            snapshot = self.counts, self.sum, self.count
+            self.counts, self.sum, self.count = [0] * len(self.counts), 0.0, 0
+        return snapshot
+
+    def merge(self, counts, total, count):
+        with self._lock:
+            self.counts = [a + b for a, b in zip(self.counts, counts)]
+            self.sum += total
+            self.count += count
+
+
+class RequestTiming:
+    """Per-request stage breakdown, rendered as a Server-Timing header."""
+
+    __slots__ = ("start", "sampled", "stages")
+
+    def __init__(self, sampled):
+        self.start = time.perf_counter()
+        self.sampled = sampled
+        self.stages = []  # (name, seconds) in completion order
+
+    def header(self):
+        total = time.perf_counter() - self.start
+        parts = [f"{name};dur={seconds * 1000.0:.3f}" for name, seconds in self.stages]
+        parts.append(f"total;dur={total * 1000.0:.3f}")
+        return ", ".join(parts)
+
+
+class _Stage:
+    __slots__ = ("metrics", "name", "timing", "start")
+
+    def __init__(self, metrics, name, timing):
+        self.metrics, self.name, self.timing = metrics, name, timing
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.metrics._stage_histogram(self.name).observe(elapsed)
+        if self.timing is not None:
+            self.timing.stages.append((self.name, elapsed))
+        return False
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+class Metrics:
+    """
+    In-process counters and histograms with Prometheus text exposition.
+
+    Counters are always exact. Timers are sampled: an HTTP request is sampled
+    (all of its stages, or none) with probability sample_rate, and stages
+    outside a request (micro-batcher thread, stream sessions) are sampled one
+    call at a time. An unsampled stage costs one context-variable read and a
+    random() call; sample_rate=0 turns timing off entirely.
+    """
+
+    def __init__(self, namespace, sample_rate=1.0):
+        self.namespace = namespace
+        self.sample_rate = min(1.0, max(0.0, float(sample_rate)))
+        self._families = {}  # name -> (type, help, buckets)
+        self._series = {}  # (name, labels) -> int (counter) or Histogram
+        self._stages = {}  # stage name -> its stage_seconds Histogram (skips the label key on the hot path)
+        self._lock = threading.Lock()
+        self.histogram("stage_seconds", "Time spent per scoring stage", LATENCY_BUCKETS)
+
+    # --- Registration ---
+    def counter(self, name, help_text):
+        self._families[name] = ("counter", help_text, None)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self._families[name] = ("histogram", help_text, tuple(buckets))
+
+    # --- Recording ---
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + value
+
+    def _histogram(self, name, labels):
+        key = (name, labels)
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(key, Histogram(self._families[name][2]))
+        return series
+
+    def observe(self, name, value, **labels):
+        self._histogram(name, tuple(sorted(labels.items()))).observe(value)
+
+    def _stage_histogram(self, name):
+        histogram = self._stages.get(name)
+        if histogram is None:
+            histogram = self._stages[name] = self._histogram("stage_seconds", (("stage", name),))
+        return histogram
+
+    def sampled(self):
+        return self.sample_rate >= 1.0 or (self.sample_rate > 0.0 and random.random() < self.sample_rate)
+
+    def stage(self, name):
+        """Context manager timing one stage of the current request (or of a background call)."""
+        timing = _current_request.get()
+        if timing is None:
+            return _Stage(self, name, None) if self.sampled() else _NO_STAGE
+        return _Stage(self, name, timing) if timing.sampled else _NO_STAGE
+
+    def checkpoint(self, name):
+        """Records the time since the request started as a stage (e.g. body parsing + validation)."""
+        timing = _current_request.get()
+        if timing is not None and timing.sampled:
+            elapsed = time.perf_counter() - timing.start
+            self._stage_histogram(name).observe(elapsed)
+            timing.stages.append((name, elapsed))
+
+    # --- Shipping between processes (inference pool workers -> gateway) ---
+    def drain(self):
+        """Everything recorded since the last drain, as {(name, labels): delta}; the series restart at zero."""
+        deltas, histograms = {}, []
+        with self._lock:
+            for key, value in self._series.items():
+                if isinstance(value, Histogram):
+                    histograms.append((key, value))
+                elif value:
+                    deltas[key] = value
+                    self._series[key] = 0
+        for key, histogram in histograms:
+            snapshot = histogram.drain()
+            if snapshot[2]:
+                deltas[key] = snapshot
+        return deltas
+
+    def merge(self, deltas):
+        """Adds the output of another process's drain() to this registry."""
+        for (name, labels), value in deltas.items():
+            if isinstance(value, tuple):
+                self._histogram(name, labels).merge(*value)
+            else:
+                with self._lock:
+                    self._series[(name, labels)] = self._series.get((name, labels), 0) + value
+
+    # --- Exposition ---
+    def render(self):
+        """Prometheus text format (version 0.0.4)."""
+        with self._lock:
+            series = sorted(self._series.items(), key=lambda item: item[0])
+        lines, seen = [], set()
+        for (name, labels), value in series:
+            kind, help_text, buckets = self._families[name]
+            full_name = f"{self.namespace}_{name}"
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {kind}")
+            if kind == "counter":
+                lines.append(f"{full_name}{_labels(labels)} {value}")
+                continue
+            counts, total, count = value.snapshot()
+            cumulative = 0
+            for bound, n in zip(buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f"{full_name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{full_name}_sum{_labels(labels)} {total!r}")
+            lines.append(f"{full_name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class TimingMiddleware:
+    """
+    Pure ASGI middleware (no response buffering, streaming bodies pass through):
+    starts the per-request timing, counts requests by route/method/status,
+    observes the request latency, and adds a Server-Timing header with the
+    stage breakdown when `timing_header` is "always", or "request" and the
+    client sent X-Debug-Timing: 1. A debug request is always sampled.
+    """
+
+    def __init__(self, app, metrics, timing_header="request"):
+        self.app = app
+        self.metrics = metrics
+        self.timing_header = timing_header
+        metrics.counter("http_requests_total", "HTTP requests by route, method and status")
+        metrics.histogram("http_request_seconds", "HTTP request latency by route", LATENCY_BUCKETS)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        debug = self.timing_header == "always" or (
+            self.timing_header == "request" and (b"x-debug-timing", b"1") in scope.get("headers", ()))
+        timing = RequestTiming(debug or self.metrics.sampled())
+        token = _current_request.set(timing)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if debug:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timing.header().encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_request.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            self.metrics.inc("http_requests_total", route=path, method=scope["method"], status=str(status))
+            if timing.sampled:
+                self.metrics.observe("http_request_seconds", time.perf_counter() - timing.start, route=path)
@@ -1,15 +1,116 @@
+import argparse
+import io
+import itertools
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import multiprocessing
+import numpy as np
 import pandas as pd
 import xgboost as xgb
 import shap
 import joblib
 import os
 import json
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import train_test_split, StratifiedKFold
+from sklearn.base import clone
 from sklearn.metrics import recall_score, precision_score, f1_score, classification_report
-from sklearn.preprocessing import OneHotEncoder, StandardScaler, RobustScaler
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, StandardScaler, RobustScaler
 from sklearn.compose import ColumnTransformer
 from imblearn.over_sampling import SMOTE
 from imblearn.pipeline import Pipeline as ImbPipeline
+from columnar import load_dataset, iter_dataset, dataset_columns
+from fast_path import FastPathPredictor
+import cascade
+import drift
+import features
+from bundle import write_bundle, BUNDLE_DIR
+
+# Define features based on Data Generator
+CATEGORICAL_FEATURES = ['Asset_Class', 'Counterparty_Rating', 'SSI_Status', 'Liquidity_Score', 'Custodian_Location', 'Operation_Type', 'Currency', 'Trade_Day']
+NUMERIC_FEATURES = ['Notional_Amount_USD', 'Market_Volatility_Index', 'Trade_Hour']
+TARGET = 'IS_FAILED'
+
+# Pipeline variants: train_model.py --variant / --compare
+VARIANTS = ('onehot', 'categorical')
+
+
+def source_columns(data_path, columns):
+    """
+    Columns to read for `columns`: datasets that carry only raw Trade_Date
+    timestamps (booking-system exports) get the trade-time features derived
+    by features.add_trade_features instead.
+    """
+    available = set(dataset_columns(data_path))
+    derived = [c for c in ('Trade_Day', 'Trade_Hour') if c in columns and c not in available]
+    if not derived:
+        return list(columns)
+    if 'Trade_Date' not in available:
+        raise KeyError(f"Dataset has neither {derived} nor Trade_Date to derive them from")
+    return [c for c in columns if c not in derived] + ['Trade_Date']
+
+
+def read_training_data(data_path, columns, chunk_size=None):
+    """load_dataset / iter_dataset (with chunk_size) restricted to `columns`, deriving trade-time features if needed."""
+    source = source_columns(data_path, columns)
+    if chunk_size is None:
+        return features.add_trade_features(load_dataset(data_path, columns=source))[columns]
+    return (features.add_trade_features(chunk)[columns] for chunk in iter_dataset(data_path, source, chunk_size))
+
+
+def imbalance_weight(n_neg, n_pos):
+    """scale_pos_weight with the same target as SMOTE(sampling_strategy=0.5): minority at half the majority."""
+    return 0.5 * n_neg / n_pos
+
+
+def chunk_split_mask(y, chunk_index, test_size=0.2, seed=42):
+    """
+    Stratified test mask for one chunk. The seed depends only on the chunk
+    index, so every pass over the data puts the same rows in the test split.
+    """
+    rng = np.random.default_rng([seed, chunk_index])
+    mask = np.zeros(len(y), dtype=bool)
+    for label in (0, 1):
+        idx = np.flatnonzero(y == label)
+        mask[rng.choice(idx, int(round(len(idx) * test_size)), replace=False)] = True
+    return mask
+
+
+class ChunkedTradeIter(xgb.DataIter):
+    """
+    Feeds XGBoost the training split one encoded chunk at a time.
+
+    QuantileDMatrix walks the iterator more than once (sketching, then
+    building the quantized pages), so reset() simply restarts the stream.
+    Only the current chunk is ever held as floats.
+    """
+
+    def __init__(self, data_path, preprocessor, chunk_size, test_size=0.2, seed=42, cache_prefix=None):
+        super().__init__(cache_prefix=cache_prefix)
+        self.data_path = data_path
+        self.preprocessor = preprocessor
+        self.chunk_size = chunk_size
+        self.test_size = test_size
+        self.seed = seed
+        self._chunks = None
+
+    def reset(self):
+        self._chunks = None
+
+    def next(self, input_data):
+        if self._chunks is None:
+            self._chunks = enumerate(read_training_data(self.data_path, NUMERIC_FEATURES + CATEGORICAL_FEATURES + [TARGET],
+                                                        self.chunk_size))
+        try:
+            i, chunk = next(self._chunks)
+        except StopIteration:
+            return False
+        y = chunk[TARGET].to_numpy()
+        train = ~chunk_split_mask(y, i, self.test_size, self.seed)
+        X = self.preprocessor.transform(chunk.loc[train, NUMERIC_FEATURES + CATEGORICAL_FEATURES])
+        input_data(data=X.astype(np.float32), label=y[train])
+        return True
+
 
 class SettlementPredictor:
     def __init__(self):
@@ -17,13 +118,15 @@ class SettlementPredictor:
         self.pipeline = None
         self.explainer = None
         self.feature_names = None
+        self.cascade = None
+        self.drift_reference = None
         
     def build_pipeline(self):
         # Define features based on Data Generator
         # Numerical: Amount, Volatility. (Hour/Day converted to cat or num? Training as num usually fine for Tree models)
         # We will treat Trade_Hour as numerical for simplicity, or categorical. Let's stick to the prompt's simplicity.
-        categorical_features = ['Asset_Class', 'Counterparty_Rating', 'SSI_Status', 'Liquidity_Score', 'Custodian_Location', 'Operation_Type', 'Currency', 'Trade_Day']
-        numeric_features = ['Notional_Amount_USD', 'Market_Volatility_Index', 'Trade_Hour']
+        categorical_features = CATEGORICAL_FEATURES
+        numeric_features = NUMERIC_FEATURES
         
         # Preprocessing steps
         preprocessor = ColumnTransformer(
@@ -46,40 +149,179 @@ class SettlementPredictor:
                 random_state=42
             ))
         ])
-        
-    def train(self, data_path):
+
+    def build_categorical_pipeline(self):
+        # Alternative variant: no one-hot, no SMOTE. Categoricals go in as integer codes
+        # (unknown -> NaN, i.e. missing) and XGBoost splits on them natively; the imbalance
+        # is handled with scale_pos_weight, set in fit() from the class counts.
+        preprocessor = ColumnTransformer(
+            transformers=[
+                ('num', RobustScaler(), NUMERIC_FEATURES),
+                ('cat', OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=np.nan), CATEGORICAL_FEATURES)
+            ])
+
+        self.pipeline = ImbPipeline([
+            ('preprocessor', preprocessor),
+            ('classifier', xgb.XGBClassifier(
+                objective='binary:logistic',
+                n_estimators=300,
+                learning_rate=0.05,
+                max_depth=6,
+                eval_metric='logloss',
+                tree_method='hist',
+                enable_categorical=True,
+                feature_types=['q'] * len(NUMERIC_FEATURES) + ['c'] * len(CATEGORICAL_FEATURES),
+                random_state=42
+            ))
+        ])
+
+    def build(self, variant='onehot'):
+        if variant == 'categorical':
+            self.build_categorical_pipeline()
+        else:
+            self.build_pipeline()
+
+    def load_split(self, data_path):
         print(f"Loading data from {data_path}...")
-        df = pd.read_csv(data_path)
+        # Column projection: only the model inputs and the target are read (memory-mapped for columnar datasets)
+        df = read_training_data(data_path, NUMERIC_FEATURES + CATEGORICAL_FEATURES + [TARGET])
         
-        # Drop non-features
-        drop_cols = ['IS_FAILED', 'Trade_ID', 'Trade_Date', 'Settlement_Date', 'Counterparty', 'Counterparty_ID', 'ISIN', 'Failure_Prob']
-        # Ensure we only drop what exists
-        X = df.drop([c for c in drop_cols if c in df.columns], axis=1)
-        y = df['IS_FAILED']
+        X = df[NUMERIC_FEATURES + CATEGORICAL_FEATURES]
+        y = df[TARGET]
         
         print(f"Features: {X.columns.tolist()}")
         
         # Split
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, stratify=y, random_state=42)
+        return train_test_split(X, y, test_size=0.2, stratify=y, random_state=42)
+
+    def fit(self, X_train, y_train):
+        if 'smote' not in self.pipeline.named_steps:
+            n_pos = int(y_train.sum())
+            self.pipeline.set_params(classifier__scale_pos_weight=imbalance_weight(len(y_train) - n_pos, n_pos))
+        self.pipeline.fit(X_train, y_train)
+        
+    def train(self, data_path):
+        X_train, X_test, y_train, y_test = self.load_split(data_path)
         
         print("Training Model...")
-        self.pipeline.fit(X_train, y_train)
+        self.fit(X_train, y_train)
         
         # Evaluation
         preds = self.pipeline.predict(X_test)
+        self.report_metrics(y_test, preds)
+            
+        return X_test # Return for SHAP
+
+    def evaluate(self, y_test, preds):
         report = classification_report(y_test, preds, output_dict=True)
         
         print("\n--- Evaluation Metrics ---")
         print(f"Recall (Catching Failures): {report['1']['recall']:.4f}")
         print(f"Precision: {report['1']['precision']:.4f}")
         print(f"F1 Score: {report['1']['f1-score']:.4f}")
+        return report
+
+    def report_metrics(self, y_test, preds):
+        report = self.evaluate(y_test, preds)
         
         # Save metrics
         os.makedirs('model', exist_ok=True)
         with open('model/metrics.json', 'w') as f:
             json.dump(report, f, indent=4)
-            
-        return X_test # Return for SHAP
+        return report
+
+    def train_streaming(self, data_path, chunk_size=250_000, test_size=0.2, sample_size=200_000,
+                        cache_dir=None, seed=42, holdout_rows=50_000):
+        """
+        Out-of-core variant of build_pipeline() + train().
+
+        The dataset is read in chunks and never concatenated: the scaler is fit
+        on a bounded sample, the one-hot categories are collected in a scan,
+        and XGBoost builds a quantized (hist) QuantileDMatrix from a data
+        iterator. With cache_dir the quantized pages go to disk as well
+        (ExtMemQuantileDMatrix). The split is stratified per chunk, and the
+        imbalance is handled with scale_pos_weight instead of SMOTE copies.
+        Produces the same pipeline object, so save_artifacts() is unchanged.
+        """
+        feature_columns = NUMERIC_FEATURES + CATEGORICAL_FEATURES
+        columns = feature_columns + [TARGET]
+
+        # Pass 1: training-split size, class balance and category sets
+        print(f"Scanning {data_path} in chunks of {chunk_size}...")
+        categories = {c: set() for c in CATEGORICAL_FEATURES}
+        n_train = n_pos = 0
+        for i, chunk in enumerate(read_training_data(data_path, columns, chunk_size)):
+            y = chunk[TARGET].to_numpy()
+            train = ~chunk_split_mask(y, i, test_size, seed)
+            n_train += int(train.sum())
+            n_pos += int(y[train].sum())
+            for c in CATEGORICAL_FEATURES:
+                categories[c].update(pd.unique(chunk[c].to_numpy()[train].astype(str)))
+        if n_pos == 0:
+            raise ValueError("Training split has no failed trades")
+
+        # Pass 2: bounded uniform sample of training rows to fit the RobustScaler medians/IQRs
+        rate = min(1.0, sample_size / n_train)
+        samples = []
+        for i, chunk in enumerate(read_training_data(data_path, columns, chunk_size)):
+            y = chunk[TARGET].to_numpy()
+            keep = ~chunk_split_mask(y, i, test_size, seed) & (np.random.default_rng([seed, i, 1]).random(len(y)) < rate)
+            samples.append(chunk.loc[keep, feature_columns])
+        sample = pd.concat(samples, ignore_index=True)
+        for c in CATEGORICAL_FEATURES:
+            sample[c] = sample[c].astype(str)
+
+        preprocessor = ColumnTransformer(
+            transformers=[
+                ('num', RobustScaler(), NUMERIC_FEATURES),
+                ('cat', OneHotEncoder(categories=[sorted(categories[c]) for c in CATEGORICAL_FEATURES],
+                                      handle_unknown='ignore', sparse_output=False), CATEGORICAL_FEATURES)
+            ])
+        preprocessor.fit(sample)
+        del samples, sample
+
+        scale_pos_weight = imbalance_weight(n_train - n_pos, n_pos)
+        print(f"Training rows: {n_train}, failures: {n_pos}, scale_pos_weight: {scale_pos_weight:.2f}")
+
+        classifier = xgb.XGBClassifier(
+            objective='binary:logistic',
+            n_estimators=300,
+            learning_rate=0.05,
+            max_depth=6,
+            eval_metric='logloss',
+            tree_method='hist',
+            scale_pos_weight=scale_pos_weight,
+            random_state=seed
+        )
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            it = ChunkedTradeIter(data_path, preprocessor, chunk_size, test_size, seed,
+                                  cache_prefix=os.path.join(cache_dir, 'train'))
+            dtrain = xgb.ExtMemQuantileDMatrix(it)
+        else:
+            dtrain = xgb.QuantileDMatrix(ChunkedTradeIter(data_path, preprocessor, chunk_size, test_size, seed))
+
+        print("Training Model (streaming)...")
+        booster = xgb.train(classifier.get_xgb_params(), dtrain, num_boost_round=classifier.n_estimators)
+        del dtrain
+        classifier.load_model(bytearray(booster.save_raw('ubj')))
+        self.pipeline = ImbPipeline([('preprocessor', preprocessor), ('classifier', classifier)])
+
+        # Pass 3: evaluate on the held-out rows, chunk by chunk
+        y_test, preds, X_sample = [], [], []
+        for i, chunk in enumerate(read_training_data(data_path, columns, chunk_size)):
+            y = chunk[TARGET].to_numpy()
+            test = chunk_split_mask(y, i, test_size, seed)
+            X_test = chunk.loc[test, feature_columns]
+            prob = booster.inplace_predict(preprocessor.transform(X_test).astype(np.float32))
+            y_test.append(y[test].astype(np.int8))
+            preds.append((prob > 0.5).astype(np.int8))
+            room = holdout_rows - sum(len(x) for x in X_sample)
+            if room > 0:
+                X_sample.append(X_test.head(room))
+        self.report_metrics(np.concatenate(y_test), np.concatenate(preds))
+
+        return pd.concat(X_sample, ignore_index=True) # Held-out sample for SHAP and cascade calibration
         
     def generate_explanation(self, X_part):
         print("Generating SHAP Explainer...")
@@ -96,7 +338,7 @@ class SettlementPredictor:
             # Num features are just the list
             # We need to know the order. ColumnTransformer output order is usually transformers order.
             # Num first, then Cat
-            num_features = ['Notional_Amount_USD', 'Market_Volatility_Index', 'Trade_Hour']
+            num_features = NUMERIC_FEATURES
             self.feature_names = num_features + list(cat_features)
         except:
              print("Could not extract feature names perfectly.")
@@ -105,6 +347,22 @@ class SettlementPredictor:
         # Verify it works on a sample
         # _ = self.explainer.shap_values(X_transformed[:10])
 
+    def calibrate_cascade(self, X_holdout, target_disagreement=0.001):
+        # Early-exit serving tiers: tree prefix + uncertainty bands chosen on the holdout so the
+        # risk level disagrees with the full model on at most target_disagreement of the trades
+        fast_path = FastPathPredictor.from_pipeline(self.pipeline)
+        self.cascade = cascade.calibrate(fast_path, fast_path.encode_frame(X_holdout), target_disagreement)
+        print(f"Cascade: {self.cascade['prefix_trees']}/{self.cascade['total_trees']} trees, "
+              f"{self.cascade['holdout_prefix_rate']:.1%} of holdout trades exit early, "
+              f"disagreement {self.cascade['holdout_disagreement']:.4%}")
+
+    def profile_reference(self, X_holdout):
+        # Reference distribution for the API's drift monitor: holdout features and the model's scores on them
+        fast_path = FastPathPredictor.from_pipeline(self.pipeline)
+        probs = fast_path.predict_proba(fast_path.encode_frame(X_holdout))
+        self.drift_reference = drift.build_reference(X_holdout, NUMERIC_FEATURES, CATEGORICAL_FEATURES, probs)
+        print(f"Drift reference profiled on {len(X_holdout)} holdout trades")
+
     def save_artifacts(self, path='model/'):
         os.makedirs(path, exist_ok=True)
         # Save the whole pipeline
@@ -113,11 +371,341 @@ class SettlementPredictor:
         joblib.dump(self.explainer, f'{path}shap_explainer.joblib')
         if self.feature_names:
              joblib.dump(self.feature_names, f'{path}feature_names.joblib')
-        print(f"Artifacts saved to {path}")
+        if self.cascade:
+            with open(f'{path}{cascade.CASCADE_FILE}', 'w') as f:
+                json.dump(self.cascade, f, indent=4)
+        if self.drift_reference:
+            with open(f'{path}{drift.DRIFT_FILE}', 'w') as f:
+                json.dump(self.drift_reference, f)
+        # Lean serving bundle (native booster + JSON spec); a watching API server hot-swaps to it
+        version = write_bundle(self.pipeline, os.path.join(path, BUNDLE_DIR), self.feature_names, self.cascade,
+                               self.drift_reference)
+        print(f"Artifacts saved to {path} (serving bundle {version})")
+
+# --- Variant comparison ---
+_COMPARE_DATA = None  # (X_train, y_train), set before forking so the children inherit it instead of unpickling
+
+
+def _fit_variant(variant):
+    """Runs in a forked child: fits one variant, timing it and measuring its peak RSS growth."""
+    X_train, y_train = _COMPARE_DATA
+    start_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux
+    predictor = SettlementPredictor()
+    predictor.build(variant)
+    started = time.perf_counter()
+    predictor.fit(X_train, y_train)
+    train_seconds = time.perf_counter() - started
+    peak_mb = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_kb) / 1024
+    return predictor.pipeline, train_seconds, peak_mb
+
+
+def measure_latency(pipeline, X, single_rows=1000, batch_size=10_000, repeats=5):
+    """Latency on the serving path (the compiled fast path behind /predict), in milliseconds."""
+    fast = FastPathPredictor.from_pipeline(pipeline)
+    records = X.head(single_rows).to_dict('records')
+    for record in records[:100]:  # warm-up
+        fast.predict_one(record)
+    timings = []
+    for record in records:
+        started = time.perf_counter()
+        fast.predict_one(record)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    batch = X.head(batch_size)
+    batch_timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fast.predict_proba(fast.encode_frame(batch))
+        batch_timings.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "encoded_columns": fast.n_features,
+        "single_row_p50_ms": round(float(np.percentile(timings, 50)), 4),
+        "single_row_p99_ms": round(float(np.percentile(timings, 99)), 4),
+        "batch_rows": len(batch),
+        "batch_ms": round(float(np.median(batch_timings)), 3),
+    }
+
+
+def compare_variants(data_path, selected='onehot'):
+    """
+    Trains every pipeline variant on the same split and writes their numbers
+    side by side to model/metrics.json. Each fit runs in its own forked
+    process, so one variant's peak memory cannot hide the other's. Returns a
+    predictor holding the `selected` variant, plus the test split for SHAP.
+    """
+    global _COMPARE_DATA
+    predictor = SettlementPredictor()
+    X_train, X_test, y_train, y_test = predictor.load_split(data_path)
+    _COMPARE_DATA = (X_train, y_train)
+
+    results, pipelines = {}, {}
+    for variant in VARIANTS:
+        print(f"\n=== Variant: {variant} ===")
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork')) as pool:
+            pipeline, train_seconds, peak_mb = pool.submit(_fit_variant, variant).result()
+        predictor.pipeline = pipeline
+        report = predictor.evaluate(y_test, pipeline.predict(X_test))
+        artifact = io.BytesIO()
+        joblib.dump(pipeline, artifact)
+
+        results[variant] = {
+            "recall": report['1']['recall'],
+            "precision": report['1']['precision'],
+            "f1": report['1']['f1-score'],
+            "train_wall_seconds": round(train_seconds, 2),
+            "train_peak_memory_mb": round(peak_mb, 1),
+            "artifact_bytes": artifact.tell(),
+            **measure_latency(pipeline, X_test),
+            "report": report,
+        }
+        pipelines[variant] = pipeline
+    _COMPARE_DATA = None
+
+    print("\n--- Variant Comparison ---")
+    for variant, r in results.items():
+        print(f"{variant:12s} F1 {r['f1']:.4f}  recall {r['recall']:.4f}  train {r['train_wall_seconds']}s  "
+              f"peak +{r['train_peak_memory_mb']}MB  artifact {r['artifact_bytes'] / 1e6:.2f}MB  "
+              f"single {r['single_row_p50_ms']}ms  batch({r['batch_rows']}) {r['batch_ms']}ms")
+
+    os.makedirs('model', exist_ok=True)
+    with open('model/metrics.json', 'w') as f:
+        json.dump({"selected": selected, "variants": results}, f, indent=4)
+
+    predictor.pipeline = pipelines[selected]
+    return predictor, X_test
+
+# --- Hyperparameter tuning ---
+# Production config (build_pipeline) is always evaluated first as the recall reference
+BASELINE_PARAMS = {'max_depth': 6, 'learning_rate': 0.05, 'min_child_weight': 1, 'subsample': 1.0,
+                   'colsample_bytree': 1.0}
+BASELINE_ROUNDS = 300
+SEARCH_SPACE = {
+    'max_depth': [3, 4, 5, 6, 8],
+    'learning_rate': [0.05, 0.1, 0.2, 0.3],
+    'min_child_weight': [1, 5, 10],
+    'subsample': [0.8, 1.0],
+    'colsample_bytree': [0.6, 0.8, 1.0],
+}
+RECALL_TOLERANCE = 0.005  # a candidate may lose at most this much mean failure recall vs the baseline
+
+# Encoded folds, built once in the parent and inherited by the forked workers (copy-on-write)
+_FOLDS = None
+_FOLD_CACHE = {}  # per worker: fold index -> (dtrain, dval), built on first use
+_DEADLINE = None
+
+
+def encode_folds(pipeline, X, y, n_folds=3, seed=42):
+    """
+    Fits the pipeline's preprocessor (and SMOTE, if the variant has one) on
+    each training fold and returns the encoded float32 matrices, so every
+    candidate reuses them instead of re-encoding.
+    """
+    folds = []
+    splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed)
+    y = np.asarray(y)
+    for train_idx, val_idx in splitter.split(np.zeros(len(y)), y):
+        preprocessor = clone(pipeline.named_steps['preprocessor'])
+        X_train = preprocessor.fit_transform(X.iloc[train_idx]).astype(np.float32)
+        y_train = y[train_idx]
+        weight = 1.0
+        if 'smote' in pipeline.named_steps:
+            X_train, y_train = clone(pipeline.named_steps['smote']).fit_resample(X_train, y_train)
+        else:
+            n_pos = int(y_train.sum())
+            weight = imbalance_weight(len(y_train) - n_pos, n_pos)
+        X_val = preprocessor.transform(X.iloc[val_idx]).astype(np.float32)
+        folds.append((X_train, y_train, X_val, y[val_idx], weight))
+    return folds
+
+
+def _fold_matrices(fold, feature_types):
+    if fold not in _FOLD_CACHE:
+        X_train, y_train, X_val, y_val, _ = _FOLDS[fold]
+        categorical = feature_types is not None
+        dtrain = xgb.QuantileDMatrix(X_train, label=y_train, feature_types=feature_types, enable_categorical=categorical)
+        dval = xgb.QuantileDMatrix(X_val, label=y_val, ref=dtrain, feature_types=feature_types,
+                                   enable_categorical=categorical)
+        _FOLD_CACHE[fold] = (dtrain, dval)
+    return _FOLD_CACHE[fold]
+
+
+class _Deadline(xgb.callback.TrainingCallback):
+    """Stops boosting once the tuning budget is spent; the result is then discarded."""
+
+    def __init__(self):
+        super().__init__()
+        self.hit = False
+
+    def after_iteration(self, model, epoch, evals_log):
+        self.hit = time.time() > _DEADLINE
+        return self.hit
+
+
+def _evaluate_candidate(candidate_id, params, fold, base_params, feature_types, max_rounds, early_stopping_rounds):
+    """Runs in a pool worker: one candidate on one fold, early-stopped on the validation fold."""
+    if time.time() > _DEADLINE:
+        return None
+    dtrain, dval = _fold_matrices(fold, feature_types)
+    y_val = _FOLDS[fold][3]
+    deadline = _Deadline()
+    train_params = {**base_params, **params, 'scale_pos_weight': _FOLDS[fold][4], 'nthread': 1}
+    booster = xgb.train(train_params, dtrain, num_boost_round=max_rounds, evals=[(dval, 'val')],
+                        early_stopping_rounds=early_stopping_rounds, callbacks=[deadline], verbose_eval=False)
+    if deadline.hit:
+        return None
+    # Without early stopping (the baseline) every round counts
+    rounds = booster.best_iteration + 1 if early_stopping_rounds else booster.num_boosted_rounds()
+    preds = (booster.predict(dval, iteration_range=(0, rounds)) > 0.5).astype(int)
+    return {
+        "candidate": candidate_id,
+        "fold": fold,
+        "rounds": rounds,
+        "recall": recall_score(y_val, preds, zero_division=0),
+        "precision": precision_score(y_val, preds, zero_division=0),
+        "f1": f1_score(y_val, preds, zero_division=0),
+    }
+
+
+def sample_candidates(n_candidates, seed=42, space=SEARCH_SPACE):
+    grid = [dict(zip(space, values)) for values in itertools.product(*space.values())]
+    grid = [c for c in grid if c != BASELINE_PARAMS]
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(grid), min(n_candidates, len(grid)), replace=False)
+    return [grid[i] for i in picks]
+
+
+def tune(data_path, variant='onehot', n_folds=3, n_candidates=24, budget_seconds=600, workers=None,
+         max_rounds=1000, early_stopping_rounds=30, seed=42):
+    """
+    Stratified K-fold search over SEARCH_SPACE on a process pool.
+
+    Folds are encoded once and shared with the workers; every (candidate, fold)
+    is early-stopped on its validation fold; whatever has not finished when
+    the wall-clock budget runs out is pruned. The winner is the candidate
+    with the fewest trees whose mean failure recall stays within
+    RECALL_TOLERANCE of the production config (ties broken by F1). The
+    predictor is trained on the full training split with it and the search
+    is written to model/best_params.json.
+    """
+    global _FOLDS, _DEADLINE
+    started = time.time()
+    _DEADLINE = started + budget_seconds
+    predictor = SettlementPredictor()
+    predictor.build(variant)
+    X_train, X_test, y_train, y_test = predictor.load_split(data_path)
+
+    print(f"Encoding {n_folds} folds...")
+    _FOLDS = encode_folds(predictor.pipeline, X_train, y_train, n_folds, seed)
+    classifier = predictor.pipeline.named_steps['classifier']
+    base_params = {k: v for k, v in classifier.get_xgb_params().items() if v is not None}
+    base_params.pop('scale_pos_weight', None)  # per fold
+    feature_types = classifier.feature_types
+
+    candidates = [BASELINE_PARAMS] + sample_candidates(n_candidates, seed)
+    workers = workers or os.cpu_count() or 1
+    print(f"Evaluating {len(candidates)} candidates x {n_folds} folds on {workers} workers "
+          f"(budget {budget_seconds}s)...")
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+        futures = []
+        for i, params in enumerate(candidates):
+            # The baseline runs its full 300 trees: it is the reference, not a candidate to shrink
+            rounds, patience = (BASELINE_ROUNDS, None) if i == 0 else (max_rounds, early_stopping_rounds)
+            for fold in range(n_folds):
+                futures.append(pool.submit(_evaluate_candidate, i, params, fold, base_params, feature_types,
+                                           rounds, patience))
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, _DEADLINE - time.time()), return_when=FIRST_COMPLETED)
+            results.extend(r for r in (f.result() for f in done) if r is not None)
+            if time.time() > _DEADLINE:
+                for future in pending:
+                    future.cancel()
+                # Running tasks stop at their next boosting round (_Deadline)
+                results.extend(r for r in (f.result() for f in pending if not f.cancelled()) if r is not None)
+                break
+    _FOLDS = None
+
+    summary = []
+    for i, params in enumerate(candidates):
+        folds = [r for r in results if r['candidate'] == i]
+        if len(folds) < n_folds:
+            continue  # pruned by the budget
+        summary.append({
+            "params": params,
+            "n_estimators": int(round(np.mean([r['rounds'] for r in folds]))),
+            "recall": float(np.mean([r['recall'] for r in folds])),
+            "precision": float(np.mean([r['precision'] for r in folds])),
+            "f1": float(np.mean([r['f1'] for r in folds])),
+            "baseline": i == 0,
+        })
+    pruned = len(candidates) - len(summary)
+    print(f"Completed {len(summary)} candidates, pruned {pruned}, in {time.time() - started:.1f}s")
+
+    baseline = next((c for c in summary if c['baseline']), None)
+    if baseline is None:
+        print("Budget too small to evaluate the baseline; keeping the production config.")
+        best = {"params": BASELINE_PARAMS, "n_estimators": BASELINE_ROUNDS}
+    else:
+        eligible = [c for c in summary if c['recall'] >= baseline['recall'] - RECALL_TOLERANCE] or [baseline]
+        best = min(eligible, key=lambda c: (c['n_estimators'], -c['f1']))
+
+    print(f"Winner: {best['params']} with {best['n_estimators']} trees")
+    predictor.pipeline.set_params(**{f'classifier__{k}': v for k, v in best['params'].items()},
+                                  classifier__n_estimators=best['n_estimators'])
+    predictor.fit(X_train, y_train)
+    predictor.report_metrics(y_test, predictor.pipeline.predict(X_test))
+
+    with open('model/best_params.json', 'w') as f:
+        json.dump({
+            "variant": variant,
+            "best": {**best['params'], "n_estimators": best['n_estimators']},
+            "baseline": baseline,
+            "recall_tolerance": RECALL_TOLERANCE,
+            "folds": n_folds,
+            "budget_seconds": budget_seconds,
+            "elapsed_seconds": round(time.time() - started, 1),
+            "pruned": pruned,
+            "candidates": sorted(summary, key=lambda c: (c['n_estimators'], -c['f1'])),
+        }, f, indent=4)
+
+    return predictor, X_test
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the settlement failure model")
+    # Columnar dataset from data_generator.py by default; CSV still works
+    parser.add_argument("data_path", nargs="?",
+                        default='settlement_data' if os.path.isdir('settlement_data') else 'settlement_data.csv')
+    parser.add_argument("--streaming", action="store_true", help="Out-of-core training, chunk by chunk")
+    parser.add_argument("--chunk-size", type=int, default=250_000)
+    parser.add_argument("--cache-dir", default=None, help="Streaming mode: spill quantized pages to this directory")
+    parser.add_argument("--variant", choices=VARIANTS, default='onehot',
+                        help="onehot: one-hot + SMOTE; categorical: native categorical splits + class weighting")
+    parser.add_argument("--compare", action="store_true",
+                        help="Train every variant, write them side by side to metrics.json, keep --variant")
+    parser.add_argument("--tune", action="store_true",
+                        help="K-fold hyperparameter search, then train the winner (-> model/best_params.json)")
+    parser.add_argument("--folds", type=int, default=3)
+    parser.add_argument("--candidates", type=int, default=24)
+    parser.add_argument("--budget", type=float, default=600, help="Tuning wall-clock budget in seconds")
+    parser.add_argument("--workers", type=int, default=None, help="Tuning processes (default: all cores)")
+    parser.add_argument("--cascade-target", type=float, default=0.001,
+                        help="Max share of holdout trades whose early-exit risk level may differ from the full model")
+    args = parser.parse_args()
+
     predictor = SettlementPredictor()
-    predictor.build_pipeline()
-    X_test = predictor.train('settlement_data.csv')
+    if args.streaming:
+        X_test = predictor.train_streaming(args.data_path, chunk_size=args.chunk_size, cache_dir=args.cache_dir)
+    elif args.tune:
+        predictor, X_test = tune(args.data_path, args.variant, args.folds, args.candidates, args.budget, args.workers)
+    elif args.compare:
+        predictor, X_test = compare_variants(args.data_path, args.variant)
+    else:
+        predictor.build(args.variant)
+        X_test = predictor.train(args.data_path)
     predictor.generate_explanation(X_test)
+    predictor.calibrate_cascade(X_test, args.cascade_target)
+    predictor.profile_reference(X_test)
     predictor.save_artifacts()
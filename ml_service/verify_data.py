@@ -1,6 +1,12 @@
-import pandas as pd
+import os
+import sys
+from columnar import load_dataset
 
-df = pd.read_csv("settlement_data.csv")
+# Columnar dataset from data_generator.py by default; CSV still works
+data_path = sys.argv[1] if len(sys.argv) > 1 else ('settlement_data' if os.path.isdir('settlement_data') else 'settlement_data.csv')
+# Only the columns the rule checks need are read
+df = load_dataset(data_path, columns=['IS_FAILED', 'SSI_Status', 'Counterparty_Rating', 'Asset_Class',
+                                      'Notional_Amount_USD', 'Liquidity_Score'])
 print(f"Total Rows: {len(df)}")
 print(f"Failure Rate: {df['IS_FAILED'].mean():.4f}")
 